@@ -0,0 +1,7 @@
+"""数据增强任务引擎：由 core/tasks 下的任务规格驱动所有场景"""
+from .spec import load_spec, TASKS_DIR
+from .runner import run_task
+from .decode import FrameStore
+from .metadata import MetadataTable
+
+__all__ = ["load_spec", "run_task", "TASKS_DIR", "FrameStore", "MetadataTable"]
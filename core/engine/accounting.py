@@ -0,0 +1,143 @@
+"""服务端耗时核算：每次接口调用占用的 GPU 时间按配置分组，统计每个成功结果的成本与失败、不合格、补发的浪费"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+# 分组字段：场景（任务名，链式修正为 <任务>_followup）、接口、分辨率、步数、帧数
+GROUP_FIELDS = ("task", "endpoint", "width", "height", "steps", "frame_num")
+
+
+def attribute(calls, slots):
+    """
+    按推理区间分摊 GPU 时间：同一服务端同时有 n 个调用在推理时，每个调用分得 min(1, slots/n) 的时间
+    分摊后的总和即服务端槽位的实际占用时间，客户端并发高于槽位时排队的部分不会重复计入
+    """
+    events = []
+    for number, call in enumerate(calls):
+        if call["predict"]:
+            events.append((call["start"], 1, number))
+            events.append((call["start"] + call["predict"], -1, number))
+    events.sort()
+    active = set()
+    last = None
+    for moment, change, number in events:
+        if active and moment > last:
+            share = (moment - last) * min(1.0, slots / len(active))
+            for other in active:
+                calls[other]["seconds"] += share
+        last = moment
+        if change > 0:
+            active.add(number)
+        else:
+            active.discard(number)
+
+
+def new_group():
+    return {"calls": 0, "ok": 0, "failed": 0, "invalid": 0, "server_seconds": 0.0, "ok_seconds": 0.0,
+            "failed_seconds": 0.0, "invalid_seconds": 0.0, "retry_seconds": 0.0, "latency": 0.0, "bytes": 0}
+
+
+def finish_group(group):
+    ok = group["ok"]
+    group["wasted_seconds"] = group["failed_seconds"] + group["invalid_seconds"]
+    group["seconds_per_output"] = group["server_seconds"] / ok if ok else None
+    group["outputs_per_gpu_hour"] = ok * 3600 / group["server_seconds"] if group["server_seconds"] else None
+    group["latency_mean"] = group.pop("latency") / group["calls"] if group["calls"] else None
+    group["bytes_per_output"] = group.pop("bytes") // ok if ok else None
+    return group
+
+
+class CostLedger:
+    """
+    记录每次实际调用接口（含失败与重新生成，不含结果库命中）的推理区间与最终结果，运行结束后写出报告
+    - 成功：调用成功且通过校验；不合格：通过了调用但未通过校验；失败：调用出错
+    - 补发：校验不合格后的重新生成，以及规划器为失败变体补发的任务（其耗时另计为 retry_seconds）
+    报告写入输出目录下的 reports/cost-<任务>-<时间>.json，各分组按每 GPU 小时产出排序
+    """
+
+    def __init__(self, config, output_root, task):
+        self.config = config
+        self.path = os.path.join(output_root, config["dir"], f"cost-{task}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        self.task = task
+        self.calls = []
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.report = None
+
+    def add(self, job, ok, latency):
+        """登记一次调用；成功的调用若随后校验不合格，由 invalid 改记"""
+        call = {field: job.get(field) for field in GROUP_FIELDS}
+        call.update(start=job.get("predict_start") or job.get("dispatched") or time.time(),
+                    predict=job.get("predict_time") or 0.0, latency=latency or 0.0, seconds=0.0,
+                    status="ok" if ok else "failed",
+                    retry=job.get("attempt", 1) > 1 or bool(job.get("replacement")),
+                    bytes=os.path.getsize(job["output"]) if ok and os.path.exists(job["output"]) else 0)
+        with self.lock:
+            job["cost_call"] = len(self.calls)
+            self.calls.append(call)
+
+    def invalid(self, job):
+        with self.lock:
+            number = job.pop("cost_call", None)
+            if number is not None:
+                self.calls[number]["status"] = "invalid"
+
+    def build_report(self):
+        by_server = defaultdict(list)
+        for call in self.calls:
+            by_server[call["endpoint"].rsplit("/", 1)[0] if call["endpoint"] else None].append(call)
+        for calls in by_server.values():
+            attribute(calls, self.config["gpu_slots"])
+
+        groups = defaultdict(new_group)
+        totals = new_group()
+        for call in self.calls:
+            for group in (groups[tuple(call[field] for field in GROUP_FIELDS)], totals):
+                group["calls"] += 1
+                group[call["status"]] += 1
+                group["server_seconds"] += call["seconds"]
+                group[f"{call['status']}_seconds"] += call["seconds"]
+                group["latency"] += call["latency"]
+                group["bytes"] += call["bytes"] if call["status"] == "ok" else 0
+                if call["retry"]:
+                    group["retry_seconds"] += call["seconds"]
+        rows = [dict(zip(GROUP_FIELDS, key), **finish_group(group)) for key, group in groups.items()]
+        rows.sort(key=lambda row: -(row["outputs_per_gpu_hour"] or 0))
+        return {
+            "task": self.task,
+            "started": self.started,
+            "finished": time.time(),
+            "wall_seconds": time.time() - self.started,
+            "gpu_slots": self.config["gpu_slots"],
+            "totals": finish_group(totals),
+            "groups": rows,
+        }
+
+    def close(self):
+        with self.lock:
+            self.report = self.build_report()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.report, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        totals = self.report["totals"]
+        if not totals["calls"]:
+            return f"服务端耗时：本次没有实际调用接口：{os.path.abspath(self.path)}"
+        wasted = totals["wasted_seconds"]
+        share = wasted / totals["server_seconds"] if totals["server_seconds"] else 0
+        per_output = f"{totals['seconds_per_output']:.2f}s" if totals["seconds_per_output"] else "-"
+        per_hour = f"{totals['outputs_per_gpu_hour']:.0f}" if totals["outputs_per_gpu_hour"] else "-"
+        return (f"服务端耗时：{totals['server_seconds']:.1f} GPU·秒，每个成功结果 {per_output}，"
+                f"每GPU小时产出 {per_hour} 个；失败/不合格浪费 {wasted:.1f}s（{share:.0%}），"
+                f"补发耗时 {totals['retry_seconds']:.1f}s：{os.path.abspath(self.path)}")
+
+
+def build_ledger(spec, output_root):
+    if not spec["accounting"]["enabled"]:
+        return None
+    return CostLedger(spec["accounting"], output_root, spec["name"])
@@ -0,0 +1,183 @@
+"""多个任务共用同一服务端时的本地调度：基于文件锁的共享队列（优先级 + 加权公平排队 + 令牌桶限速）"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# 等待槽位时的轮询间隔（秒）
+POLL_INTERVAL = 0.05
+
+
+class TokenBucket:
+    """令牌桶限速：rate 为每秒调用数，burst 为允许累积的突发调用数"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Broker:
+    """
+    同一台服务端（按 host:port 区分）的全局槽位，所有进程通过状态文件 + 文件锁共享
+    - 槽位总数为 capacity，空闲时才授予，服务端不会被任一任务独占也不会空转
+    - 先比较优先级（priority 大者优先，高优先级有等待时低优先级不再获得新槽位）
+    - 同一优先级内按虚拟时间做加权公平排队：每次调用结束累加 耗时/weight，虚拟时间最小者先得
+    - 任务从空闲转为等待时虚拟时间追平当前最小值，不能靠空闲期间“攒”配额
+    """
+
+    def __init__(self, config, endpoint, run_name):
+        try:
+            import fcntl
+        except ImportError:
+            raise RuntimeError("共享调度（broker）依赖文件锁，仅支持 Linux/macOS")
+        self.fcntl = fcntl
+        self.server = urlparse(endpoint["url"]).netloc or endpoint["url"]
+        state_dir = config["dir"] or os.path.join(tempfile.gettempdir(), "data_augment_broker")
+        os.makedirs(state_dir, exist_ok=True)
+        safe_name = re.sub(r"[^\w.-]", "_", self.server)
+        self.path = os.path.join(state_dir, f"{safe_name}.json")
+        self.lock_path = self.path + ".lock"
+        self.run_id = f"{os.getpid()}:{run_name}"
+        self.run_name = run_name
+        self.capacity = config["capacity"]
+        self.priority = config["priority"]
+        self.weight = config["weight"]
+        self.bucket = TokenBucket(config["rate"], config["burst"]) if config["rate"] else None
+        self.granted = 0
+        self.waited = 0.0
+
+    @contextmanager
+    def state(self):
+        """
+        加锁读取状态文件，退出时写回（每个调用单独打开锁文件，进程内的线程之间同样互斥）
+        状态没有变化时不写：等待槽位的轮询大多只是读取
+        """
+        with open(self.lock_path, "a") as lock_file:
+            self.fcntl.flock(lock_file, self.fcntl.LOCK_EX)
+            try:
+                state = {"runs": {}}
+                text = None
+                if os.path.exists(self.path):
+                    try:
+                        with open(self.path, "r", encoding="utf-8") as f:
+                            text = f.read()
+                        state = json.loads(text)
+                    except (OSError, json.JSONDecodeError):
+                        pass  # 状态损坏时从空状态开始，存活的任务会重新登记
+                yield state
+                updated = json.dumps(state, ensure_ascii=False)
+                if updated != text:
+                    tmp_path = self.path + ".tmp"
+                    with open(tmp_path, "w", encoding="utf-8") as f:
+                        f.write(updated)
+                    os.replace(tmp_path, self.path)
+            finally:
+                self.fcntl.flock(lock_file, self.fcntl.LOCK_UN)
+
+    def register(self, runs):
+        """登记本任务；清理已退出进程遗留的记录（连同其占用的槽位）"""
+        for run_id in [r for r, entry in runs.items() if not pid_alive(entry["pid"])]:
+            del runs[run_id]
+        entry = runs.get(self.run_id)
+        if entry is None:
+            entry = runs[self.run_id] = {"pid": os.getpid(), "name": self.run_name,
+                                         "vtime": 0.0, "waiting": 0, "active": 0}
+        entry["priority"] = self.priority
+        entry["weight"] = self.weight
+        return entry
+
+    def eligible(self, runs):
+        if sum(entry["active"] for entry in runs.values()) >= self.capacity:
+            return False
+        waiting = [(run_id, entry) for run_id, entry in runs.items() if entry["waiting"] > 0]
+        best = min(waiting, key=lambda w: (-w[1]["priority"], w[1]["vtime"], w[0]))
+        return best[0] == self.run_id
+
+    def acquire(self):
+        """阻塞直到获得一个服务端槽位"""
+        if self.bucket:
+            self.bucket.acquire()
+        start = time.time()
+        queued = False
+        while True:
+            with self.state() as state:
+                runs = state["runs"]
+                entry = self.register(runs)
+                if not queued or entry["waiting"] <= 0:
+                    if entry["waiting"] == 0 and entry["active"] == 0:
+                        backlog = [e["vtime"] for r, e in runs.items()
+                                   if r != self.run_id and (e["waiting"] or e["active"])]
+                        entry["vtime"] = max(entry["vtime"], min(backlog, default=0.0))
+                    entry["waiting"] += 1
+                    queued = True
+                granted = self.eligible(runs)
+                if granted:
+                    entry["waiting"] -= 1
+                    entry["active"] += 1
+            if granted:
+                self.granted += 1
+                self.waited += time.time() - start
+                return
+            time.sleep(POLL_INTERVAL)
+
+    def release(self, service_time):
+        """归还槽位并按服务时间/权重累加虚拟时间"""
+        with self.state() as state:
+            entry = self.register(state["runs"])
+            entry["active"] = max(0, entry["active"] - 1)
+            entry["vtime"] += service_time / self.weight
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.release(time.time() - start)
+
+    def close(self):
+        with self.state() as state:
+            state["runs"].pop(self.run_id, None)
+
+    def summary(self):
+        average = self.waited / self.granted if self.granted else 0.0
+        return (f"共享调度 {self.server}：优先级 {self.priority}，权重 {self.weight}，"
+                f"获得槽位 {self.granted} 次，平均等待 {average:.1f}s")
+
+
+def build_broker(spec):
+    """broker.enabled 时创建共享调度器，否则返回None（直接调用接口）"""
+    config = spec["broker"]
+    if not config["enabled"]:
+        return None
+    return Broker(config, spec["endpoint"], spec["name"])
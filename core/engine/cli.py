@@ -0,0 +1,69 @@
+"""各入口脚本共用的命令行参数"""
+import tomllib
+
+from .spec import deep_merge
+
+
+def add_common_args(parser):
+    """添加引擎通用参数（并发、断点续跑、规格覆盖）"""
+    group = parser.add_argument_group('引擎参数')
+    group.add_argument('--concurrency', type=int, default=None, help='初始并发接口调用数（自适应模式下会按延迟/错误率自动调整；concurrency.mode="fixed" 时为固定值）')
+    group.add_argument('--no-resume', action='store_true', help='忽略已有的 manifest.jsonl，全部重新生成')
+    group.add_argument('--seed', type=int, default=None, help='prompt抽样与随机种子的随机数种子（便于复现）')
+    group.add_argument('--dry-run', action='store_true',
+                       help='只展开任务不调用接口，按历史耗时估算墙钟时间、服务端耗时和存储占用')
+    group.add_argument('--profile', action='store_true',
+                       help='采样剖析CPU（折叠栈火焰图）并定期记录内存分配排行，结果写入输出目录下的 .profile')
+    group.add_argument('--priority', type=int, default=None,
+                       help='与其他任务共享服务端时的优先级（越大越优先，指定即启用共享调度 broker）')
+    group.add_argument('--weight', type=float, default=None,
+                       help='与其他任务共享服务端时的权重（同一优先级内按权重分配服务端时间，指定即启用共享调度）')
+    group.add_argument('--record', action='store_true',
+                       help='录制每次接口调用的参数、耗时与结果文件到输出目录下的 traces，供 --replay 离线回放')
+    group.add_argument('--replay', default=None, metavar='TRACE_DIR',
+                       help='不连接服务端，按录制的 trace 回放调用耗时与结果（用于离线评估调度与传输的改动）')
+    group.add_argument('--set', dest='overrides', action='append', default=[], metavar='KEY=VALUE',
+                       help='覆盖任务规格中的字段，如 --set fanout.per_input=10（值按TOML解析，可重复）')
+    return parser
+
+
+def parse_override(text):
+    """把 a.b.c=value 解析为嵌套字典，value 按TOML字面量解析，失败则视为字符串"""
+    if "=" not in text:
+        raise ValueError(f"错误：--set 参数格式应为 KEY=VALUE：{text}")
+    key, raw = text.split("=", 1)
+    try:
+        value = tomllib.loads(f"v = {raw}")["v"]
+    except tomllib.TOMLDecodeError:
+        value = raw
+    result = value
+    for part in reversed(key.strip().split(".")):
+        result = {part: result}
+    return result
+
+
+def spec_overrides(args, overrides=None):
+    """合并脚本自身参数转换出的覆盖项与 --set 覆盖项"""
+    merged = overrides or {}
+    broker = {key: value for key, value in (("priority", args.priority), ("weight", args.weight))
+              if value is not None}
+    if broker:
+        merged = deep_merge(merged, {"broker": dict(broker, enabled=True)})
+    if args.record:
+        merged = deep_merge(merged, {"record": {"enabled": True}})
+    if args.replay:
+        merged = deep_merge(merged, {"replay": {"trace": args.replay}})
+    for text in args.overrides:
+        merged = deep_merge(merged, parse_override(text))
+    return merged
+
+
+def run_options(args):
+    """提取传给 run_task 的运行参数"""
+    return {
+        "concurrency": args.concurrency,
+        "resume": False if args.no_resume else None,
+        "seed": args.seed,
+        "dry_run": args.dry_run,
+        "profile": args.profile,
+    }
@@ -0,0 +1,193 @@
+"""接口调用：连接复用、参数占位符替换、结果下载"""
+import os
+import shutil
+import threading
+import time
+
+import httpx
+from gradio_client import Client, handle_file
+from gradio_client.utils import encode_file_path
+
+from .transport import Transport, prepare_dir, stream_download
+
+# 按接口地址缓存客户端与传输层，同一进程内的所有任务共用连接
+_CLIENTS = {}
+_TRANSPORTS = {}
+_CLIENTS_LOCK = threading.Lock()
+# 回放服务（启用时所有接口调用都由它应答，不连接真实服务端）
+_REPLAY = None
+
+# 以文件形式上传的任务字段
+FILE_FIELDS = ("image", "end_image", "mask")
+
+
+def use_replay(server):
+    """切换到回放服务（None 恢复连接真实服务端）"""
+    global _REPLAY
+    with _CLIENTS_LOCK:
+        _REPLAY = server
+
+
+def get_client(endpoint):
+    """获取（或创建）接口客户端，创建时执行一次 endpoint.setup 中的初始化调用"""
+    url = endpoint["url"]
+    if _REPLAY:
+        return _REPLAY.client(url)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(url)
+        if client is None:
+            print(f"连接API：{url}")
+            kwargs = {}
+            if endpoint.get("timeout"):
+                kwargs["httpx_kwargs"] = {"timeout": endpoint["timeout"]}
+            # 不由 gradio_client 下载结果：保留服务端文件引用，供同一接口的链式修正步骤直接引用
+            client = Client(url, download_files=False, **kwargs)
+            for setup in endpoint.get("setup") or []:
+                client.predict(**setup.get("params", {}), api_name=setup["api_name"])
+            _CLIENTS[url] = client
+        return client
+
+
+def get_transport(spec):
+    """接口的传输层（长连接池 + 上传线程）；未启用时返回None，文件由 gradio_client 逐个上传"""
+    if not spec["transport"]["enabled"]:
+        return None
+    endpoint = spec["endpoint"]
+    with _CLIENTS_LOCK:
+        # 回放时连接的是本机回放服务，与真实服务端的连接池分开
+        key = endpoint["url"] if _REPLAY is None else f"{endpoint['url']}（回放）"
+        transport = _TRANSPORTS.get(key)
+        if transport is None:
+            transport = _TRANSPORTS[key] = Transport(spec["transport"], lambda: get_client(endpoint))
+        return transport
+
+
+def transport_summaries():
+    """本进程各接口的传输统计"""
+    with _CLIENTS_LOCK:
+        return [transport.summary(key) for key, transport in _TRANSPORTS.items()]
+
+
+def call_files(spec, job):
+    """本次调用需要上传的本地文件"""
+    fields = set()
+    for value in spec["call"]["params"].values():
+        if value == "$mask_editor":
+            fields.update(("image", "mask"))
+        elif isinstance(value, str) and value[1:] in FILE_FIELDS:
+            fields.add(value[1:])
+    if job.get("parent") and server_ref(job):
+        fields.discard("image")
+    return [job[field] for field in sorted(fields) if job.get(field)]
+
+
+def prefetch_files(spec, job):
+    """派发前提前上传任务文件（与在途任务的下载并行）"""
+    transport = get_transport(spec)
+    if transport:
+        transport.prefetch(call_files(spec, job))
+
+
+def upload_ref(path, transport):
+    return transport.file_ref(path) if transport else handle_file(path)
+
+
+def resolve_value(value, job, transport=None):
+    """替换占位符：$none → None，$image/$end_image/$mask → 上传文件，$mask_editor → 原图+掩码图层，$字段名 → 任务字段值"""
+    if not isinstance(value, str) or not value.startswith("$"):
+        return value
+    field = value[1:]
+    if field == "none":
+        return None
+    if field == "image" and job.get("parent"):
+        ref = server_ref(job)
+        if ref:
+            return ref
+    if field in FILE_FIELDS:
+        path = job.get(field)
+        return upload_ref(path, transport) if path else None
+    if field == "mask_editor":
+        # gr.ImageEditor 的输入：背景与合成图为原图，唯一的图层为掩码
+        image = upload_ref(job["image"], transport)
+        return {"background": image, "layers": [upload_ref(job["mask"], transport)], "composite": image}
+    if field not in job:
+        raise KeyError(f"未知的参数占位符 {value}")
+    return job[field]
+
+
+def build_params(call, job, transport=None):
+    """根据规格的 call.params 构造本次 predict 的参数"""
+    return {name: resolve_value(value, job, transport) for name, value in call["params"].items()}
+
+
+def server_ref(job):
+    """
+    链式修正步骤的输入即上一步的结果：两步调用同一接口时直接引用服务端的结果文件，不再上传
+    不带 meta 的文件描述不会被 gradio_client 当作本地文件上传，由服务端按路径读取其缓存中的文件
+    """
+    ref = job["parent"].get("result_ref")
+    if not ref or ref[0] != job["spec"]["endpoint"]["url"]:
+        return None
+    return {"path": ref[1]["path"], "orig_name": ref[1].get("orig_name")}
+
+
+def extract_result(result, key):
+    """从接口返回值中取出结果（元组下标或字典键）：服务端文件描述，或本地文件路径"""
+    if isinstance(result, dict):
+        value = result.get(key)
+    elif isinstance(result, (list, tuple)):
+        value = result[int(key)]
+    else:
+        value = result
+    if isinstance(value, dict) and not value.get("path"):
+        value = value.get("video")  # gr.Video 返回 {"video": 文件, "subtitles": ...}
+    if isinstance(value, dict) and value.get("path"):
+        return value
+    if isinstance(value, str) and os.path.exists(value):
+        return value
+    raise FileNotFoundError(f"API未返回有效结果路径：{result!r}")
+
+
+def result_url(client, ref):
+    return ref.get("url") or client.src_prefixed + "file=" + encode_file_path(ref["path"])
+
+
+def download_result(client, url, dst_path):
+    """未启用传输层时的下载：每次新建连接，直接流式写入输出路径"""
+    with httpx.Client(headers=client.headers, cookies=client.cookies, verify=client.ssl_verify,
+                      follow_redirects=True, **client.httpx_kwargs) as http:
+        stream_download(http, url, dst_path)
+
+
+def save_result(src_path, dst_path):
+    """接口直接返回本地路径时移动到输出路径（跨文件系统时复制后删除源文件，不在临时目录留副本）"""
+    prepare_dir(dst_path)
+    shutil.move(src_path, dst_path)
+
+
+def run_job(spec, job):
+    """执行单个任务：调用接口并把结果保存到输出路径，记录服务端结果引用"""
+    endpoint = spec["endpoint"]
+    client = get_client(endpoint)
+    transport = get_transport(spec)
+    for field in ("result_ref", "upload_wait", "predict_start", "predict_time", "download_time"):
+        job.pop(field, None)  # 上一次尝试的记录
+    start = time.time()
+    params = build_params(spec["call"], job, transport)
+    job["upload_wait"] = time.time() - start  # 已预先上传时接近0
+    job["predict_start"] = time.time()
+    try:
+        result = client.predict(**params, api_name=endpoint["api_name"])
+    finally:
+        job["predict_time"] = time.time() - job["predict_start"]
+    value = extract_result(result, endpoint["result"])
+    if isinstance(value, str):
+        save_result(value, job["output"])
+        return
+    start = time.time()
+    if transport:
+        transport.download(client, result_url(client, value), job["output"])
+    else:
+        download_result(client, result_url(client, value), job["output"])
+    job["download_time"] = time.time() - start
+    job["result_ref"] = (endpoint["url"], value)
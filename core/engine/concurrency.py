@@ -0,0 +1,124 @@
+"""自适应并发控制：按接口观测的延迟与错误率做加性增、乘性减（AIMD）"""
+import threading
+import time
+from collections import deque
+
+
+class FixedLimit:
+    """固定并发数（--concurrency 且 concurrency.mode = "fixed"）"""
+
+    def __init__(self, limit):
+        self.limit_value = max(1, limit)
+        self.max_limit = self.limit_value
+
+    def limit(self):
+        return self.limit_value
+
+    def observe(self, latency, ok):
+        pass
+
+    def summary(self):
+        return f"固定并发 {self.limit_value}"
+
+
+class AIMDController:
+    """
+    在途请求数上限的AIMD控制
+    - 成功且延迟未明显高于基线：每完成一个请求上限增加 increase/上限（约每轮+increase）
+    - 失败（超时/异常）或延迟超过基线×latency_slack（服务端开始排队）：上限乘以 decrease
+    - 一次下调后需再完成“当前上限”个请求才允许再次下调，避免同一批在途请求重复惩罚
+    基线取最近 baseline_window 个样本的最小延迟，EWMA跟踪当前延迟
+    """
+
+    def __init__(self, initial=1, min_limit=1, max_limit=16, increase=1.0, decrease=0.5,
+                 latency_slack=1.5, baseline_window=200, ewma_alpha=0.2):
+        self.limit_value = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_slack = latency_slack
+        self.ewma_alpha = ewma_alpha
+        self.samples = deque(maxlen=baseline_window)
+        self.ewma = None
+        self.cooldown = 0
+        self.completed = 0
+        self.errors = 0
+        self.decreases = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+
+    def limit(self):
+        with self.lock:
+            return int(self.limit_value)
+
+    def baseline(self):
+        return min(self.samples) if self.samples else None
+
+    def observe(self, latency, ok):
+        """记录一个完成的请求并调整上限"""
+        with self.lock:
+            self.completed += 1
+            if self.cooldown > 0:
+                self.cooldown -= 1
+            if not ok:
+                self.errors += 1
+                self._decrease()
+                return
+            self.samples.append(latency)
+            self.ewma = latency if self.ewma is None else \
+                self.ewma_alpha * latency + (1 - self.ewma_alpha) * self.ewma
+            if self.ewma > self.baseline() * self.latency_slack:
+                self._decrease()
+            else:
+                self.limit_value = min(self.max_limit, self.limit_value + self.increase / self.limit_value)
+
+    def _decrease(self):
+        if self.cooldown > 0:
+            return
+        self.limit_value = max(self.min_limit, self.limit_value * self.decrease)
+        self.cooldown = max(1, int(self.limit_value))
+        self.decreases += 1
+        # 下调后当前延迟会回落，重置EWMA以免连续误判
+        self.ewma = self.baseline()
+
+    def summary(self):
+        with self.lock:
+            elapsed = max(time.time() - self.started, 1e-6)
+            baseline = self.baseline()
+            return (f"并发上限 {self.limit_value:.1f}（范围 {self.min_limit}-{self.max_limit}），"
+                    f"基线延迟 {baseline or 0:.1f}s，当前延迟 {self.ewma or 0:.1f}s，"
+                    f"完成 {self.completed}（{self.completed / elapsed:.2f}/s），错误 {self.errors}，下调 {self.decreases} 次")
+
+
+def endpoint_key(spec):
+    return spec["endpoint"]["url"], spec["endpoint"]["api_name"]
+
+
+def get_controller(spec, concurrency=None):
+    """新建接口的并发控制器；命令行 --concurrency 作为初始值（fixed 模式下为固定值）"""
+    config = spec["concurrency"]
+    initial = concurrency or spec["run"]["concurrency"]
+    if config["mode"] == "fixed":
+        return FixedLimit(initial)
+    return AIMDController(
+        initial=initial,
+        min_limit=config["min"],
+        max_limit=config["max"],
+        increase=config["increase"],
+        decrease=config["decrease"],
+        latency_slack=config["latency_slack"],
+    )
+
+
+def get_controllers(specs, concurrency=None):
+    """
+    一次运行的并发控制器：主流程与各修正步骤的接口各用一个（同一接口共用），按 (接口地址, api_name) 索引
+    控制器属于这次运行，常驻服务中同时执行的任务互不影响，各自按本次的 --concurrency 开始
+    """
+    controllers = {}
+    for spec in specs:
+        key = endpoint_key(spec)
+        if key not in controllers:
+            controllers[key] = get_controller(spec, concurrency)
+    return controllers
@@ -0,0 +1,264 @@
+"""生成视频解码：多进程把MP4解码为固定尺寸的 uint8 帧数组（内存映射 .npy 分块 + 偏移索引）"""
+import glob
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+
+from .logs import log
+
+INDEX_NAME = "index.jsonl"
+META_NAME = "meta.json"
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+PART_SUFFIX = ".part"
+# 每个进程任务处理的视频数
+GROUP_SIZE = 8
+
+
+def iter_frames(cap, width, height, stride):
+    """逐帧产出（按 stride 抽帧），缩放到固定尺寸并转为RGB"""
+    position = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if position % stride == 0:
+            if frame.shape[1] != width or frame.shape[0] != height:
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            yield cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        position += 1
+
+
+def npy_header(shape):
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {"descr": "|u1", "fortran_order": False, "shape": shape})
+    return header.getvalue()
+
+
+class ChunkWriter:
+    """
+    一个分块：按容量创建内存映射的 .part 文件，解码出的帧直接写入，不在进程内存中累积
+    单个视频超过容量时容量翻倍；结束时把 .npy 头改为实际帧数并截掉未用部分，再改名
+    """
+
+    def __init__(self, path, capacity, frame_shape):
+        self.path = path
+        self.frame_shape = frame_shape
+        self.capacity = capacity
+        self.used = 0
+        self.array = np.lib.format.open_memmap(path + PART_SUFFIX, mode="w+", dtype=np.uint8,
+                                               shape=(capacity,) + frame_shape)
+
+    def append(self, frame):
+        if self.used == self.capacity:
+            self.grow()
+        self.array[self.used] = frame
+        self.used += 1
+
+    def grow(self):
+        old_path = self.path + PART_SUFFIX + ".grow"
+        self.array.flush()
+        del self.array
+        os.replace(self.path + PART_SUFFIX, old_path)
+        old = np.load(old_path, mmap_mode="r")
+        self.capacity *= 2
+        self.array = np.lib.format.open_memmap(self.path + PART_SUFFIX, mode="w+", dtype=np.uint8,
+                                               shape=(self.capacity,) + self.frame_shape)
+        self.array[:self.used] = old[:self.used]
+        del old
+        os.remove(old_path)
+
+    def close(self, count):
+        """保留前 count 帧并改名为正式分块；count 为0时删除，返回是否写出了分块"""
+        self.array.flush()
+        offset = self.array.offset
+        del self.array
+        part_path = self.path + PART_SUFFIX
+        if count == 0:
+            os.remove(part_path)
+            return False
+        header = npy_header((count,) + self.frame_shape)
+        frame_bytes = int(np.prod(self.frame_shape))
+        if len(header) == offset:
+            # numpy 的头部为第一维预留了位数，改写后长度不变，直接原地改写
+            with open(part_path, "r+b") as f:
+                f.write(header)
+                f.truncate(offset + count * frame_bytes)
+        else:
+            old = np.load(part_path, mmap_mode="r")
+            np.save(part_path + ".npy", old[:count])
+            del old
+            os.replace(part_path + ".npy", part_path)
+        os.replace(part_path, self.path)
+        return True
+
+
+def decode_group(videos, store_dir, group_no, width, height, stride, chunk_frames):
+    """
+    进程池任务：顺序解码一组视频，逐帧写入当前分块，分块写满 chunk_frames 即换下一个
+    同一视频的帧总在同一分块内连续存放（写到一半放不下时，已写的帧移到新分块）；返回索引条目与失败列表
+    """
+    cv2.setNumThreads(1)  # 并行度由进程池提供
+    frame_shape = (height, width, 3)
+    entries, failures, pending = [], [], []
+    seq = 0
+    chunk = None
+
+    def new_chunk():
+        nonlocal seq
+        name = f"chunk-{group_no:06d}-{seq:03d}.npy"
+        seq += 1
+        return ChunkWriter(os.path.join(store_dir, name), chunk_frames, frame_shape)
+
+    def finish(chunk, count):
+        if chunk.close(count):
+            name = os.path.basename(chunk.path)
+            for entry in pending:
+                entry["chunk"] = name
+                entries.append(entry)
+        pending.clear()
+
+    for key, path in videos:
+        if chunk is None:
+            chunk = new_chunk()
+        start = chunk.used
+        cap = cv2.VideoCapture(path)
+        try:
+            if not cap.isOpened():
+                raise RuntimeError("无法打开视频")
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            for frame in iter_frames(cap, width, height, stride):
+                if chunk.used == chunk.capacity and start > 0:
+                    # 当前分块放不下这个视频：已写的帧移到新分块，之前的视频结束在当前分块
+                    moved = new_chunk()
+                    moved.array[:chunk.used - start] = chunk.array[start:chunk.used]
+                    moved.used = chunk.used - start
+                    finish(chunk, start)
+                    chunk, start = moved, 0
+                chunk.append(frame)
+        except Exception as e:
+            chunk.used = start
+            failures.append((key, str(e)))
+            continue
+        finally:
+            cap.release()
+        if chunk.used == start:
+            failures.append((key, "没有可解码的帧"))
+            continue
+        pending.append({"key": key, "start": start, "count": chunk.used - start, "fps": fps / stride})
+    if chunk is not None:
+        finish(chunk, chunk.used)
+    return entries, failures
+
+
+def video_outputs(manifest, output_root, done_keys):
+    """清单中已成功且尚未解码的视频结果"""
+    for key in sorted(manifest.done):
+        if key in done_keys or not key.lower().endswith(VIDEO_EXTENSIONS):
+            continue
+        path = os.path.join(output_root, key)
+        if os.path.exists(path):
+            yield key, path
+
+
+def decode_outputs(spec, output_root, manifest):
+    """把输出目录中的生成视频解码到帧存储；已解码的视频跳过，返回本次解码的视频数"""
+    config = spec["decode"]
+    width = config["width"] or spec["size"]["width"]
+    height = config["height"] or spec["size"]["height"]
+    store_dir = os.path.join(output_root, config["dir"])
+    os.makedirs(store_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(store_dir, "*" + PART_SUFFIX + "*")):  # 含扩容中的临时文件
+        os.remove(path)
+
+    meta_path = os.path.join(store_dir, META_NAME)
+    meta = {"shape": [height, width, 3], "dtype": "uint8", "stride": config["stride"]}
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+        if existing != meta:
+            print(f"错误：帧存储 {store_dir} 的尺寸/抽帧参数与当前配置不一致：{existing}")
+            return 0
+    else:
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    store = FrameStore(store_dir)
+    next_group = store.next_group()
+    videos = list(video_outputs(manifest, output_root, set(store.index)))
+    if not videos:
+        return 0
+
+    print(f"解码 {len(videos)} 个视频到帧存储 {store_dir}（{config['workers']} 个进程）...")
+    groups = [videos[i:i + GROUP_SIZE] for i in range(0, len(videos), GROUP_SIZE)]
+    decoded = 0
+    index_path = os.path.join(store_dir, INDEX_NAME)
+    with ProcessPoolExecutor(max_workers=config["workers"]) as pool:
+        futures = [pool.submit(decode_group, group, store_dir, next_group + i, width, height,
+                               config["stride"], config["chunk_frames"])
+                   for i, group in enumerate(groups)]
+        for future in as_completed(futures):
+            try:
+                entries, failures = future.result()
+            except Exception as e:
+                log.warning(f"视频解码失败：{str(e)}", extra={"fields": {"event": "decode_failed", "error": str(e)}})
+                continue
+            with open(index_path, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            for key, error in failures:
+                log.warning(f"视频解码失败 {key}：{error}",
+                            extra={"fields": {"event": "decode_failed", "key": key, "error": error}})
+            decoded += len(entries)
+    return decoded
+
+
+class FrameStore:
+    """
+    帧存储读取：按视频键取帧，分块以 mmap 方式打开，切片不复制数据
+    store = FrameStore("output/frames"); clip = store.frames("xxx.mp4"); frame = store.frame("xxx.mp4", 10)
+    """
+
+    def __init__(self, store_dir):
+        self.dir = store_dir
+        self.index = {}
+        self.chunks = {}
+        index_path = os.path.join(store_dir, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.index[entry["key"]] = entry
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return list(self.index)
+
+    def next_group(self):
+        groups = [int(entry["chunk"].split("-")[1]) for entry in self.index.values()]
+        return max(groups, default=-1) + 1
+
+    def chunk(self, name):
+        array = self.chunks.get(name)
+        if array is None:
+            array = self.chunks[name] = np.load(os.path.join(self.dir, name), mmap_mode="r")
+        return array
+
+    def frames(self, key):
+        """视频的全部帧，形状 (帧数, 高, 宽, 3)"""
+        entry = self.index[key]
+        return self.chunk(entry["chunk"])[entry["start"]:entry["start"] + entry["count"]]
+
+    def frame(self, key, position):
+        entry = self.index[key]
+        if not 0 <= position < entry["count"]:
+            raise IndexError(f"{key} 只有 {entry['count']} 帧")
+        return self.chunk(entry["chunk"])[entry["start"] + position]
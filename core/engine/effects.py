@@ -0,0 +1,322 @@
+"""本地监控画面特效：对生成结果批量施加噪点、失焦模糊、偏色、低分辨率/压缩、亮度与逆光，一次生成派生出多个特效变体（图片与视频）"""
+import os
+import queue
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from .logs import log
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+# 特效的施加顺序与成像过程一致：光照 → 镜头 → 传感器 → 编码
+ORDER = ("brightness", "backlight", "color_cast", "blur", "noise", "lowres")
+# 仅对视频：掉帧（按间隔重复上一帧，模拟监控录像帧率不足）
+VIDEO_ORDER = ORDER + ("framerate",)
+
+
+def variant_params(rng, batch, effects, probability):
+    """为一批图片各抽取一组特效参数；未选中的特效取不改变画面的值"""
+    chosen = {name: rng.random(batch) < probability for name in effects}
+    none = np.zeros(batch, dtype=bool)
+
+    def pick(name, values, identity):
+        mask = chosen.get(name, none)
+        return np.where(mask.reshape((batch,) + (1,) * (values.ndim - 1)), values, identity)
+
+    return {
+        "gamma": pick("brightness", rng.uniform(0.7, 1.8, batch), 1.0),
+        "gain": pick("brightness", rng.uniform(0.5, 1.2, batch), 1.0),
+        "backlight": pick("backlight", rng.uniform(0.2, 0.6, batch), 0.0),
+        "angle": rng.uniform(0, 2 * np.pi, batch),
+        "cast": pick("color_cast", rng.uniform(0.85, 1.15, (batch, 3)), 1.0),
+        "blur": pick("blur", rng.uniform(1.0, 3.0, batch), 0.0),
+        "noise": pick("noise", rng.uniform(3.0, 12.0, batch), 0.0),
+        "scale": pick("lowres", rng.uniform(0.3, 0.6, batch), 1.0),
+        "quality": rng.integers(25, 60, batch),
+    }
+
+
+def backlight_maps(params, height, width):
+    """逆光：沿随机方向由亮到暗的光晕强度图，形状 (B, H, W, 1)"""
+    ys = np.linspace(-1, 1, height, dtype=np.float32)[None, :, None]
+    xs = np.linspace(-1, 1, width, dtype=np.float32)[None, None, :]
+    cos = np.cos(params["angle"]).astype(np.float32)[:, None, None]
+    sin = np.sin(params["angle"]).astype(np.float32)[:, None, None]
+    ramp = np.clip((xs * cos + ys * sin + 1) / 2, 0, 1)
+    return (ramp ** 2 * params["backlight"].astype(np.float32)[:, None, None])[..., None]
+
+
+def defocus(image, radius):
+    """失焦模糊：圆盘卷积核（与高斯模糊相比更接近镜头焦外）"""
+    size = int(np.ceil(radius)) * 2 + 1
+    yy, xx = np.mgrid[:size, :size] - size // 2
+    kernel = (xx ** 2 + yy ** 2 <= radius ** 2).astype(np.float32)
+    return cv2.filter2D(image, -1, kernel / kernel.sum())
+
+
+def degrade(image, scale, quality):
+    """低分辨率质感：缩小后放大，再做一次低质量JPEG编解码引入块效应"""
+    height, width = image.shape[:2]
+    small = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+    image = cv2.resize(small, (width, height), interpolation=cv2.INTER_LINEAR)
+    ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    return cv2.imdecode(data, cv2.IMREAD_COLOR) if ok else image
+
+
+def apply_effects(batch, params, rng):
+    """对一批同尺寸图片 (B, H, W, 3) uint8 施加特效；逐像素运算整批向量化，卷积与编码逐张进行"""
+    x = batch.astype(np.float32) / 255.0
+    x = np.power(x, params["gamma"].astype(np.float32)[:, None, None, None]) * \
+        params["gain"].astype(np.float32)[:, None, None, None]
+    if params["backlight"].any():
+        glow = backlight_maps(params, x.shape[1], x.shape[2])
+        x = x * (1 - glow) + glow  # 光源方向泛白、对比度降低
+    x *= params["cast"].astype(np.float32)[:, None, None, :]
+    out = np.clip(x * 255.0, 0, 255)
+    for i in np.flatnonzero(params["blur"]):
+        out[i] = defocus(out[i], params["blur"][i])
+    if params["noise"].any():
+        # 传感器噪点：亮度相关的高斯噪声，暗部相对更明显
+        sigma = params["noise"].astype(np.float32)[:, None, None, None]
+        out += rng.standard_normal(out.shape, dtype=np.float32) * sigma * (0.5 + 0.5 * (1 - out / 255.0))
+    out = np.clip(out, 0, 255).astype(np.uint8)
+    for i in np.flatnonzero(params["scale"] < 1):
+        out[i] = degrade(out[i], params["scale"][i], params["quality"][i])
+    return out
+
+
+def clip_params(rng, effects, probability):
+    """一个视频变体的特效参数：整段视频共用，保证帧间一致"""
+    params = variant_params(rng, 1, effects, probability)
+    params["drop"] = rng.integers(2, 5) if "framerate" in effects and rng.random() < probability else 1
+    # 自动曝光的缓慢起伏（相对幅度与周期帧数）
+    params["drift"] = rng.uniform(0.0, 0.08) if params["gain"][0] != 1.0 else 0.0
+    params["period"] = rng.uniform(40, 160)
+    params["phase"] = rng.uniform(0, 2 * np.pi)
+    return params
+
+
+def frame_params(params, positions):
+    """把视频变体参数展开到一段帧上（曝光随帧号缓慢变化，其余参数不变）"""
+    count = len(positions)
+    expanded = {name: np.repeat(params[name], count, axis=0)
+                for name in ("gamma", "gain", "backlight", "angle", "cast", "blur", "noise", "scale", "quality")}
+    expanded["gain"] = expanded["gain"] * (1 + params["drift"] * np.sin(
+        2 * np.pi * np.asarray(positions) / params["period"] + params["phase"]))
+    return expanded
+
+
+def effect_record(params, i=0):
+    """第 i 个变体实际施加的特效（按 VIDEO_ORDER 的位标记）与参数，记入元数据索引"""
+    applied = {
+        "brightness": params["gamma"][i] != 1.0 or params["gain"][i] != 1.0,
+        "backlight": params["backlight"][i] > 0,
+        "color_cast": bool(np.any(params["cast"][i] != 1.0)),
+        "blur": params["blur"][i] > 0,
+        "noise": params["noise"][i] > 0,
+        "lowres": params["scale"][i] < 1,
+        "framerate": params.get("drop", 1) > 1,
+    }
+    record = {
+        "flags": sum(1 << bit for bit, name in enumerate(VIDEO_ORDER) if applied[name]),
+        "gamma": float(params["gamma"][i]),
+        "gain": float(params["gain"][i]),
+        "backlight": float(params["backlight"][i]),
+        "blur": float(params["blur"][i]),
+        "noise": float(params["noise"][i]),
+        "scale": float(params["scale"][i]),
+        "quality": int(params["quality"][i]) if applied["lowres"] else 0,
+        "drop": int(params.get("drop", 1)),
+    }
+    record.update(zip(("cast_b", "cast_g", "cast_r"), np.broadcast_to(params["cast"][i], 3).astype(float).tolist()))
+    return record
+
+
+def variant_path(config, output_root, job, number):
+    stem, ext = os.path.splitext(job["key"])
+    return os.path.join(output_root, config["dir"], f"{stem}_fx{number}{ext}")
+
+
+class EffectEngine:
+    """
+    后台线程收集成功的图片结果，按尺寸凑批后施加特效，每个结果派生 variants 个变体写入 effects 目录
+    - 每个变体独立抽取特效组合与强度（pipeline 中每种特效按 probability 出现）
+    - 变体文件已全部存在的结果跳过（断点续跑）；变体交给 sinks（导出器、元数据索引）登记
+    """
+
+    def __init__(self, config, output_root, sinks=()):
+        self.config = config
+        self.output_root = output_root
+        self.sinks = [sink for sink in sinks if sink]
+        self.effects = [name for name in VIDEO_ORDER if name in config["pipeline"]]
+        self.queue = queue.Queue(maxsize=config["batch_size"] * 4)
+        self.writer = ThreadPoolExecutor(max_workers=config["workers"], thread_name_prefix="effects")
+        self.sources = 0
+        self.variants = 0
+        self.errors = 0
+        self.worker = threading.Thread(target=self.process_loop, name="effects", daemon=True)
+        self.worker.start()
+
+    def add(self, job):
+        """登记一个成功的结果"""
+        if not job["output"].lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS):
+            return
+        paths = [variant_path(self.config, self.output_root, job, n) for n in range(self.config["variants"])]
+        if all(os.path.exists(path) for path in paths):
+            return
+        self.queue.put((job, paths))
+
+    def process_loop(self):
+        batches = {}
+        while True:
+            try:
+                entry = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                entry = False  # 空闲时把未凑满的批次处理掉
+            if entry is None or entry is False:
+                for shape in list(batches):
+                    self.process(batches.pop(shape))
+                if entry is None:
+                    return
+                continue
+            job, paths = entry
+            if job["output"].lower().endswith(VIDEO_EXTENSIONS):
+                self.process_video(job, paths)
+                continue
+            image = cv2.imread(job["output"], cv2.IMREAD_COLOR)
+            if image is None:
+                self.errors += 1
+                log.warning(f"特效处理失败：无法读取 {job['output']}",
+                            extra={"fields": {"event": "effects_failed", "key": job["key"]}})
+                continue
+            batch = batches.setdefault(image.shape, [])
+            batch.append((job, paths, image))
+            if len(batch) >= self.config["batch_size"]:
+                self.process(batches.pop(image.shape))
+
+    def process(self, batch):
+        jobs, paths, images = zip(*batch)
+        stack = np.stack(images)
+        seed = zlib.crc32("|".join(job["key"] for job in jobs).encode("utf-8"))
+        rng = np.random.default_rng(seed)
+        writes = []
+        for number in range(self.config["variants"]):
+            try:
+                params = variant_params(rng, len(batch), self.effects, self.config["probability"])
+                out = apply_effects(stack, params, rng)
+            except Exception as e:
+                self.errors += 1
+                log.warning(f"特效处理失败：{str(e)}", exc_info=True, extra={"fields": {"event": "effects_failed"}})
+                return
+            for i, job in enumerate(jobs):
+                writes.append(self.writer.submit(self.write, job, paths[i][number], out[i], number,
+                                                 effect_record(params, i)))
+        for future in writes:
+            try:
+                future.result()
+                self.variants += 1
+            except Exception as e:
+                self.errors += 1
+                log.warning(f"特效变体写入失败：{str(e)}", extra={"fields": {"event": "effects_failed", "error": str(e)}})
+        self.sources += len(batch)
+
+    def process_video(self, job, paths):
+        """
+        视频只解码一遍：按 video_chunk 帧为一段读入，每段依次施加全部变体的特效并写入各自的视频
+        各变体的一段帧在写盘线程池中并行处理；掉帧的变体只对保留的帧施加特效
+        """
+        cap = cv2.VideoCapture(job["output"])
+        tmp_paths = [f"{path}.tmp{os.path.splitext(path)[1]}" for path in paths]
+        writers = []
+        try:
+            if not cap.isOpened():
+                raise RuntimeError("无法打开视频")
+            fps = cap.get(cv2.CAP_PROP_FPS) or 16
+            size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            rng = np.random.default_rng(zlib.crc32(job["key"].encode("utf-8")))
+            variants = [clip_params(rng, self.effects, self.config["probability"]) for _ in paths]
+            rngs = [np.random.default_rng(rng.integers(1 << 32)) for _ in paths]
+            held = [None] * len(paths)
+            for path in tmp_paths:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                writers.append(cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size))
+            position = 0
+            while True:
+                frames = []
+                while len(frames) < self.config["video_chunk"]:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    frames.append(frame)
+                if not frames:
+                    break
+                chunk = np.stack(frames)
+                positions = np.arange(position, position + len(frames))
+                list(self.writer.map(lambda n: self.write_chunk(writers[n], chunk, positions, variants[n], rngs[n],
+                                                                held, n), range(len(paths))))
+                position += len(frames)
+            if position == 0:
+                raise RuntimeError("没有可解码的帧")
+        except Exception as e:
+            self.errors += 1
+            log.warning(f"视频特效处理失败 {job['output']}：{str(e)}", exc_info=True,
+                        extra={"fields": {"event": "effects_failed", "key": job["key"], "error": str(e)}})
+            for path in tmp_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        finally:
+            cap.release()
+            for writer in writers:
+                writer.release()
+        for number, (tmp_path, path) in enumerate(zip(tmp_paths, paths)):
+            os.replace(tmp_path, path)
+            self.variants += 1
+            self.register(job, path, number, effect_record(variants[number]))
+        self.sources += 1
+
+    def write_chunk(self, writer, chunk, positions, params, rng, held, number):
+        """对一段帧施加一个变体的特效并写入；掉帧时被丢弃的帧重复上一保留帧"""
+        keep = positions % params["drop"] == 0
+        out = apply_effects(chunk[keep], frame_params(params, positions[keep]), rng) if keep.any() else []
+        kept = iter(out)
+        for is_kept in keep:
+            if is_kept:
+                held[number] = next(kept)
+            writer.write(held[number])
+
+    def write(self, job, path, image, number, record):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp{os.path.splitext(path)[1]}"
+        cv2.imwrite(tmp_path, image, [cv2.IMWRITE_JPEG_QUALITY, self.config["jpeg_quality"]])
+        os.replace(tmp_path, path)
+        self.register(job, path, number, record)
+
+    def register(self, job, path, number, record):
+        variant = dict(job, key=os.path.relpath(path, self.output_root), output=path,
+                       attrs=dict(job["attrs"], effects_variant=number), effects=record)
+        for sink in self.sinks:
+            sink.add(variant)
+
+    def close(self):
+        """处理完队列中剩余的结果"""
+        self.queue.put(None)
+        self.worker.join()
+        self.writer.shutdown()
+
+    def summary(self):
+        text = f"本地特效：{self.sources} 个结果派生 {self.variants} 个变体：" \
+               f"{os.path.abspath(os.path.join(self.output_root, self.config['dir']))}"
+        if self.errors:
+            text += f"（失败 {self.errors} 个）"
+        return text
+
+
+def build_effect_engine(spec, output_root, sinks=()):
+    if not spec["effects"]["enabled"]:
+        return None
+    return EffectEngine(spec["effects"], output_root, sinks)
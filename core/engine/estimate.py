@@ -0,0 +1,213 @@
+"""试运行估算：不调用接口展开全部任务，按历史的耗时/文件大小模型估算墙钟时间、服务端耗时与存储"""
+import json
+import os
+import tempfile
+from collections import Counter
+
+from .frames import build_frame_cache
+from .inputs import check_source, count_inputs, iter_inputs
+from .jobs import JobFactory
+from .manifest import MANIFEST_NAME, Manifest
+from .planner import build_planner
+from .spec import deep_merge
+
+# 各次运行按 (接口, 分辨率, steps, frame_num) 汇总的耗时与文件大小，所有输出目录共用
+HISTORY_PATH = os.path.join(os.path.expanduser("~"), ".cache", "data_augment", "history.jsonl")
+KEY_FIELDS = ("endpoint", "width", "height", "steps", "frame_num")
+
+
+def history_path(spec):
+    return spec["run"]["history"] or HISTORY_PATH
+
+
+def cost_key(entry):
+    return tuple(entry.get(field) for field in KEY_FIELDS)
+
+
+def work_units(key):
+    """生成工作量的粗略度量：像素数 × 帧数 × 步数，用于无精确历史时按比例换算"""
+    _, width, height, steps, frame_num = key
+    return (width or 1) * (height or 1) * (frame_num or 1) * (steps or 1)
+
+
+def new_stats():
+    return {"calls": 0, "failed": 0, "ok": 0, "latency": 0.0, "bytes": 0, "sized": 0, "inflight": 0, "inflight_n": 0}
+
+
+def add_entry(stats, entry):
+    """把一条清单记录计入汇总（无耗时的记录和结果库命中不计）"""
+    if entry.get("latency") is None or entry.get("cached"):
+        return
+    stats["calls"] += 1
+    stats["latency"] += entry["latency"]
+    if entry["status"] == "ok":
+        stats["ok"] += 1
+        if entry.get("bytes"):
+            stats["bytes"] += entry["bytes"]
+            stats["sized"] += 1
+    else:
+        stats["failed"] += 1
+    if entry.get("inflight"):
+        stats["inflight"] += entry["inflight"]
+        stats["inflight_n"] += 1
+
+
+def read_jsonl(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def record_history(manifest_path, since, path):
+    """把本次运行（since 之后）的清单记录按模型分组汇总，追加到历史文件"""
+    groups = {}
+    for entry in read_jsonl(manifest_path):
+        if entry.get("time", 0) >= since and entry.get("endpoint"):
+            add_entry(groups.setdefault(cost_key(entry), new_stats()), entry)
+    if not groups:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for key, stats in groups.items():
+            f.write(json.dumps(dict(zip(KEY_FIELDS, key), **stats), ensure_ascii=False) + "\n")
+
+
+class CostModel:
+    """按 (接口, 分辨率, steps, frame_num) 分组的平均单次耗时、结果大小、失败率与在途并发数"""
+
+    def __init__(self):
+        self.groups = {}
+
+    def load_history(self, path):
+        for row in read_jsonl(path):
+            stats = self.groups.setdefault(cost_key(row), new_stats())
+            for name in stats:
+                stats[name] += row.get(name, 0)
+
+    def load_manifest(self, path):
+        for entry in read_jsonl(path):
+            if entry.get("endpoint"):
+                add_entry(self.groups.setdefault(cost_key(entry), new_stats()), entry)
+
+    def lookup(self, key):
+        """返回 (单次耗时, 单个结果字节数, 失败率, 是否精确匹配)；同接口无任何历史返回None"""
+        stats = self.groups.get(key)
+        scale = 1.0
+        exact = True
+        if not stats or not stats["calls"]:
+            # 同一接口工作量最接近的分组，按工作量比例换算
+            candidates = [(k, s) for k, s in self.groups.items() if k[0] == key[0] and s["calls"]]
+            if not candidates:
+                return None
+            near_key, stats = min(candidates, key=lambda c: abs(work_units(c[0]) - work_units(key)))
+            scale = work_units(key) / work_units(near_key)
+            exact = False
+        latency = stats["latency"] / stats["calls"] * scale
+        size = stats["bytes"] / stats["sized"] * scale if stats["sized"] else 0
+        return latency, size, stats["failed"] / stats["calls"], exact
+
+    def inflight(self, endpoint):
+        """历史运行中该接口的平均在途请求数"""
+        total = sum(s["inflight"] for k, s in self.groups.items() if k[0] == endpoint)
+        count = sum(s["inflight_n"] for k, s in self.groups.items() if k[0] == endpoint)
+        return total / count if count else None
+
+
+def format_duration(seconds):
+    hours, rest = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}小时{minutes}分"
+    if minutes:
+        return f"{minutes}分{secs}秒"
+    return f"{secs}秒"
+
+
+def format_bytes(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def walk_chain(job):
+    """任务及其链式后续任务"""
+    yield job
+    for nxt in job["then"]:
+        yield from walk_chain(nxt)
+
+
+def enumerate_calls(spec, source, output_root, resume, rng):
+    """不调用接口展开全部任务，返回 (各模型分组的调用数, 已完成可跳过的调用数)"""
+    total_inputs = count_inputs(spec, source) if spec["fanout"]["target_count"] is not None else 0
+    dry_spec = deep_merge(spec, {"preprocess": {"enabled": False}})
+    factory = JobFactory(dry_spec, output_root, rng, build_planner(dry_spec, total_inputs))
+    manifest = Manifest(output_root)
+    calls = Counter()
+    done = 0
+    # 视频抽帧写入临时目录，试运行不在输出目录留下文件（抽帧缓存照常使用，正式运行时直接命中）
+    with tempfile.TemporaryDirectory(prefix="dry_run_") as frame_root:
+        for job in factory.iter_jobs(iter_inputs(dry_spec, source, frame_root, build_frame_cache(dry_spec))):
+            for call in walk_chain(job):
+                if resume and manifest.is_done(call):
+                    done += 1
+                else:
+                    calls[cost_key(call)] += 1
+    return calls, done
+
+
+def estimate_task(spec, source, output_root, concurrency, resume, rng):
+    """--dry-run：打印调用数、估计的服务端耗时、墙钟时间和存储占用"""
+    error = check_source(spec, source)
+    if error:
+        print(error)
+        return None
+    print(f"任务 {spec['name']}：试运行，展开任务中（不调用接口）...")
+    calls, done = enumerate_calls(spec, source, output_root, resume, rng)
+
+    model = CostModel()
+    model.load_history(history_path(spec))
+    model.load_manifest(os.path.join(output_root, MANIFEST_NAME))
+
+    print("\n" + "=" * 50)
+    print(f"任务 {spec['name']} 试运行估算")
+    print(f"待调用：{sum(calls.values())} 次，已完成可跳过：{done} 次")
+    server_time = {}
+    total_bytes = 0
+    unknown = 0
+    for key, count in sorted(calls.items(), key=lambda kv: str(kv[0])):
+        endpoint, width, height, steps, frame_num = key
+        label = f"{endpoint} {width}x{height}" + (f" steps={steps}" if steps else "") + \
+                (f" frames={frame_num}" if frame_num else "")
+        found = model.lookup(key)
+        if found is None:
+            unknown += count
+            print(f"  {label}：{count} 次，无历史数据")
+            continue
+        latency, size, fail_rate, exact = found
+        # 失败与校验不合格会重新生成，按历史失败率折算实际调用次数
+        attempts = count / max(1 - fail_rate, 0.05)
+        server_time[endpoint] = server_time.get(endpoint, 0) + attempts * latency
+        total_bytes += count * size
+        note = "" if exact else "（按相近分辨率换算）"
+        print(f"  {label}：{count} 次，单次 {latency:.1f}s，失败率 {fail_rate:.0%}，"
+              f"结果约 {format_bytes(size)}/个{note}")
+
+    wall = 0
+    for endpoint, seconds in server_time.items():
+        parallel = model.inflight(endpoint) or concurrency or spec["run"]["concurrency"]
+        wall += seconds / parallel
+        print(f"接口 {endpoint}：累计调用耗时 {format_duration(seconds)}，按平均 {parallel:.1f} 个并发")
+    print(f"预计墙钟时间：{format_duration(wall)}")
+    print(f"预计新增存储：{format_bytes(total_bytes)}")
+    if unknown:
+        print(f"另有 {unknown} 次调用的接口没有历史数据，未计入估算（先小规模运行一次即可建立模型）")
+    print("=" * 50)
+    return {"calls": sum(calls.values()), "done": done, "server_seconds": sum(server_time.values()),
+            "wall_seconds": wall, "bytes": total_bytes, "unknown": unknown}
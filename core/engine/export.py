@@ -0,0 +1,182 @@
+"""训练数据导出：把结果文件及属性元数据按顺序打包为大小受限的 tar 分片（WebDataset 格式）并维护索引"""
+import glob
+import hashlib
+import io
+import json
+import os
+import queue
+import tarfile
+import threading
+import time
+
+from .logs import log
+
+INDEX_NAME = "index.jsonl"
+# 写入中的分片后缀，分片写满并关闭后才改名并登记索引
+PART_SUFFIX = ".part"
+
+
+def sample_key(job):
+    """
+    WebDataset 以第一个“.”之前的部分分组，样本键中不能再含“.”
+    含“.”的路径把“.”换成“_”后再加原路径的短哈希，不会与本来就是“_”的路径重名
+    """
+    key = os.path.splitext(job["key"])[0].replace(os.sep, "/")
+    if "." not in key:
+        return key
+    return f"{key.replace('.', '_')}_{hashlib.blake2b(key.encode('utf-8'), digest_size=4).hexdigest()}"
+
+
+def sample_meta(job):
+    return {
+        "key": job["key"],
+        "task": job["task"],
+        "source": job["source"],
+        "frame": job["frame"],
+        "prompt": job["prompt"],
+        "prompt_id": job["prompt_id"],
+        "attrs": job["attrs"],
+        "seed": job["seed"],
+        "width": job["width"],
+        "height": job["height"],
+        "effects": job.get("effects"),  # 本地特效变体的特效与参数
+    }
+
+
+class ShardExporter:
+    """
+    后台线程顺序写分片：派发循环只把成功的任务放入有界队列，不阻塞接口调用
+    - 分片达到 max_bytes 或 max_count 即关闭，之后才把其中样本写入 index.jsonl
+    - 索引记录每个成员在分片中的数据偏移，可直接按偏移读取单个样本
+    - 重新运行时跳过索引中已有的样本，并清理中断时未写完的分片（其样本会重新导出）
+    """
+
+    def __init__(self, config, output_root):
+        self.config = config
+        self.dir = os.path.join(output_root, config["dir"])
+        self.index_path = os.path.join(self.dir, INDEX_NAME)
+        os.makedirs(self.dir, exist_ok=True)
+        for path in glob.glob(os.path.join(self.dir, "*" + PART_SUFFIX)):
+            os.remove(path)
+
+        self.exported = {}      # 样本键 → 结果路径（索引中已有的为None）
+        self.shard_no = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.exported[entry["key"]] = None
+                    self.shard_no = max(self.shard_no, entry["shard_no"] + 1)
+
+        self.tar = None
+        self.shard_path = None
+        self.shard_entries = []
+        self.shard_bytes = 0
+        self.samples = 0
+        self.shards = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=256)
+        self.worker = threading.Thread(target=self.write_loop, name="export", daemon=True)
+        self.worker.start()
+
+    def add(self, job):
+        """登记一个成功的结果（同一样本只导出一次）；派发循环与特效引擎的写线程会同时调用"""
+        key = sample_key(job)
+        with self.lock:
+            if key in self.exported:
+                if self.exported[key] not in (None, job["key"]):
+                    self.errors += 1
+                    log.warning(f"导出跳过 {job['key']}：样本键 {key} 与 {self.exported[key]} 重复",
+                                extra={"fields": {"event": "export_duplicate", "key": key}})
+                return
+            if not os.path.exists(job["output"]):
+                return
+            self.exported[key] = job["key"]
+        self.queue.put((key, job["output"], sample_meta(job)))
+
+    def write_loop(self):
+        while True:
+            sample = self.queue.get()
+            if sample is None:
+                self.close_shard()
+                return
+            try:
+                self.write_sample(*sample)
+            except Exception as e:
+                self.errors += 1
+                log.warning(f"导出失败 {sample[1]}：{str(e)}", exc_info=True,
+                            extra={"fields": {"event": "export_failed", "key": sample[0], "error": str(e)}})
+
+    def open_shard(self):
+        name = f"{self.config['prefix']}-{self.shard_no:06d}.tar"
+        self.shard_path = os.path.join(self.dir, name)
+        self.tar = tarfile.open(self.shard_path + PART_SUFFIX, "w", format=tarfile.PAX_FORMAT)
+        self.shard_entries = []
+        self.shard_bytes = 0
+
+    def add_member(self, name, fileobj, size):
+        """写入一个成员，返回其数据在分片中的偏移"""
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(time.time())
+        self.tar.addfile(info, fileobj)
+        # addfile 之后 offset 指向按512字节对齐的数据末尾
+        blocks = -(-size // tarfile.BLOCKSIZE)
+        return self.tar.offset - blocks * tarfile.BLOCKSIZE
+
+    def write_sample(self, key, path, meta):
+        if self.tar is None:
+            self.open_shard()
+        ext = os.path.splitext(path)[1].lower()
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            offset = self.add_member(key + ext, f, size)
+        meta_bytes = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        meta_offset = self.add_member(key + ".json", io.BytesIO(meta_bytes), len(meta_bytes))
+        self.shard_entries.append({
+            "key": key,
+            "shard": os.path.basename(self.shard_path),
+            "shard_no": self.shard_no,
+            "member": key + ext,
+            "offset": offset,
+            "size": size,
+            "meta_offset": meta_offset,
+            "meta_size": len(meta_bytes),
+        })
+        self.shard_bytes = self.tar.offset
+        if self.shard_bytes >= self.config["max_bytes"] or len(self.shard_entries) >= self.config["max_count"]:
+            self.close_shard()
+
+    def close_shard(self):
+        if self.tar is None:
+            return
+        self.tar.close()
+        os.replace(self.shard_path + PART_SUFFIX, self.shard_path)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            for entry in self.shard_entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.samples += len(self.shard_entries)
+        self.shards += 1
+        self.shard_no += 1
+        self.tar = None
+
+    def close(self):
+        """写完队列中剩余的样本并关闭最后一个分片"""
+        self.queue.put(None)
+        self.worker.join()
+
+    def summary(self):
+        text = f"导出分片 {self.shards} 个，样本 {self.samples} 个：{os.path.abspath(self.dir)}"
+        if self.errors:
+            text += f"（失败 {self.errors} 个）"
+        return text
+
+
+def build_exporter(spec, output_root):
+    if not spec["export"]["enabled"]:
+        return None
+    return ShardExporter(spec["export"], output_root)
@@ -0,0 +1,245 @@
+"""视频帧提取、抽帧存储与跨任务共享的抽帧缓存"""
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cv2
+from PIL import Image
+
+from .fsutil import materialize
+from .logs import log
+
+# 抽帧编码格式 → 扩展名（bmp 为不压缩的原始像素，编码最快；png 为快速无损压缩）
+FRAME_CODECS = {
+    "png": ".png",
+    "jpg": ".jpg",
+    "bmp": ".bmp",
+}
+
+
+# 帧位置：first、last、帧序号（整数，负数从末尾数起）或时间点（如 "2.5s"）
+TIMESTAMP_PATTERN = re.compile(r"^\d+(\.\d+)?s$")
+# 视频内容哈希的取样：文件大小 + 开头、中间、末尾各一块
+HASH_BLOCK = 1 << 20
+
+
+def valid_position(position):
+    if isinstance(position, bool):
+        return False
+    return position in ("first", "last") or isinstance(position, int) or \
+        (isinstance(position, str) and TIMESTAMP_PATTERN.match(position) is not None)
+
+
+def position_name(position):
+    return {"first": "首", "last": "尾"}.get(position, f" {position} 处的")
+
+
+def read_frame(video_path, position):
+    """读取视频指定位置的帧（first/last/帧序号/时间点），失败返回None"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            log.warning(f"错误：无法打开视频文件 {video_path}", extra={"fields": {"event": "frame_failed", "input": video_path}})
+            return None
+        if position == "last" or (isinstance(position, int) and position < 0):
+            # 获取视频总帧数，从末尾定位
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            offset = 1 if position == "last" else -position
+            cap.set(cv2.CAP_PROP_POS_FRAMES, max(total_frames - offset, 0))
+        elif isinstance(position, int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+        elif position != "first":
+            cap.set(cv2.CAP_PROP_POS_MSEC, float(position[:-1]) * 1000)
+        ret, frame = cap.read()
+        if not ret:
+            log.warning(f"错误：无法读取视频{position_name(position)}帧 {video_path}",
+                        extra={"fields": {"event": "frame_failed", "input": video_path, "frame": position}})
+            return None
+        return frame
+    finally:
+        cap.release()
+
+
+def video_digest(video_path):
+    """视频内容哈希：不读全文件，取文件大小与首、中、尾三块内容（同一视频换路径、换名仍命中）"""
+    size = os.path.getsize(video_path)
+    digest = hashlib.blake2b(str(size).encode("ascii"), digest_size=16)
+    with open(video_path, "rb") as f:
+        for offset in sorted({0, max(size // 2 - HASH_BLOCK // 2, 0), max(size - HASH_BLOCK, 0)}):
+            f.seek(offset)
+            digest.update(f.read(HASH_BLOCK))
+    return digest.hexdigest()
+
+
+def codec_settings(config):
+    """抽帧编码的扩展名、cv2 编码参数，以及写进抽帧缓存文件名的参数标记（改了编码质量不会取到旧帧）"""
+    codec = config["codec"]
+    if codec not in FRAME_CODECS:
+        raise ValueError(f"错误：frame_store.codec 必须是 {tuple(FRAME_CODECS)} 之一")
+    if codec == "png":
+        return FRAME_CODECS[codec], [cv2.IMWRITE_PNG_COMPRESSION, config["png_compression"]], \
+            f"c{config['png_compression']}"
+    if codec == "jpg":
+        return FRAME_CODECS[codec], [cv2.IMWRITE_JPEG_QUALITY, config["jpeg_quality"]], f"q{config['jpeg_quality']}"
+    return FRAME_CODECS[codec], [], ""
+
+
+class FrameCache:
+    """
+    跨任务共享的抽帧缓存：按（视频内容哈希, 帧位置, 编码格式与参数）保存编码后的帧
+    - standhigh_photo、bad_stand_high、video_gen_lora 等抽帧任务共用同一目录，一个视频的同一帧只解码一次
+    - 命中时把缓存文件硬链接到任务的抽帧目录，不解码视频
+    - 总大小超过 max_gb 时按最近使用时间（命中时刷新修改时间）淘汰最旧的帧，已链接到任务目录的文件不受影响
+    多个进程可同时使用；淘汰以各进程自己的统计为准，是近似的大小上限
+    """
+
+    def __init__(self, config, ext, tag=""):
+        self.dir = config["dir"] or os.path.join(os.path.expanduser("~"), ".cache", "data_augment", "frames")
+        self.max_bytes = int(config["max_gb"] * (1 << 30))
+        self.ext = ext
+        self.suffix = f"_{tag}{ext}" if tag else ext
+        self.size = None        # 缓存总大小，首次写入时统计
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def path_for(self, key, position):
+        return os.path.join(self.dir, key[:2], f"{key}_{position}{self.suffix}")
+
+    def fetch(self, key, position, output_dir):
+        """命中则链接到任务目录，返回 (路径, (宽, 高))；未命中返回None"""
+        path = self.path_for(key, position)
+        try:
+            os.utime(path)  # 刷新最近使用时间
+            dst_path = os.path.join(output_dir, os.path.basename(path))
+            if not os.path.exists(dst_path):
+                materialize(path, dst_path)
+            with Image.open(dst_path) as image:
+                size = image.size
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None  # 未缓存，或刚被其他进程淘汰
+        with self.lock:
+            self.hits += 1
+        return dst_path, size
+
+    def put(self, key, position, data):
+        """写入一帧编码后的数据，返回缓存文件路径"""
+        path = self.path_for(key, position)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            if self.size is None:
+                self.size = sum(size for _, size, _ in self.entries())
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self.evict()
+        return path
+
+    def entries(self):
+        for dirpath, _, filenames in os.walk(self.dir):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+                yield stat.st_mtime, stat.st_size, os.path.join(dirpath, filename)
+
+    def evict(self):
+        """淘汰最久未使用的帧，直到总大小降到上限的九成（调用方持有锁）"""
+        entries = sorted(self.entries())
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+            self.evicted += 1
+
+    def summary(self):
+        return (f"抽帧缓存：命中 {self.hits}，新解码 {self.misses}，淘汰 {self.evicted}，"
+                f"上限 {self.max_bytes / (1 << 30):g}GB：{os.path.abspath(self.dir)}")
+
+
+class FrameWriter:
+    """
+    抽帧存储：在线程池中编码写盘，不阻塞抽帧
+    文件名为像素内容的哈希，内容相同的帧（重复运行、重复视频）直接复用已有文件
+    """
+
+    def __init__(self, config, cache=None):
+        self.ext, self.params, _ = codec_settings(config)
+        self.workers = config["workers"]
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="frame")
+        self.written = 0
+        self.reused = 0
+        self.lock = threading.Lock()
+
+    def submit(self, frame, output_dir, cache_key=None):
+        """提交一帧，返回结果为文件路径的 Future；给出 (视频哈希, 帧位置) 时同时写入抽帧缓存"""
+        if self.cache and cache_key:
+            return self.pool.submit(self.store_cached, frame, output_dir, cache_key)
+        return self.pool.submit(self.store, frame, output_dir)
+
+    def done(self, path):
+        """已有的帧文件（缓存命中），与 submit 一样返回 Future"""
+        future = Future()
+        future.set_result(path)
+        return future
+
+    def encode(self, frame):
+        ok, data = cv2.imencode(self.ext, frame, self.params)
+        if not ok:
+            raise RuntimeError(f"帧编码失败（{self.ext}）")
+        return data.tobytes()
+
+    def store_cached(self, frame, output_dir, cache_key):
+        """写入缓存后链接到任务目录（文件名为视频哈希+帧位置）"""
+        path = self.cache.put(*cache_key, self.encode(frame))
+        dst_path = os.path.join(output_dir, os.path.basename(path))
+        materialize(path, dst_path)
+        with self.lock:
+            self.written += 1
+        return dst_path
+
+    def store(self, frame, output_dir):
+        digest = hashlib.blake2b(frame, digest_size=16)
+        digest.update(str(frame.shape).encode("ascii"))
+        path = os.path.join(output_dir, digest.hexdigest() + self.ext)
+        if os.path.exists(path):
+            with self.lock:
+                self.reused += 1
+            return path
+        data = self.encode(frame)
+        os.makedirs(output_dir, exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.written += 1
+        return path
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def build_frame_cache(spec):
+    if spec["inputs"]["kind"] != "videos" or not spec["frame_cache"]["enabled"]:
+        return None
+    ext, _, tag = codec_settings(spec["frame_store"])
+    return FrameCache(spec["frame_cache"], ext, tag)
@@ -0,0 +1,15 @@
+"""文件工具：结果库、抽帧缓存与录制共用"""
+import os
+import shutil
+import threading
+
+
+def materialize(src_path, dst_path):
+    """硬链接到目标路径（跨文件系统时复制）"""
+    os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
+    tmp_path = f"{dst_path}.{threading.get_ident()}.link"
+    try:
+        os.link(src_path, tmp_path)
+    except OSError:
+        shutil.copy2(src_path, tmp_path)
+    os.replace(tmp_path, dst_path)
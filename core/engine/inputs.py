@@ -0,0 +1,209 @@
+"""输入发现：把图片/视频/增强帧对统一整理为待处理的输入项"""
+import os
+import re
+from collections import deque
+
+from .frames import FrameWriter, read_frame, video_digest
+from .logs import log
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv")
+
+
+def find_files(root_dir, extensions):
+    """逐个产出目录下（含子目录）所有指定扩展名的文件，边遍历边派发"""
+    extensions = tuple(ext.lower() for ext in extensions)
+    for dirpath, dirnames, filenames in os.walk(root_dir):
+        # 跳过隐藏目录（如预处理缓存 .preprocessed）
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if filename.lower().endswith(extensions):
+                yield os.path.join(dirpath, filename)
+
+
+def collect_sources(source, extensions, name_keywords=None):
+    """确定处理对象：目录则流式遍历（可按关键词过滤），单个文件则直接使用"""
+    extensions = tuple(ext.lower() for ext in extensions)
+    if os.path.isdir(source):
+        files = find_files(source, extensions)
+        if name_keywords:
+            files = (f for f in files if any(k in os.path.basename(f) for k in name_keywords))
+        return files
+    if os.path.isfile(source) and source.lower().endswith(extensions):
+        return iter([source])
+    raise ValueError(f"错误：无效的输入源 {source}")
+
+
+def make_part(image_path, end_image=None, frame=None, size=None, stem=None):
+    """一次调用所需的输入文件；stem/ext 取自上传的图片（抽帧存储按内容命名，stem 另行指定），用于结果命名"""
+    file_stem, ext = os.path.splitext(os.path.basename(image_path))
+    stem = stem or file_stem
+    return {
+        "image": image_path,
+        "end_image": end_image,
+        "frame": frame,
+        "size": size,
+        "stem": stem,
+        "ext": ext,
+    }
+
+
+def image_items(spec, source):
+    inputs = spec["inputs"]
+    for input_index, path in enumerate(collect_sources(source, inputs["extensions"], inputs["name_keywords"])):
+        yield {"source": path, "input_index": input_index, "parts": [make_part(path)]}
+
+
+def video_item(spec, video_path, input_index, output_root, writer):
+    """提取一个视频的指定帧并提交编码，返回帧文件尚未写完的输入项（无效视频返回None）
+
+    启用抽帧缓存时先按视频内容哈希查找，命中的帧不再解码。
+    """
+    inputs = spec["inputs"]
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    key = video_digest(video_path) if writer.cache else None
+    parts = []
+    for position in inputs["frames"]:
+        frame_dir = os.path.join(output_root, inputs["frame_dir"].format(frame=position))
+        part = make_part(f"{base_name}{writer.ext}", frame=position, stem=f"{base_name}_{position}_frame")
+        cached = writer.cache.fetch(key, position, frame_dir) if key else None
+        if cached:
+            path, part["size"] = cached
+            part["image"] = writer.done(path)
+            parts.append(part)
+            continue
+        frame = read_frame(video_path, position)
+        if frame is None:
+            continue
+        height, width = frame.shape[:2]
+        part["size"] = (width, height)
+        part["image"] = writer.submit(frame, frame_dir, (key, position) if key else None)
+        parts.append(part)
+    if not parts or (inputs["chain_frames"] and len(parts) != len(inputs["frames"])):
+        log.warning(f"跳过视频 {video_path}（无有效帧可处理）", extra={"fields": {"event": "input_skipped", "input": video_path}})
+        return None
+    sizes = {part["size"] for part in parts}
+    if len(sizes) > 1:
+        if inputs["size_mismatch"] == "skip":
+            log.warning(f"警告：视频 {video_path} 各帧尺寸不一致 {sorted(sizes)}，跳过增强",
+                        extra={"fields": {"event": "input_skipped", "input": video_path}})
+            return None
+        log.warning(f"警告：视频 {video_path} 各帧尺寸不一致 {sorted(sizes)}，可能影响配对效果",
+                    extra={"fields": {"event": "size_mismatch", "input": video_path}})
+    return {"source": video_path, "input_index": input_index, "parts": parts}
+
+
+def resolve_frames(item):
+    """等待输入项的帧文件写完，把 Future 换成路径；写盘失败返回None"""
+    try:
+        for part in item["parts"]:
+            part["image"] = part["image"].result()
+    except Exception as e:
+        log.warning(f"跳过视频 {item['source']}（保存帧失败：{str(e)}）",
+                    extra={"fields": {"event": "input_skipped", "input": item["source"], "error": str(e)}})
+        return None
+    return item
+
+
+def video_items(spec, source, output_root, frame_cache=None):
+    """视频输入：提取指定帧，同一视频的各帧组成一个输入项
+
+    帧在线程池中编码写盘，抽取后续视频的同时编码前面的帧；输入项按原顺序、在帧文件写完后产出。
+    """
+    writer = FrameWriter(spec["frame_store"], frame_cache)
+    window = deque()
+    try:
+        for input_index, video_path in enumerate(collect_sources(source, VIDEO_EXTENSIONS)):
+            item = video_item(spec, video_path, input_index, output_root, writer)
+            if item:
+                window.append(item)
+            while window and (len(window) > writer.workers * 2
+                              or all(part["image"].done() for part in window[0]["parts"])):
+                item = resolve_frames(window.popleft())
+                if item:
+                    yield item
+        while window:
+            item = resolve_frames(window.popleft())
+            if item:
+                yield item
+    finally:
+        writer.close()
+
+
+def frame_pair_items(spec, source):
+    """增强首尾帧配对：按（原始视频名, prompt_id）匹配首帧与尾帧（目录相对于 source）
+
+    配对需要先索引首帧目录（每项仅保存一个路径），尾帧目录则流式遍历。
+    """
+    inputs = spec["inputs"]
+    pattern = re.compile(inputs["pair_pattern"])
+    first_dir = os.path.join(source, inputs["first_dir"])
+    last_dir = os.path.join(source, inputs["last_dir"])
+    for dir_path in (first_dir, last_dir):
+        if not os.path.isdir(dir_path):
+            raise ValueError(f"错误：目录不存在 - {dir_path}")
+
+    first_frames = {}
+    for filename in sorted(os.listdir(first_dir)):
+        match = pattern.match(filename)
+        if match and match.group(2) == "first":
+            first_frames[(match.group(1), int(match.group(3)))] = os.path.join(first_dir, filename)
+
+    input_index = 0
+    for filename in sorted(os.listdir(last_dir)):
+        match = pattern.match(filename)
+        if not match or match.group(2) != "last":
+            continue
+        key = (match.group(1), int(match.group(3)))
+        first_path = first_frames.pop(key, None)
+        if first_path is None:
+            continue
+        last_path = os.path.join(last_dir, filename)
+        yield {
+            "source": first_path,
+            "input_index": input_index,
+            "base_name": key[0],
+            "pair_id": key[1],
+            "parts": [make_part(first_path, end_image=last_path)],
+        }
+        input_index += 1
+
+    for base_name, pair_id in first_frames:
+        log.warning(f"警告：未找到匹配的尾帧 - 视频名: {base_name}, prompt_id: {pair_id}",
+                    extra={"fields": {"event": "unpaired_frame", "input": base_name, "prompt_id": pair_id}})
+
+
+def check_source(spec, source):
+    """启动前检查输入源，返回错误信息（无错误返回None）"""
+    inputs = spec["inputs"]
+    if inputs["kind"] == "frame_pairs":
+        for name in ("first_dir", "last_dir"):
+            dir_path = os.path.join(source, inputs[name])
+            if not os.path.isdir(dir_path):
+                return f"错误：目录不存在 - {dir_path}"
+        return None
+    if not os.path.exists(source):
+        return f"错误：无效的输入源 {source}"
+    return None
+
+
+def count_inputs(spec, source):
+    """统计输入数量（只遍历目录，不抽帧、不保存路径）"""
+    inputs = spec["inputs"]
+    kind = inputs["kind"]
+    if kind == "images":
+        paths = collect_sources(source, inputs["extensions"], inputs["name_keywords"])
+    elif kind == "videos":
+        paths = collect_sources(source, VIDEO_EXTENSIONS)
+    else:
+        paths = frame_pair_items(spec, source)
+    return sum(1 for _ in paths)
+
+
+def iter_inputs(spec, source, output_root, frame_cache=None):
+    """按规格的 inputs.kind 惰性生成输入项"""
+    kind = spec["inputs"]["kind"]
+    if kind == "images":
+        return image_items(spec, source)
+    if kind == "videos":
+        return video_items(spec, source, output_root, frame_cache)
+    return frame_pair_items(spec, source)
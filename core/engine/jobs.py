@@ -0,0 +1,276 @@
+"""任务展开：输入项 × prompt 分配 → 具体的接口调用任务"""
+import os
+import random
+import threading
+
+from .masks import build_masker
+from .preprocess import Preprocessor, image_size, pick_bucket
+from .prompts import build_prompt_space, drop_axes, select_prompt_indices, stable_hash
+from .spec import deep_merge
+
+# 有属性配额时每个名额最多尝试抽取的候选数
+QUOTA_DRAW_FACTOR = 20
+
+
+def resolve_size(spec, part):
+    """确定生成尺寸：original 沿用输入尺寸，uniform 使用统一尺寸，bucket 取最接近的分辨率桶"""
+    size = spec["size"]
+    if size["mode"] == "uniform":
+        return size["width"], size["height"]
+    if not part["size"]:
+        # 同一输入的所有变体共用这一次头信息读取
+        part["size"] = image_size(part["image"])
+    if size["mode"] == "bucket":
+        return pick_bucket(*part["size"], size["buckets"])
+    return part["size"]
+
+
+def resolve_seed(call, rng, key=None, attempt=1):
+    """
+    random 每次随机抽取；stable 由输出路径与第几次生成决定，重新运行时调用参数不变，可命中结果库
+    （两者都在 seed_range 内，重新生成时都会换种子）
+    """
+    low, high = call["seed_range"]
+    if call["seed"] == "random":
+        return rng.randint(low, high)
+    if call["seed"] == "stable":
+        return low + stable_hash(f"{key}#{attempt}", high - low + 1)
+    return call["seed"]
+
+
+def call_steps(params):
+    """推理步数：视频接口为 steps，图像接口为 num_inference_steps"""
+    for name in ("steps", "num_inference_steps"):
+        if isinstance(params.get(name), int):
+            return params[name]
+    return None
+
+
+def make_job(spec, output_root, item, part, space, prompt_index, variant_index, rng):
+    """构造一次接口调用任务（包含命名所需的全部字段）"""
+    attrs = space.attrs(prompt_index)
+    prompt = space.render(prompt_index)
+    width, height = resolve_size(spec, part)
+    output = spec["output"]
+
+    fields = {k: v for k, v in item.items() if k != "parts"}
+    fields.update(part)
+    fields.update(attrs)
+    fields.update({
+        "prompt_id": space.prompt_id(prompt_index),
+        "index": variant_index,
+        "frame": part["frame"] or "",
+        "pid": stable_hash("".join(str(v) for v in attrs.values()) + str(variant_index), 100000),
+        "prompt_hash": stable_hash(prompt, 10000),
+    })
+    if output["ext"]:
+        fields["ext"] = output["ext"]
+    out_dir = os.path.join(output_root, output["dir"].format(**fields))
+    out_path = os.path.join(out_dir, output["name"].format(**fields))
+    key = os.path.relpath(out_path, output_root)
+    params = spec["call"]["params"]
+
+    return {
+        "key": key,
+        "task": spec["name"],
+        "source": item["source"],
+        "image": part["image"],
+        "end_image": part["end_image"],
+        "mask": None,
+        "frame": part["frame"],
+        "prompt": prompt,
+        "prompt_id": fields["prompt_id"],
+        "attrs": attrs,
+        "index": variant_index,
+        "seed": resolve_seed(spec["call"], rng, key),
+        "width": width,
+        "height": height,
+        "output": out_path,
+        # 耗时/存储模型的分组依据（记入清单，用于 --dry-run 估算）
+        "endpoint": spec["endpoint"]["url"].rstrip("/") + spec["endpoint"]["api_name"],
+        "steps": call_steps(params),
+        "frame_num": params.get("frame_num") if isinstance(params.get("frame_num"), int) else None,
+        "then": [],
+        "unit": None,
+        "step": 0,
+    }
+
+
+def step_specs(spec):
+    """
+    链式修正步骤的规格：followup 为一个表或表数组，每一步以上一步的结果为输入
+    每步可单独指定 endpoint / call（缺省沿用主流程），结果按上一步的文件名命名到 output_dir
+    """
+    followup = spec["followup"]
+    if not followup:
+        return []
+    steps = followup if isinstance(followup, list) else [followup]
+    specs = []
+    for number, step in enumerate(steps, 1):
+        specs.append(deep_merge(spec, {
+            "name": f"{spec['name']}_followup" + (f"{number}" if len(steps) > 1 else ""),
+            "endpoint": step.get("endpoint") or {},
+            "call": step.get("call") or {},
+            "prompts": {"list": [step["prompt"]], "template": None, "axes": {},
+                        "count": None, "id_offset": step.get("prompt_id", 0)},
+            "output": {"dir": step.get("output_dir", "corrected")},
+            "followup": None,
+        }))
+    return specs
+
+
+def step_job(step_spec, output_root, parent, number):
+    """上一步结果的修正任务：输入为上一步的输出文件，所属变体与上一步相同"""
+    output = step_spec["output"]
+    stem, ext = os.path.splitext(os.path.basename(parent["output"]))
+    prompt = step_spec["prompts"]["list"][0]
+    fields = dict(parent["attrs"])
+    fields.update({
+        "stem": stem,
+        "ext": output["ext"] or ext,
+        "prompt_id": step_spec["prompts"]["id_offset"],
+        "index": parent["index"],
+        "frame": parent["frame"] or "",
+        "pid": stable_hash(stem, 100000),
+        "prompt_hash": stable_hash(prompt, 10000),
+    })
+    out_path = os.path.join(output_root, output["dir"].format(**fields), output["name"].format(**fields))
+    endpoint = step_spec["endpoint"]
+    params = step_spec["call"]["params"]
+    job = dict(parent)
+    job.update({
+        "key": os.path.relpath(out_path, output_root),
+        "task": step_spec["name"],
+        "image": parent["output"],
+        "end_image": None,
+        "prompt": prompt,
+        "prompt_id": fields["prompt_id"],
+        "output": out_path,
+        "endpoint": endpoint["url"].rstrip("/") + endpoint["api_name"],
+        "steps": call_steps(params),
+        "frame_num": params.get("frame_num") if isinstance(params.get("frame_num"), int) else None,
+        "then": [],
+        "step": number,
+        "spec": step_spec,
+        "parent": parent,
+    })
+    return job
+
+
+class JobFactory:
+    """按规格把输入项展开为任务；生产线程与派发线程（补发失败名额）共用，内部加锁"""
+
+    def __init__(self, spec, output_root, rng, planner=None):
+        self.spec = spec
+        self.output_root = output_root
+        self.rng = rng
+        self.planner = planner
+        prompts = spec["prompts"]
+        if spec["effects"]["enabled"]:
+            # 光线/监控特效改由本地批量施加，不再为每种组合各调用一次接口
+            prompts = drop_axes(prompts, spec["effects"]["drop_axes"], spec["effects"]["neutral"])
+        self.space = build_prompt_space(prompts)
+        self.selected = select_prompt_indices(self.space, spec["prompts"]["count"], rng)
+        self.preprocessor = Preprocessor(spec["preprocess"], output_root)
+        self.masker = build_masker(spec, output_root)
+        self.steps = step_specs(spec)
+        self.lock = threading.Lock()
+
+    def pick_prompts(self, count):
+        """为单个输入分配prompt：未指定数量时使用全部已选prompt；有配额时跳过配额已满的组合"""
+        fanout = self.spec["fanout"]
+        if count is None:
+            candidates = iter(self.selected)
+        elif fanout["replace"]:
+            # 每个变体独立随机抽取属性组合
+            candidates = (self.rng.choice(self.selected) for _ in range(count * QUOTA_DRAW_FACTOR))
+        else:
+            candidates = iter(self.rng.sample(self.selected, min(count * QUOTA_DRAW_FACTOR, len(self.selected))))
+        picked = 0
+        for prompt_index in candidates:
+            if count is not None and picked >= count:
+                return
+            if self.planner and not self.planner.reserve(self.space.attrs(prompt_index)):
+                continue
+            picked += 1
+            yield prompt_index
+
+    def upload_size(self, job, part):
+        """实际上传图片的尺寸（预处理可能已缩放），掩码须与之一致"""
+        if isinstance(job["image"], str):
+            return image_size(job["image"])
+        return part["size"]  # 视频帧尚在编码，尺寸取自解码结果
+
+    def add_steps(self, job, rng):
+        """修正步骤依次挂在任务之后：上一步成功（并通过校验）即派发下一步"""
+        for number, step_spec in enumerate(self.steps, 1):
+            nxt = step_job(step_spec, self.output_root, job, number)
+            nxt["seed"] = resolve_seed(step_spec["call"], rng, nxt["key"])
+            job["then"].append(nxt)
+            job = nxt
+
+    def draw(self, item, prompts):
+        """加锁抽取下一个变体：prompt、变体编号与该变体专用的随机数发生器；没有可用prompt时返回None"""
+        with self.lock:
+            prompt_index = next(prompts, None)
+            if prompt_index is None:
+                return None
+            variant_index = item["next_variant"]
+            item["next_variant"] += 1
+            return prompt_index, variant_index, random.Random(self.rng.getrandbits(64))
+
+    def variant(self, item, prompt_index, variant_index, rng):
+        """
+        一个变体（prompt × 输入项）的任务；chain_frames 时后续帧挂在前一帧之后，返回可直接派发的任务列表
+        预处理（读图、缩放、重新编码）不持锁，生产线程与派发线程的补发互不等待
+        """
+        part_jobs = [self.preprocessor.apply(make_job(self.spec, self.output_root, item, part, self.space,
+                                                      prompt_index, variant_index, rng))
+                     for part in item["parts"]]
+        if self.masker:
+            for job, part in zip(part_jobs, item["parts"]):
+                self.masker.apply(job, self.upload_size(job, part))
+        if self.spec["inputs"]["chain_frames"]:
+            unit = {"item": item, "attrs": part_jobs[0]["attrs"]}
+            for job in part_jobs:
+                job["unit"] = unit
+                self.add_steps(job, rng)
+            for prev, nxt in zip(part_jobs, part_jobs[1:]):
+                prev["then"].append(nxt)
+            return part_jobs[:1]
+        for job in part_jobs:
+            job["unit"] = {"item": item, "attrs": job["attrs"]}
+            self.add_steps(job, rng)
+        return part_jobs
+
+    def iter_jobs(self, items):
+        """惰性展开全部输入项的任务"""
+        for position, item in enumerate(items):
+            if self.planner:
+                count = self.planner.allocation(position)
+                if count == 0:
+                    continue
+            else:
+                count = self.spec["fanout"]["per_input"]
+            item["next_variant"] = 0
+            prompts = self.pick_prompts(count)
+            while True:
+                drawn = self.draw(item, prompts)
+                if drawn is None:
+                    break
+                yield from self.variant(item, *drawn)
+
+    def reseed(self, job):
+        """重新生成前更换随机种子（固定种子的任务保持不变）"""
+        with self.lock:
+            job["seed"] = resolve_seed(job.get("spec", self.spec)["call"], self.rng, job["key"], job.get("attempt", 1))
+
+    def replacement(self, item):
+        """为失败的变体补发：同一输入项换一个prompt与新的变体编号"""
+        drawn = self.draw(item, self.pick_prompts(1))
+        if drawn is None:
+            return []
+        jobs = self.variant(item, *drawn)
+        for job in jobs:
+            job["replacement"] = True  # 服务端耗时报告中计为补发
+        return jobs
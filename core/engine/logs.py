@@ -0,0 +1,129 @@
+"""结构化日志：逐任务事件写入 JSON Lines（按大小轮转），控制台只输出限流后的警告；格式化与写盘在后台线程完成"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from tqdm import tqdm
+
+LOGGER_NAME = "data_augment"
+LOG_NAME = "run.jsonl"
+
+log = logging.getLogger(LOGGER_NAME)
+_LISTENER = None
+_LISTENER_LOCK = threading.Lock()
+
+
+def job_fields(job, event, **extra):
+    """单个任务的结构化字段，作为 logging 的 extra 传入"""
+    fields = {
+        "event": event,
+        "task": job["task"],
+        "input": job["source"],
+        "key": job["key"],
+        "prompt_id": job["prompt_id"],
+        "endpoint": job["endpoint"],
+        "seed": job["seed"],
+    }
+    fields.update(extra)
+    return {"fields": fields}
+
+
+class JsonFormatter(logging.Formatter):
+    """一行一条 JSON：时间、级别、线程、消息、结构化字段（异常时含 traceback）"""
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """入队前只做必要的处理：合并消息参数、把异常堆栈转为字段（traceback 对象不能跨线程延后格式化）"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            fields = dict(getattr(record, "fields", {}))
+            fields["traceback"] = logging.Formatter().formatException(record.exc_info)
+            record.fields = fields
+            record.exc_info = None
+            record.exc_text = None
+        return record
+
+
+class ConsoleHandler(logging.Handler):
+    """
+    控制台输出：不打印堆栈（完整堆栈在日志文件中），经 tqdm.write 输出不打断进度条
+    同一事件类型每 interval 秒最多输出 limit 条，超出的只计数，下次输出时附上省略数量
+    """
+
+    def __init__(self, limit, interval=60):
+        super().__init__()
+        self.limit = limit
+        self.interval = interval
+        self.windows = {}
+
+    def emit(self, record):
+        event = getattr(record, "fields", {}).get("event", record.name)
+        now = time.time()
+        start, shown, dropped = self.windows.get(event, (now, 0, 0))
+        if now - start >= self.interval:
+            start, shown = now, 0
+        if shown >= self.limit:
+            self.windows[event] = (start, shown, dropped + 1)
+            return
+        message = record.getMessage()
+        if dropped:
+            message += f"（此前另有 {dropped} 条同类消息已省略，详见日志文件）"
+        self.windows[event] = (start, shown + 1, 0)
+        tqdm.write(message)
+
+
+def configure_logging(path, config):
+    """
+    启动后台日志线程；进程内只配置一次（常驻服务中后续任务沿用首次配置的日志文件）
+    日志调用方只把记录放入队列，JSON 序列化、写盘和轮转都在监听线程中进行
+    """
+    global _LISTENER
+    with _LISTENER_LOCK:
+        if _LISTENER is not None:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=config["max_bytes"], backupCount=config["backups"], encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        console = ConsoleHandler(config["console_limit"])
+        console.setLevel(config["console_level"])
+
+        records = queue.Queue(-1)
+        log.addHandler(RecordQueueHandler(records))
+        log.setLevel(logging.DEBUG)
+        log.propagate = False
+        _LISTENER = logging.handlers.QueueListener(records, file_handler, console, respect_handler_level=True)
+        _LISTENER.start()
+        atexit.register(_LISTENER.stop)
+
+
+def flush_logs():
+    """等待已入队的日志记录全部写出；日志线程继续运行，常驻服务的后续任务沿用"""
+    with _LISTENER_LOCK:
+        listener = _LISTENER
+    if listener is not None:
+        listener.queue.join()
+
+
+def run_log_path(spec, output_root):
+    return os.path.join(output_root, spec["logging"]["dir"], LOG_NAME)
@@ -0,0 +1,61 @@
+"""运行清单：逐条记录任务结果（JSON Lines），用于断点续跑和统计"""
+import json
+import os
+import threading
+import time
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class Manifest:
+    """输出目录下的 manifest.jsonl，多线程安全追加"""
+
+    def __init__(self, output_root):
+        self.path = os.path.join(output_root, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        self.done = set()
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 上次运行中断时可能留下半行
+                    if record.get("status") == "ok":
+                        self.done.add(record["key"])
+                    else:
+                        self.done.discard(record["key"])
+
+    def is_done(self, job):
+        """已成功且结果文件仍存在的任务视为完成"""
+        return job["key"] in self.done and os.path.exists(job["output"])
+
+    def record(self, job, status, latency=None, error=None):
+        entry = {
+            "key": job["key"],
+            "task": job["task"],
+            "status": status,
+            "source": job["source"],
+            "output": job["output"],
+            "prompt_id": job["prompt_id"],
+            "attrs": job["attrs"],
+            "seed": job["seed"],
+            "width": job["width"],
+            "height": job["height"],
+            "endpoint": job["endpoint"],
+            "steps": job["steps"],
+            "frame_num": job["frame_num"],
+            "latency": latency,
+            "inflight": job.get("inflight"),
+            "cached": bool(job.get("cached")),
+            "bytes": os.path.getsize(job["output"]) if status == "ok" and os.path.exists(job["output"]) else None,
+            "error": error,
+            "time": time.time(),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            if status == "ok":
+                self.done.add(job["key"])
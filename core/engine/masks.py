@@ -0,0 +1,119 @@
+"""局部重绘/扩图掩码：按矩形框、多边形或按摄像头复用的模板在本地生成，按内容哈希缓存"""
+import hashlib
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from .logs import log
+
+
+def scale_points(points, width, height):
+    """坐标不大于1时按图像宽高的比例换算为像素，否则视为像素坐标"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if np.all(np.abs(points) <= 1):
+        points = points * (width, height)
+    return np.rint(points).astype(np.int32)
+
+
+def build_mask(shapes, width, height, feather=0, invert=False):
+    """按形状生成掩码（uint8，255 为需要重绘的区域）"""
+    mask = np.zeros((height, width), dtype=np.uint8)
+    for box in shapes.get("boxes") or []:
+        (x0, y0), (x1, y1) = np.sort(scale_points(box, width, height), axis=0)
+        mask[max(y0, 0):max(y1, 0), max(x0, 0):max(x1, 0)] = 255
+    polygons = [scale_points(polygon, width, height) for polygon in shapes.get("polygons") or []]
+    if polygons:
+        cv2.fillPoly(mask, polygons, 255)
+    if shapes.get("image") is not None:
+        template = shapes["image"]
+        if template.shape != mask.shape:
+            template = cv2.resize(template, (width, height), interpolation=cv2.INTER_NEAREST)
+        np.maximum(mask, template, out=mask)
+    if invert:
+        mask = 255 - mask
+    if feather:
+        # 羽化只向掩码外扩散，原掩码内部保持完全重绘
+        blurred = cv2.GaussianBlur(mask, (0, 0), feather)
+        mask = np.maximum(mask, blurred)
+    return mask
+
+
+class Masker:
+    """
+    为每个任务准备掩码文件：
+    - templates 按文件名关键词匹配输入（如摄像头编号），命中则使用该模板，否则使用缺省的 boxes/polygons
+    - 模板可以是掩码图片路径（相对规格文件），也可以是 {boxes, polygons}
+    - 同一形状与尺寸只生成一次；文件按像素内容哈希命名，不同形状生成相同掩码时共用一个文件
+    掩码保存为 RGBA PNG（白色，alpha 为掩码），可直接作为 ImageEditor 的图层上传
+    """
+
+    def __init__(self, config, output_root, base_dir):
+        self.config = config
+        self.dir = os.path.join(output_root, config["dir"])
+        self.base_dir = base_dir
+        self.templates = {}
+        self.paths = {}
+        self.lock = threading.Lock()
+
+    def template(self, keyword):
+        """读取模板图片（灰度，非零即重绘区域），进程内只读一次"""
+        image = self.templates.get(keyword)
+        if image is None:
+            path = os.path.join(self.base_dir, self.config["templates"][keyword])
+            image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                raise FileNotFoundError(f"无法读取掩码模板 {path}")
+            if image.ndim == 3:
+                image = image[..., 3] if image.shape[2] == 4 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            image = self.templates[keyword] = np.where(image > 0, 255, 0).astype(np.uint8)
+        return image
+
+    def shapes_for(self, source):
+        name = os.path.basename(source)
+        for keyword, template in self.config["templates"].items():
+            if keyword in name:
+                if isinstance(template, str):
+                    return keyword, {"image": self.template(keyword)}
+                return keyword, template
+        return None, self.config
+
+    def path_for(self, source, width, height):
+        keyword, shapes = self.shapes_for(source)
+        key = (keyword, width, height)
+        with self.lock:
+            path = self.paths.get(key)
+        if path:
+            return path
+
+        mask = build_mask(shapes, width, height, self.config["feather"], self.config["invert"])
+        if not mask.any():
+            log.warning(f"掩码为空 {source}（{width}x{height}），整张图不会被重绘",
+                        extra={"fields": {"event": "empty_mask", "input": source}})
+        digest = hashlib.blake2b(mask.tobytes(), digest_size=16)
+        digest.update(json.dumps([width, height]).encode("utf-8"))
+        path = os.path.join(self.dir, digest.hexdigest() + ".png")
+        if not os.path.exists(path):
+            os.makedirs(self.dir, exist_ok=True)
+            rgba = np.empty((height, width, 4), dtype=np.uint8)
+            rgba[..., :3] = 255
+            rgba[..., 3] = mask
+            tmp_path = f"{path}.{threading.get_ident()}.tmp.png"
+            cv2.imwrite(tmp_path, rgba)
+            os.replace(tmp_path, path)
+        with self.lock:
+            self.paths[key] = path
+        return path
+
+    def apply(self, job, size):
+        """为任务指定掩码文件（尺寸与实际上传的图片一致）"""
+        job["mask"] = self.path_for(job["source"], *size)
+        return job
+
+
+def build_masker(spec, output_root):
+    if not spec["mask"]["enabled"]:
+        return None
+    return Masker(spec["mask"], output_root, os.path.dirname(spec["path"]))
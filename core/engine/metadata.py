@@ -0,0 +1,255 @@
+"""样本元数据索引：每个成功结果一行，属性取值下标与生成参数按列存为 NumPy 结构化数组，增量追加、毫秒级筛选"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from .effects import VIDEO_ORDER
+from .logs import log
+
+ROWS_NAME = "rows.bin"
+KEYS_NAME = "keys.txt"
+SOURCES_NAME = "sources.txt"
+SCHEMA_NAME = "schema.json"
+# 帧选取方式：0 无，1 首帧，2 尾帧，3 帧序号，4 时间点（序号/秒数记在 frame_pos 列）
+FRAME_CODES = {None: 0, "first": 1, "last": 2, "index": 3, "time": 4}
+FRAME_CODES_BY_NAME = {name: code for name, code in FRAME_CODES.items() if name}
+# 本地特效参数列：不是特效变体的行取不改变画面的值
+EFFECT_COLUMNS = [
+    ("fx_gamma", "<f4", 1.0),
+    ("fx_gain", "<f4", 1.0),
+    ("fx_backlight", "<f4", 0.0),
+    ("fx_cast_b", "<f4", 1.0),
+    ("fx_cast_g", "<f4", 1.0),
+    ("fx_cast_r", "<f4", 1.0),
+    ("fx_blur", "<f4", 0.0),
+    ("fx_noise", "<f4", 0.0),
+    ("fx_scale", "<f4", 1.0),
+    ("fx_quality", "<i2", 0),
+    ("fx_drop", "i1", 1),
+]
+
+# 固定列（属性列按任务的属性轴追加，每轴一个 int16 取值下标，-1 表示无此属性）
+BASE_COLUMNS = [
+    ("source", "<i4"),          # sources.txt 中的行号
+    ("prompt_id", "<i4"),
+    ("index", "<i4"),           # 同一输入的变体编号
+    ("seed", "<i8"),
+    ("width", "<i4"),
+    ("height", "<i4"),
+    ("frame", "i1"),            # 帧选取方式（FRAME_CODES）
+    ("frame_pos", "<f8"),       # 帧序号或秒数，首尾帧为 -1
+    ("step", "i1"),             # 0 主流程，N 为第 N 步链式修正
+    ("effects_variant", "<i2"), # 本地特效变体编号，-1 为生成原图
+    ("effects", "<i2"),         # 实际施加的本地特效，按 effects.VIDEO_ORDER 的位标记
+    ("bytes", "<i8"),
+    ("time", "<f8"),
+] + [(name, dtype) for name, dtype, _ in EFFECT_COLUMNS]
+
+
+def frame_columns(frame):
+    """帧选取方式编码与位置：first/last、帧序号（整数）、时间点（如 "2.5s"）"""
+    if frame in ("first", "last"):
+        return FRAME_CODES[frame], -1.0
+    if isinstance(frame, int):
+        return FRAME_CODES["index"], float(frame)
+    if isinstance(frame, str) and frame.endswith("s"):
+        return FRAME_CODES["time"], float(frame[:-1])
+    return FRAME_CODES[None], -1.0
+
+
+def effect_columns(record):
+    record = record or {}
+    return (record.get("flags", 0),) + tuple(record.get(name[3:], default) for name, _, default in EFFECT_COLUMNS)
+
+
+def build_schema(task, axis_names, axis_values):
+    axes = {name: list(values) for name, values in zip(axis_names, axis_values)}
+    dtype = BASE_COLUMNS + [(f"attr_{name}", "<i2") for name in axes]
+    return {"task": task, "axes": axes, "dtype": dtype, "frame_codes": FRAME_CODES_BY_NAME,
+            "effects": list(VIDEO_ORDER)}
+
+
+def schema_dtype(schema):
+    return np.dtype([tuple(column) for column in schema["dtype"]])
+
+
+def read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+class MetadataIndex:
+    """
+    运行中登记成功的结果：缓冲若干行后整块追加到 rows.bin，同时追加 keys.txt（行号与 rows.bin 对齐）
+    - 表目录按任务名+属性轴的哈希区分，属性轴改变后写入新表，旧表仍可查询
+    - 重新运行时已登记的结果跳过；中断时只写了一半的行在下次打开时截掉
+    主流程、链式修正与本地特效变体都会登记（分别以 step / effects_variant 列区分）
+    """
+
+    def __init__(self, config, output_root, task, space):
+        self.schema = build_schema(task, space.axis_names, space.axis_values)
+        digest = hashlib.sha1(json.dumps(self.schema, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+        self.dir = os.path.join(output_root, config["dir"], f"{task}-{digest.hexdigest()[:8]}")
+        self.dtype = schema_dtype(self.schema)
+        self.flush_rows = config["flush_rows"]
+        self.lookup = {name: {value: i for i, value in enumerate(values)}
+                       for name, values in self.schema["axes"].items()}
+        os.makedirs(self.dir, exist_ok=True)
+        with open(os.path.join(self.dir, SCHEMA_NAME), "w", encoding="utf-8") as f:
+            json.dump(self.schema, f, ensure_ascii=False, indent=1)
+
+        keys = read_lines(os.path.join(self.dir, KEYS_NAME))
+        rows_path = os.path.join(self.dir, ROWS_NAME)
+        size = os.path.getsize(rows_path) if os.path.exists(rows_path) else 0
+        count = size // self.dtype.itemsize
+        if count != len(keys) or size != count * self.dtype.itemsize:
+            # 上次中断在两个文件之间：截到两者都完整的行数
+            count = min(count, len(keys))
+            with open(rows_path, "ab") as f:
+                f.truncate(count * self.dtype.itemsize)
+            keys = keys[:count]
+            with open(os.path.join(self.dir, KEYS_NAME), "w", encoding="utf-8") as f:
+                f.writelines(key + "\n" for key in keys)
+        self.indexed = set(keys)
+        self.sources = {source: i for i, source in enumerate(read_lines(os.path.join(self.dir, SOURCES_NAME)))}
+        self.new_sources = []
+        self.buffer = []
+        self.added = 0
+        self.lock = threading.Lock()
+
+    def source_id(self, source):
+        source_id = self.sources.get(source)
+        if source_id is None:
+            source_id = self.sources[source] = len(self.sources)
+            self.new_sources.append(source)
+        return source_id
+
+    def add(self, job):
+        """登记一个成功的结果（同一结果只登记一次）"""
+        attrs = job["attrs"]
+        with self.lock:
+            if job["key"] in self.indexed:
+                return
+            self.indexed.add(job["key"])
+            seed = job["seed"] if isinstance(job["seed"], int) else -1
+            flags, *effects = effect_columns(job.get("effects"))
+            frame, frame_pos = frame_columns(job["frame"])
+            row = (self.source_id(job["source"]), job["prompt_id"], job["index"], seed,
+                   job["width"] or 0, job["height"] or 0, frame, frame_pos, job.get("step", 0),
+                   attrs.get("effects_variant", -1), flags,
+                   os.path.getsize(job["output"]) if os.path.exists(job["output"]) else 0, time.time())
+            row += tuple(effects)
+            row += tuple(self.lookup[name].get(attrs.get(name), -1) for name in self.schema["axes"])
+            self.buffer.append((job["key"], row))
+            if len(self.buffer) >= self.flush_rows:
+                self.flush()
+
+    def flush(self):
+        """把缓冲的行追加到磁盘（调用方持有锁）"""
+        if not self.buffer:
+            return
+        if self.new_sources:
+            with open(os.path.join(self.dir, SOURCES_NAME), "a", encoding="utf-8") as f:
+                f.writelines(source + "\n" for source in self.new_sources)
+            self.new_sources = []
+        rows = np.array([row for _, row in self.buffer], dtype=self.dtype)
+        with open(os.path.join(self.dir, ROWS_NAME), "ab") as f:
+            rows.tofile(f)
+        with open(os.path.join(self.dir, KEYS_NAME), "a", encoding="utf-8") as f:
+            f.writelines(key + "\n" for key, _ in self.buffer)
+        self.added += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        with self.lock:
+            try:
+                self.flush()
+            except OSError as e:
+                log.warning(f"元数据索引写入失败：{str(e)}", extra={"fields": {"event": "metadata_failed"}})
+
+    def summary(self):
+        return f"元数据索引：新增 {self.added} 行，共 {len(self.indexed)} 行：{os.path.abspath(self.dir)}"
+
+
+class MetadataTable:
+    """
+    元数据查询：行数据以 mmap 方式打开，条件筛选为整列向量化比较
+    table = MetadataTable("output/metadata/person_fall2-xxxx")
+    keys = table.keys_where(gender="女性", light="逆光条件下", position=["图像左侧区域", "图像左下角"])
+    keys = table.keys_where(effects=["blur", "noise"], fx_noise=slice(6, None), frame="last")
+    """
+
+    def __init__(self, table_dir):
+        self.dir = table_dir
+        with open(os.path.join(table_dir, SCHEMA_NAME), "r", encoding="utf-8") as f:
+            self.schema = json.load(f)
+        self.dtype = schema_dtype(self.schema)
+        self.keys = read_lines(os.path.join(table_dir, KEYS_NAME))
+        self.sources = read_lines(os.path.join(table_dir, SOURCES_NAME))
+        rows_path = os.path.join(table_dir, ROWS_NAME)
+        count = min(len(self.keys), os.path.getsize(rows_path) // self.dtype.itemsize) if os.path.exists(rows_path) else 0
+        self.rows = np.memmap(rows_path, dtype=self.dtype, mode="r", shape=(count,)) if count else \
+            np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def column(self, name):
+        """属性列返回取值下标，其余返回原始列"""
+        if name in self.schema["axes"]:
+            return self.rows[f"attr_{name}"]
+        return self.rows[name]
+
+    def mask(self, **conditions):
+        """
+        按条件筛选：属性可给取值文本或下标（列表表示任一），其余列给数值或列表，slice(下限, 上限) 表示区间
+        effects 给特效名（列表表示全部施加），frame 可给 first/last/index/time
+        """
+        selected = np.ones(len(self.rows), dtype=bool)
+        for name, wanted in conditions.items():
+            if isinstance(wanted, slice):
+                column = self.column(name)
+                if wanted.start is not None:
+                    selected &= column >= wanted.start
+                if wanted.stop is not None:
+                    selected &= column <= wanted.stop
+                continue
+            values = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            if name == "effects" and all(isinstance(v, str) for v in values):
+                bits = sum(1 << self.schema["effects"].index(v) for v in values)
+                selected &= (self.column(name) & bits) == bits
+                continue
+            if name == "frame":
+                values = [self.schema["frame_codes"][v] if isinstance(v, str) else v for v in values]
+            elif name in self.schema["axes"]:
+                axis = self.schema["axes"][name]
+                values = [axis.index(v) if isinstance(v, str) else v for v in values]
+            elif name == "source":
+                values = [self.sources.index(v) if isinstance(v, str) else v for v in values]
+            selected &= np.isin(self.column(name), values)
+        return selected
+
+    def keys_where(self, **conditions):
+        """满足条件的结果路径（相对输出根目录）"""
+        return [self.keys[i] for i in np.flatnonzero(self.mask(**conditions))]
+
+    def counts(self, name, **conditions):
+        """某属性在筛选结果中各取值的数量，用于均衡选样"""
+        column = self.column(name)[self.mask(**conditions)]
+        if name not in self.schema["axes"]:
+            values, counts = np.unique(column, return_counts=True)
+            return dict(zip(values.tolist(), counts.tolist()))
+        counts = np.bincount(column[column >= 0], minlength=len(self.schema["axes"][name]))
+        return dict(zip(self.schema["axes"][name], counts.tolist()))
+
+
+def build_metadata_index(spec, output_root, space):
+    if not spec["metadata"]["enabled"]:
+        return None
+    return MetadataIndex(spec["metadata"], output_root, spec["name"], space)
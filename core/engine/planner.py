@@ -0,0 +1,148 @@
+"""全局预算规划：按目标总数和属性配额分配变体，失败时重新平衡，达到配额即停止派发"""
+import threading
+from collections import deque
+
+
+class BudgetPlanner:
+    """
+    目标数量与属性配额的统一账本（多线程安全）
+    :param target: 全局目标数量（None表示不限，仅做属性配额）
+    :param total_inputs: 输入总数，用于事先均衡分配
+    :param per_input: 单个输入的变体上限
+    :param quotas: 属性配额，如 {"gender": {"男性": 2500, "女性": 0.5}}；小数表示占目标的比例
+    :param max_retries: 同一输入连续失败的重试次数，超过后把名额转给其他输入
+    """
+
+    def __init__(self, target=None, total_inputs=0, per_input=None, quotas=None, max_retries=2):
+        self.target = target
+        self.total_inputs = max(total_inputs, 1)
+        self.per_input = per_input
+        self.max_retries = max_retries
+        self.quotas = {}
+        for axis, values in (quotas or {}).items():
+            self.quotas[axis] = {
+                value: int(round(limit * target)) if isinstance(limit, float) and target else int(limit)
+                for value, limit in values.items()
+            }
+        # reserved：已展开但尚未失败的数量（含成功），保证成功数不会超过配额
+        self.reserved = {axis: {value: 0 for value in values} for axis, values in self.quotas.items()}
+        self.succeeded = 0
+        self.in_flight = 0
+        self.failed = 0
+        self.dropped = 0
+        self.carry = 0          # 因输入反复失败而转移给其他输入的名额
+        self.retries = {}       # 输入源 → 连续失败次数（成功后清除）
+        self.recent = deque(maxlen=32)  # 最近成功的输入项，输入耗尽后用于补足名额
+        self.makeup_left = max(10, (target or 0) // 10)  # 补足名额的尝试上限，防止服务端故障时无限重试
+        self.lock = threading.Lock()
+
+    # ---------- 事先分配 ----------
+    def allocation(self, position):
+        """第 position 个输入应生成的变体数：均衡分配目标，并承接此前转移来的名额"""
+        with self.lock:
+            if self.target is None:
+                count = self.per_input
+            else:
+                base, extra = divmod(self.target, self.total_inputs)
+                count = base + (1 if position < extra else 0)
+                if self.per_input is not None:
+                    count = min(count, self.per_input)
+            if count is not None and self.carry:
+                headroom = self.carry if self.per_input is None else max(0, self.per_input - count)
+                moved = min(self.carry, headroom)
+                self.carry -= moved
+                count += moved
+            return count
+
+    # ---------- 属性配额 ----------
+    def _accepts(self, attrs):
+        for axis, limits in self.quotas.items():
+            value = attrs.get(axis)
+            if value in limits and self.reserved[axis][value] >= limits[value]:
+                return False
+        return True
+
+    def reserve(self, attrs):
+        """占用配额；配额已满返回False"""
+        with self.lock:
+            if not self._accepts(attrs):
+                return False
+            self._change(attrs, 1)
+            return True
+
+    def _change(self, attrs, delta):
+        for axis, counts in self.reserved.items():
+            value = attrs.get(axis)
+            if value in counts:
+                counts[value] += delta
+
+    # ---------- 派发与结果 ----------
+    def admit(self, unit):
+        """派发前检查：已成功+在途达到目标即不再派发（多余的任务直接丢弃）"""
+        with self.lock:
+            if self.target is not None and self.succeeded + self.in_flight >= self.target:
+                self.dropped += 1
+                self._change(unit["attrs"], -1)
+                return False
+            self.in_flight += 1
+            return True
+
+    def succeed(self, unit):
+        with self.lock:
+            self.in_flight -= 1
+            self.succeeded += 1
+            self.retries.pop(unit["item"]["source"], None)
+            self.recent.append(unit["item"])
+
+    def fail(self, unit):
+        """记录失败并释放配额；返回应重试的输入项（None表示名额已转给后续输入）"""
+        with self.lock:
+            self.in_flight -= 1
+            self.failed += 1
+            self._change(unit["attrs"], -1)
+            if self.target is None:
+                return None
+            source = unit["item"]["source"]
+            attempts = self.retries.get(source, 0) + 1
+            if attempts <= self.max_retries:
+                self.retries[source] = attempts
+                return unit["item"]
+            self.retries.pop(source, None)
+            self.carry += 1
+            return None
+
+    def satisfied(self):
+        with self.lock:
+            return self.target is not None and self.succeeded >= self.target
+
+    def take_makeup(self):
+        """输入已全部展开后，从最近成功的输入中取一个承接转移名额"""
+        with self.lock:
+            if not self.carry or not self.recent or self.makeup_left <= 0:
+                return None
+            self.carry -= 1
+            self.makeup_left -= 1
+            self.recent.rotate(-1)
+            return self.recent[0]
+
+    def summary(self):
+        with self.lock:
+            text = f"目标 {self.target}，成功 {self.succeeded}，失败 {self.failed}，丢弃（超出目标）{self.dropped}"
+            for axis, limits in self.quotas.items():
+                parts = [f"{value} {self.reserved[axis][value]}/{limit}" for value, limit in limits.items()]
+                text += f"\n配额 {axis}：" + "，".join(parts)
+            return text
+
+
+def build_planner(spec, total_inputs):
+    """根据 fanout 段创建规划器；既无目标也无配额时返回None（不做预算控制）"""
+    fanout = spec["fanout"]
+    if fanout["target_count"] is None and not fanout["quotas"]:
+        return None
+    return BudgetPlanner(
+        target=fanout["target_count"],
+        total_inputs=total_inputs,
+        per_input=fanout["per_input"],
+        quotas=fanout["quotas"],
+        max_retries=fanout["max_retries"],
+    )
@@ -0,0 +1,109 @@
+"""客户端预处理：图片头信息缓存、分辨率桶、上传前本地缩放/重编码"""
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+# 内存中记录的已处理文件数上限（超出后淘汰最早的记录，磁盘上的结果仍可复用）
+MAX_TRACKED = 4096
+
+# 预处理输出格式 → (PIL格式名, 扩展名)
+FORMATS = {
+    "jpg": ("JPEG", ".jpg"),
+    "png": ("PNG", ".png"),
+    "webp": ("WEBP", ".webp"),
+}
+
+
+@functools.lru_cache(maxsize=65536)
+def _cached_size(image_path, mtime, file_size):
+    with Image.open(image_path) as img:
+        return img.size
+
+
+def image_size(image_path):
+    """读取图片尺寸（只解析文件头，按路径+修改时间缓存，同一输入多个prompt只读一次）"""
+    stat = os.stat(image_path)
+    return _cached_size(image_path, stat.st_mtime_ns, stat.st_size)
+
+
+def pick_bucket(width, height, buckets):
+    """选择分辨率桶：宽高比最接近者优先，其次取不超过原图面积的最大桶"""
+    aspect = width / height
+    area = width * height
+
+    def score(bucket):
+        bw, bh = bucket
+        ratio_gap = abs(bw / bh - aspect)
+        oversize = 1 if bw * bh > area else 0
+        return round(ratio_gap, 2), oversize, -bw * bh if not oversize else bw * bh
+
+    bw, bh = min(buckets, key=score)
+    return bw, bh
+
+
+def fit_within(width, height, max_width, max_height):
+    """等比缩放到目标尺寸以内（只缩小不放大）"""
+    scale = min(max_width / width, max_height / height, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class Preprocessor:
+    """把超出目标分辨率的上传图片缩小并按 preprocess.format 重编码，同一 (文件, 目标尺寸) 只处理一次"""
+
+    def __init__(self, config, output_root):
+        self.enabled = config["enabled"]
+        self.quality = config["quality"]
+        self.format, self.ext = FORMATS[config["format"]]
+        self.cache_dir = os.path.join(output_root, config["dir"])
+        self.done = OrderedDict()
+        self.lock = threading.Lock()
+
+    def prepare(self, image_path, width, height):
+        """返回实际上传的文件路径；无需缩放时不论格式直接使用原文件（如无损PNG抽帧，不做有损重编码）"""
+        if not self.enabled or not image_path:
+            return image_path
+        key = (image_path, width, height)
+        with self.lock:
+            cached = self.done.get(key)
+        if cached:
+            return cached
+
+        src_w, src_h = image_size(image_path)
+        new_w, new_h = fit_within(src_w, src_h, width, height)
+        if (new_w, new_h) == (src_w, src_h):
+            result = image_path
+        else:
+            result = self._encode(image_path, new_w, new_h)
+        with self.lock:
+            self.done[key] = result
+            if len(self.done) > MAX_TRACKED:
+                self.done.popitem(last=False)
+        return result
+
+    def _encode(self, image_path, new_w, new_h):
+        stat = os.stat(image_path)
+        digest = hashlib.sha1(f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}".encode("utf-8")).hexdigest()[:12]
+        stem = os.path.splitext(os.path.basename(image_path))[0]
+        dst_path = os.path.join(self.cache_dir, f"{stem}_{new_w}x{new_h}_{digest}{self.ext}")
+        if os.path.exists(dst_path):
+            return dst_path  # 之前的运行已处理过
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with Image.open(image_path) as img:
+            img = img.convert("RGB") if self.format == "JPEG" and img.mode not in ("RGB", "L") else img
+            if img.size != (new_w, new_h):
+                img = img.resize((new_w, new_h), Image.LANCZOS)
+            tmp_path = dst_path + ".tmp"
+            img.save(tmp_path, format=self.format, quality=self.quality)
+        os.replace(tmp_path, dst_path)
+        return dst_path
+
+    def apply(self, job):
+        """替换任务中的上传文件为预处理后的文件（命名仍以原文件为准）"""
+        job["image"] = self.prepare(job["image"], job["width"], job["height"])
+        job["end_image"] = self.prepare(job["end_image"], job["width"], job["height"])
+        return job
@@ -0,0 +1,116 @@
+"""运行剖析（--profile）：采样式CPU剖析输出折叠栈（可直接生成火焰图），定期 tracemalloc 快照输出内存分配排行"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# 调用栈采样间隔（秒）与内存快照间隔（秒）
+SAMPLE_INTERVAL = 0.01
+SNAPSHOT_INTERVAL = 60
+TOP_ALLOCATIONS = 30
+# 栈顶位于这些模块时视为线程空闲等待（锁、队列、网络读写），不计入 busy 火焰图
+IDLE_MODULES = ("threading.py", "queue.py", "selectors.py", "socket.py", "ssl.py",
+                "concurrent/futures/_base.py", "concurrent/futures/thread.py")
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class Profiler:
+    """
+    后台线程按 SAMPLE_INTERVAL 采样所有线程的调用栈，按“阶段;线程名;调用栈”折叠计数
+    - wall.collapsed：全部样本（含等待），反映各阶段时间花在哪里
+    - busy.collapsed：去掉栈顶处于锁/队列/网络等待的样本，反映CPU占用
+    - alloc_<序号>_<阶段>.txt：阶段切换时及每 SNAPSHOT_INTERVAL 秒的内存分配排行（含与上一快照的增量）
+    折叠栈文件可用 flamegraph.pl 或 speedscope 直接打开
+    """
+
+    def __init__(self, output_root):
+        self.dir = os.path.join(output_root, ".profile", time.strftime("%Y%m%d_%H%M%S"))
+        self.stage_name = "setup"
+        self.wall = Counter()
+        self.busy = Counter()
+        self.samples = 0
+        self.snapshots = 0
+        self.previous = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        os.makedirs(self.dir, exist_ok=True)
+        tracemalloc.start(1)
+        self.thread = threading.Thread(target=self.sample_loop, name="profiler", daemon=True)
+        self.thread.start()
+        print(f"剖析已开启，结果目录：{self.dir}")
+
+    def stage(self, name):
+        """切换阶段：先为上一阶段保存内存快照"""
+        self.snapshot()
+        self.stage_name = name
+
+    def sample_loop(self):
+        own = threading.get_ident()
+        last_snapshot = time.time()
+        while not self.stop_event.wait(SAMPLE_INTERVAL):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                leaf = frame.f_code.co_filename.replace(os.sep, "/")
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                key = ";".join([self.stage_name, names.get(ident, str(ident))] + stack[::-1])
+                self.wall[key] += 1
+                if not leaf.endswith(IDLE_MODULES):
+                    self.busy[key] += 1
+            self.samples += 1
+            if time.time() - last_snapshot >= SNAPSHOT_INTERVAL:
+                self.snapshot()
+                last_snapshot = time.time()
+
+    def snapshot(self):
+        """保存一次内存分配排行"""
+        with self.lock:
+            if tracemalloc.is_tracing():
+                self.write_snapshot()
+
+    def write_snapshot(self):
+        current = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ])
+        self.snapshots += 1
+        path = os.path.join(self.dir, f"alloc_{self.snapshots:03d}_{self.stage_name}.txt")
+        traced, peak = tracemalloc.get_traced_memory()
+        lines = [f"阶段 {self.stage_name}，当前 {traced / 2**20:.1f}MB，峰值 {peak / 2**20:.1f}MB", "", "占用排行："]
+        lines += [str(stat) for stat in current.statistics("lineno")[:TOP_ALLOCATIONS]]
+        if self.previous is not None:
+            lines += ["", "与上一快照相比的增长："]
+            lines += [str(stat) for stat in current.compare_to(self.previous, "lineno")[:TOP_ALLOCATIONS]]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self.previous = current
+
+    def write_collapsed(self, name, counts):
+        with open(os.path.join(self.dir, name), "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def stop(self):
+        """停止采样并写出全部结果"""
+        self.stop_event.set()
+        self.thread.join()
+        self.snapshot()
+        tracemalloc.stop()
+        self.write_collapsed("wall.collapsed", self.wall)
+        self.write_collapsed("busy.collapsed", self.busy)
+        print(f"剖析结果：{self.dir}（采样 {self.samples} 次，内存快照 {self.snapshots} 个）")
@@ -0,0 +1,80 @@
+"""Prompt空间：属性轴笛卡尔积按下标惰性生成，不物化全部组合"""
+import zlib
+
+
+class PromptSpace:
+    """属性轴组合空间，下标顺序与嵌套for循环（第一个轴在最外层）一致"""
+
+    def __init__(self, template, axes, constants=None, id_offset=0):
+        self.template = template
+        self.axis_names = list(axes)
+        self.axis_values = [list(axes[name]) for name in self.axis_names]
+        self.constants = dict(constants or {})
+        self.id_offset = id_offset
+        self.size = 1
+        for values in self.axis_values:
+            self.size *= len(values)
+
+    def __len__(self):
+        return self.size
+
+    def attr_indices(self, index):
+        """把组合下标拆成每个轴上的取值下标（混合进制）"""
+        if not 0 <= index < self.size:
+            raise IndexError(f"prompt下标越界：{index}（共 {self.size} 种组合）")
+        indices = []
+        for values in reversed(self.axis_values):
+            index, rem = divmod(index, len(values))
+            indices.append(rem)
+        return list(reversed(indices))
+
+    def attrs(self, index):
+        """返回组合下标对应的属性字典"""
+        return {
+            name: values[i]
+            for name, values, i in zip(self.axis_names, self.axis_values, self.attr_indices(index))
+        }
+
+    def render(self, index):
+        """渲染组合下标对应的prompt文本"""
+        return self.template.format(**self.constants, **self.attrs(index))
+
+    def prompt_id(self, index):
+        return index + self.id_offset
+
+
+def drop_axes(prompts_spec, axes, neutral):
+    """
+    去掉改由本地处理产生的属性轴（如光线、监控特效）：模板中对应位置换成固定文本
+    固定文本取 neutral 中的值，未指定时取该轴的第一个取值；固定列表形式的prompt不做处理
+    """
+    dropped = [name for name in axes if name in (prompts_spec.get("axes") or {})]
+    if prompts_spec.get("list") or not dropped:
+        return prompts_spec
+    constants = dict(prompts_spec.get("constants") or {})
+    for name in dropped:
+        constants[name] = neutral.get(name, prompts_spec["axes"][name][0])
+    return dict(prompts_spec, constants=constants,
+                axes={name: values for name, values in prompts_spec["axes"].items() if name not in dropped})
+
+
+def build_prompt_space(prompts_spec):
+    """根据规格中的prompts段构建Prompt空间（固定列表视为单轴空间）"""
+    if prompts_spec.get("list"):
+        return PromptSpace("{prompt}", {"prompt": prompts_spec["list"]},
+                           id_offset=prompts_spec.get("id_offset", 0))
+    return PromptSpace(prompts_spec["template"], prompts_spec["axes"],
+                       prompts_spec.get("constants"), prompts_spec.get("id_offset", 0))
+
+
+def select_prompt_indices(space, count, rng):
+    """全局选择prompt：指定数量时随机抽样（不放回），否则按顺序使用全部组合"""
+    if count is not None and count > 0:
+        count = min(count, len(space))
+        return rng.sample(range(len(space)), count)
+    return range(len(space))
+
+
+def stable_hash(text, modulo):
+    """跨进程稳定的短哈希（内置hash()受随机化影响，无法用于断点续跑的命名）"""
+    return zlib.crc32(text.encode("utf-8")) % modulo
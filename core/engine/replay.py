@@ -0,0 +1,275 @@
+"""录制与回放：把真实运行中的每次接口调用（参数、耗时、结果文件）录成 trace，离线按原时序回放"""
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlparse
+
+from .client import FILE_FIELDS, use_replay
+from .fsutil import materialize
+from .logs import log
+from .store import describe
+
+TRACE_NAME = "trace.jsonl"
+FILES_DIR = "files"
+# 回放下载限速的分块大小
+PACE_CHUNK = 256 * 1024
+
+
+class Recorder:
+    """
+    录制模式：每次实际调用接口（含失败与重试，不含结果库命中）追加一行到 trace.jsonl
+    - 时间：相对录制开始的派发时刻、端到端耗时、等待上传、推理（predict）耗时、下载耗时，以及当时的在途请求数
+    - 参数：与结果库相同的描述（上传文件记为内容哈希），另记上传文件与结果文件的大小
+    - 结果文件硬链接到 files/（跨文件系统时复制），回放时原样返回
+    哈希、链接与写盘在后台线程进行，派发循环只把调用放入队列；close 时写完队列中剩余的记录
+    """
+
+    def __init__(self, config, output_root, task):
+        self.dir = os.path.join(output_root, config["dir"], f"{task}-{time.strftime('%Y%m%d-%H%M%S')}")
+        os.makedirs(os.path.join(self.dir, FILES_DIR), exist_ok=True)
+        self.file = open(os.path.join(self.dir, TRACE_NAME), "a", encoding="utf-8")
+        self.start = time.time()
+        self.ids = itertools.count()
+        self.count = 0
+        self.errors = 0
+        self.queue = queue.Queue(maxsize=1024)
+        self.worker = threading.Thread(target=self.write_loop, name="record", daemon=True)
+        self.worker.start()
+
+    def add(self, spec, job, ok, latency, error):
+        # 任务之后还会重新生成（换种子、改次数），放入队列的是此刻的副本
+        self.queue.put((spec, dict(job), ok, latency, error))
+
+    def write_loop(self):
+        while True:
+            call = self.queue.get()
+            if call is None:
+                return
+            try:
+                self.write(*call)
+            except Exception as e:
+                self.errors += 1
+                log.warning(f"录制失败 {call[1]['key']}：{str(e)}", exc_info=True,
+                            extra={"fields": {"event": "record_failed", "key": call[1]["key"], "error": str(e)}})
+
+    def write(self, spec, job, ok, latency, error):
+        endpoint = spec["endpoint"]
+        number = next(self.ids)
+        entry = {
+            "t": round(job["dispatched"] - self.start, 4),
+            "task": spec["name"],
+            "url": endpoint["url"],
+            "api_name": endpoint["api_name"],
+            "result_key": endpoint["result"],
+            "key": job["key"],
+            "status": "ok" if ok else "failed",
+            "error": error,
+            "latency": latency,
+            "upload_wait": job.get("upload_wait"),
+            "predict": job.get("predict_time"),
+            "download_time": job.get("download_time"),
+            "inflight": job.get("inflight"),
+            "params": {name: describe(value, job) for name, value in spec["call"]["params"].items()},
+            "input_bytes": sum(os.path.getsize(job[field]) for field in FILE_FIELDS
+                               if isinstance(job.get(field), str) and os.path.exists(job[field])),
+            "result": None,
+            "bytes": None,
+        }
+        if ok and os.path.exists(job["output"]):
+            name = f"{number:06d}{os.path.splitext(job['output'])[1]}"
+            materialize(job["output"], os.path.join(self.dir, FILES_DIR, name))
+            entry["result"] = f"{FILES_DIR}/{name}"
+            entry["bytes"] = os.path.getsize(job["output"])
+        self.file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        self.file.flush()
+        self.count += 1
+
+    def close(self):
+        self.queue.put(None)
+        self.worker.join()
+        self.file.close()
+
+    def summary(self):
+        text = f"录制：{self.count} 次接口调用：{os.path.abspath(self.dir)}"
+        if self.errors:
+            text += f"（失败 {self.errors} 次）"
+        return text
+
+
+def read_trace(trace_dir):
+    entries = []
+    with open(os.path.join(trace_dir, TRACE_NAME), "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # 录制中断时未写完的最后一行
+    return entries
+
+
+class ReplayClient:
+    """代替 gradio_client.Client：调用交给回放服务，上传与下载走回放服务的本机 HTTP 地址"""
+    headers = {}
+    cookies = None
+    ssl_verify = True
+    httpx_kwargs = {}
+
+    def __init__(self, server, url):
+        self.server = server
+        self.url = url
+        self.src_prefixed = server.base
+        self.upload_url = server.base + "upload"
+
+    def predict(self, *args, api_name=None, **kwargs):
+        return self.server.predict(self.url, api_name)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """
+    POST /upload       接收上传（内容丢弃），返回服务端路径
+    GET  /file=<结果>  按录制的下载耗时限速返回结果文件
+    """
+    server_ref = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        remaining = length
+        head = b""
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            head = head or chunk[:4096]
+            remaining -= len(chunk)
+        names = re.findall(rb'filename="([^"]*)"', head) or [b"upload"]
+        paths = [f"/replay/uploads/{next(self.server_ref.upload_ids)}/{name.decode('utf-8', 'replace')}"
+                 for name in names]
+        data = json.dumps(paths).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        name = unquote(path[len("/file="):]) if path.startswith("/file=") else None
+        seconds = self.server_ref.pacing.get(name)
+        if seconds is None:
+            self.send_error(404)
+            return
+        file_path = os.path.join(self.server_ref.dir, name)
+        size = os.path.getsize(file_path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        delay = seconds / max(size / PACE_CHUNK, 1)
+        with open(file_path, "rb") as f:
+            while True:
+                chunk = f.read(PACE_CHUNK)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                time.sleep(delay)
+
+
+class ReplayServer:
+    """
+    回放：本机 HTTP 服务接收上传、提供结果下载（真实经过连接池与传输层），推理按 trace 中的耗时模拟
+    - 每个（接口, api_name）按录制顺序依次取调用记录（用完从头循环），保留预热时的慢调用与结果大小的波动
+    - 服务端 GPU 槽位数为 capacity，超出的调用排队；录制时在途请求多于槽位的，推理耗时含排队，
+      按 capacity / 在途数 折算为纯推理时间，回放时排队由槽位重新产生
+    - 录制时失败的调用回放时同样失败；结果下载按录制的下载耗时限速
+    speed 大于1时所有耗时按比例缩短
+    """
+
+    def __init__(self, config):
+        self.dir = config["trace"]
+        self.capacity = config["capacity"]
+        self.speed = config["speed"]
+        self.groups = defaultdict(list)
+        self.pacing = {}
+        for entry in sorted(read_trace(self.dir), key=lambda e: e["t"]):
+            self.groups[(entry["url"], entry["api_name"])].append(entry)
+            if entry["result"]:
+                self.pacing[entry["result"]] = (entry["download_time"] or 0) / self.speed
+        if not self.groups:
+            raise ValueError(f"错误：trace 中没有调用记录 - {self.dir}")
+        self.cursors = defaultdict(int)
+        self.slots = defaultdict(lambda: threading.BoundedSemaphore(self.capacity))
+        self.clients = {}
+        self.upload_ids = itertools.count()
+        self.calls = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+        handler = type("Handler", (ReplayHandler,), {"server_ref": self})
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.http.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.http.server_address[1]}/"
+        threading.Thread(target=self.http.serve_forever, name="replay", daemon=True).start()
+
+    def client(self, url):
+        with self.lock:
+            client = self.clients.get(url)
+            if client is None:
+                client = self.clients[url] = ReplayClient(self, url)
+            return client
+
+    def predict(self, url, api_name):
+        group = self.groups.get((url, api_name))
+        if not group:
+            return None  # 初始化调用等未录制的接口
+        with self.lock:
+            entry = group[self.cursors[(url, api_name)] % len(group)]
+            self.cursors[(url, api_name)] += 1
+            slot = self.slots[url]
+        seconds = entry["predict"] if entry["predict"] is not None else entry["latency"] or 0
+        seconds *= min(1.0, self.capacity / max(entry["inflight"] or 1, 1))
+        with slot:
+            time.sleep(seconds / self.speed)
+        with self.lock:
+            self.calls += 1
+            if entry["status"] != "ok" or not entry["result"]:
+                self.failed += 1
+        if entry["status"] != "ok" or not entry["result"]:
+            raise RuntimeError(f"回放录制的失败调用：{entry['error']}")
+        ref = {"path": os.path.join(self.dir, entry["result"]), "url": self.base + "file=" + quote(entry["result"]),
+               "orig_name": os.path.basename(entry["result"]), "meta": {"_type": "gradio.FileData"}}
+        key = entry["result_key"]
+        return {key: ref} if isinstance(key, str) else [ref] * (int(key) + 1)
+
+    def close(self):
+        use_replay(None)
+        self.http.shutdown()
+        self.http.server_close()
+
+    def summary(self):
+        return (f"回放：{self.calls} 次调用（其中录制失败 {self.failed} 次），GPU 槽位 {self.capacity}，"
+                f"速度 x{self.speed:g}：{os.path.abspath(self.dir)}")
+
+
+def build_recorder(spec, output_root):
+    if not spec["record"]["enabled"]:
+        return None
+    return Recorder(spec["record"], output_root, spec["name"])
+
+
+def build_replay(spec):
+    """启用回放时启动回放服务，之后本进程的接口调用都由它应答"""
+    if not spec["replay"]["trace"]:
+        return None
+    server = ReplayServer(spec["replay"])
+    use_replay(server)
+    log.info(f"回放 trace：{server.dir}（{server.base}）", extra={"fields": {"event": "replay_started"}})
+    return server
@@ -0,0 +1,394 @@
+"""任务执行引擎：所有场景共用的派发、断点续跑与统计"""
+import os
+import random
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from tqdm import tqdm
+
+from .accounting import build_ledger
+from .broker import build_broker
+from .client import prefetch_files, run_job, transport_summaries
+from .decode import decode_outputs
+from .estimate import estimate_task, history_path, record_history
+from .effects import build_effect_engine
+from .export import build_exporter
+from .concurrency import endpoint_key, get_controllers
+from .frames import build_frame_cache
+from .inputs import check_source, count_inputs, iter_inputs
+from .jobs import JobFactory
+from .logs import configure_logging, flush_logs, job_fields, log, run_log_path
+from .manifest import Manifest
+from .metadata import build_metadata_index
+from .planner import build_planner
+from .profiling import Profiler
+from .replay import build_recorder, build_replay
+from .store import build_result_store
+from .stream import group_by_size, prefetch
+from .verify import build_verifier
+
+# 预取队列长度 = 并发数 × PREFETCH_FACTOR
+PREFETCH_FACTOR = 4
+
+
+def call(spec, job, broker, store):
+    if store and store.fetch(spec, job):
+        job["cached"] = True
+        job.pop("result_ref", None)  # 结果来自本地库，后续步骤需上传
+        return
+    if broker is None:
+        run_job(spec, job)
+    else:
+        with broker.slot():
+            # 等待共享槽位的时间不计入延迟，避免并发控制器误判服务端排队
+            job["dispatched"] = time.time()
+            run_job(spec, job)
+    if store:
+        store.put(job)
+
+
+def execute(spec, job, broker=None, store=None):
+    """执行单个任务并返回 (是否成功, 耗时, 错误信息)；修正步骤使用其自身的规格"""
+    start = time.time()
+    try:
+        call(job.get("spec", spec), job, broker, store)
+        return True, time.time() - job["dispatched"], None
+    except Exception as e:
+        log.warning(f"处理失败 {job['source']}（prompt {job['prompt_id']}）：{str(e)}", exc_info=True,
+                    extra=job_fields(job, "call_failed", error=str(e)))
+        return False, time.time() - job.get("dispatched", start), str(e)
+
+
+class Dispatcher:
+    """
+    流式并发派发：每个接口（主流程与修正步骤可以不同）的在途任务数由各自的并发控制器限定，完成一个补一个
+    派发顺序：链式后续/重新生成任务 > 失败补发任务 > 新任务；有规划器时达到目标即停止派发
+    结果保存后交给校验线程池，校验通过才算成功
+    """
+
+    def __init__(self, spec, jobs, manifest, controllers, resume, desc, factory, planner=None, verifier=None,
+                 broker=None, exporter=None, store=None, effects=None, metadata=None, recorder=None, ledger=None):
+        self.spec = spec
+        self.jobs = iter(jobs)
+        self.manifest = manifest
+        self.controllers = controllers
+        self.resume = resume
+        self.factory = factory
+        self.planner = planner
+        self.verifier = verifier
+        self.broker = broker
+        self.recorder = recorder
+        self.ledger = ledger
+        self.exporter = exporter
+        self.store = store
+        self.effects = effects
+        self.metadata = metadata
+        self.stats = {"ok": 0, "failed": 0, "invalid": 0, "skipped": 0}
+        self.progress = tqdm(desc=desc, unit="次", mininterval=1.0)
+        self.ready = deque()    # 链式后续任务与校验不合格的重新生成（所属变体已计入预算）
+        self.retry = deque()    # 失败补发的新变体
+        self.staged = deque()   # 已开始提前上传、等待空出并发名额的任务
+        self.pending = {}       # 接口调用中的任务
+        self.inflight = defaultdict(int)  # 各接口的在途任务数
+        self.held = None        # 所属接口在途已满、等待派发的任务
+        self.verifying = {}     # 校验中的任务
+        self.exhausted = False
+
+    def next_job(self):
+        """取下一个待派发任务，返回 (任务, 是否为新变体)"""
+        if self.ready:
+            return self.ready.popleft(), False
+        if self.retry:
+            return self.retry.popleft(), True
+        if self.planner and self.planner.satisfied():
+            self.exhausted = True
+        while not self.exhausted:
+            job = next(self.jobs, None)
+            if job is not None:
+                return job, True
+            self.exhausted = True
+        if self.planner and not self.pending and not self.verifying:
+            # 输入已全部展开仍有未完成名额：在最近成功的输入上补足
+            item = self.planner.take_makeup()
+            while item is not None:
+                self.retry.extend(self.factory.replacement(item))
+                if self.retry:
+                    return self.retry.popleft(), True
+                item = self.planner.take_makeup()
+        return None, False
+
+    def take(self):
+        """链式后续与补发任务优先，其次是已提前上传的任务"""
+        if self.held:
+            held, self.held = self.held, None
+            return held
+        if self.staged and not self.ready and not self.retry:
+            return self.staged.popleft()
+        return self.next_job()
+
+    def stage(self):
+        """取出接下来的若干个任务提前上传文件，与在途任务的推理和下载重叠"""
+        transport = self.spec["transport"]
+        if not transport["enabled"]:
+            return
+        while len(self.staged) < transport["lookahead"] and not self.ready and not self.retry:
+            job, is_new = self.next_job()
+            if job is None:
+                return
+            self.staged.append((job, is_new))
+            spec = job.get("spec", self.spec)
+            if self.resume and self.manifest.is_done(job):
+                continue
+            if self.store and os.path.exists(self.store.path_for(spec, job) or ""):
+                continue  # 结果库命中，不需要上传
+            try:
+                prefetch_files(spec, job)
+            except OSError:
+                pass  # 文件问题在正式调用时按失败处理
+
+    def completed(self, job, ok):
+        """任务最终结果：成功则派发链式后续，失败则按规划器补发；修正步骤的成败不影响所属变体"""
+        if ok:
+            self.ready.extend(job["then"])
+        if job["step"] or not self.planner:
+            return
+        if ok:
+            if all(nxt["step"] for nxt in job["then"]):
+                self.planner.succeed(job["unit"])
+        else:
+            item = self.planner.fail(job["unit"])
+            if item is not None:
+                self.retry.extend(self.factory.replacement(item))
+
+    def finish(self, job, ok, latency, error=None):
+        status = "ok" if ok else "failed"
+        self.manifest.record(job, status, latency, error)
+        log.info(f"{job['key']}：{status}", extra=job_fields(
+            job, "job", status=status, latency=latency, error=error,
+            attempt=job.get("attempt", 1), inflight=job.get("inflight"),
+            upload_wait=job.get("upload_wait"), download_time=job.get("download_time")))
+        if ok and self.exporter:
+            self.exporter.add(job)
+        if ok and self.effects:
+            self.effects.add(job)
+        if ok and self.metadata:
+            self.metadata.add(job)
+        self.stats["ok" if ok else "failed"] += 1
+        self.progress.update(1)
+        self.completed(job, ok)
+
+    def on_executed(self, job, ok, latency, error):
+        key = endpoint_key(job.get("spec", self.spec))
+        self.inflight[key] -= 1
+        # 以派发到完成的端到端耗时调整所调用接口的并发（含客户端排队、上传与下载）；结果库命中未调用接口，不计入
+        if not job.get("cached"):
+            self.controllers[key].observe(time.time() - job["dispatched"], ok)
+            if self.recorder:
+                self.recorder.add(job.get("spec", self.spec), job, ok, latency, error)
+            if self.ledger:
+                self.ledger.add(job, ok, latency)
+        if ok and self.verifier:
+            job["latency"] = latency
+            self.verifying[self.verifier.submit(job)] = job
+            return
+        self.finish(job, ok, latency, error)
+
+    def on_verified(self, job, problem):
+        if not problem:
+            self.finish(job, True, job["latency"])
+            return
+        # 不合格：记入清单、移出数据集目录，按次数上限重新生成（换随机种子）
+        log.warning(f"结果校验不合格 {job['output']}：{problem}",
+                    extra=job_fields(job, "invalid", status="invalid", latency=job["latency"], error=problem,
+                                     attempt=job.get("attempt", 1)))
+        self.manifest.record(job, "invalid", job["latency"], problem)
+        if self.ledger:
+            self.ledger.invalid(job)
+        self.verifier.reject(job)
+        if self.store:
+            self.store.evict(job)
+        job.pop("cached", None)
+        self.stats["invalid"] += 1
+        job["attempt"] = job.get("attempt", 1) + 1
+        if job["attempt"] <= self.verifier.config["max_attempts"]:
+            self.factory.reseed(job)
+            self.ready.append(job)
+            return
+        self.stats["failed"] += 1
+        self.progress.update(1)
+        self.completed(job, False)
+
+    def fill(self, pool):
+        # 各接口的在途请求数由其并发控制器决定（预取队列已保证随时有任务可派发）
+        while True:
+            job, is_new = self.take()
+            if job is None:
+                break
+            if is_new and self.planner and not self.planner.admit(job["unit"]):
+                continue
+            if self.resume and self.manifest.is_done(job):
+                if self.exporter:
+                    self.exporter.add(job)  # 开启导出前生成的结果补充打包（已导出的会被忽略）
+                if self.effects:
+                    self.effects.add(job)
+                if self.metadata:
+                    self.metadata.add(job)
+                self.stats["skipped"] += 1
+                self.progress.update(1)
+                self.completed(job, True)
+                continue
+            key = endpoint_key(job.get("spec", self.spec))
+            if self.inflight[key] >= self.controllers[key].limit():
+                self.held = (job, False)  # 已通过规划器，等该接口完成一个再派发
+                break
+            self.inflight[key] += 1
+            job["dispatched"] = time.time()
+            job["inflight"] = self.inflight[key]
+            self.pending[pool.submit(execute, self.spec, job, self.broker, self.store)] = job
+        self.stage()
+
+    def run(self):
+        workers = sum(controller.max_limit for controller in self.controllers.values())
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                self.fill(pool)
+                if not self.pending and not self.verifying:
+                    break
+                done, _ = wait(list(self.pending) + list(self.verifying), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in self.pending:
+                        self.on_executed(self.pending.pop(future), *future.result())
+                    else:
+                        self.on_verified(self.verifying.pop(future), future.result())
+        self.progress.close()
+        if hasattr(self.jobs, "close"):
+            self.jobs.close()
+        return self.stats
+
+
+def dispatch(spec, jobs, manifest, controllers, resume, desc, factory, planner=None, verifier=None, broker=None,
+             exporter=None, store=None, effects=None, metadata=None, recorder=None, ledger=None):
+    """派发任务直到全部完成，返回统计"""
+    return Dispatcher(spec, jobs, manifest, controllers, resume, desc, factory, planner, verifier, broker,
+                      exporter, store, effects, metadata, recorder, ledger).run()
+
+
+def counted(items, counter):
+    """透传输入项并计数"""
+    for item in items:
+        counter["inputs"] += 1
+        yield item
+
+
+def stream_jobs(factory, items, controller):
+    """在后台线程中完成发现/抽帧/预处理/任务展开，按分辨率分组后经有界队列交给派发循环"""
+    jobs = group_by_size(factory.iter_jobs(items), factory.spec["preprocess"]["group_window"])
+    return prefetch(jobs, maxsize=controller.max_limit * PREFETCH_FACTOR)
+
+
+def close_sinks(*sinks):
+    """按顺序关闭（特效先于导出器与索引：变体也需打包、登记）；一个关闭失败不影响其余"""
+    for sink in sinks:
+        if sink is None:
+            continue
+        try:
+            sink.close()
+        except Exception as e:
+            log.warning(f"关闭 {type(sink).__name__} 失败：{str(e)}", exc_info=True,
+                        extra={"fields": {"event": "close_failed"}})
+
+
+def run_task(spec, source, output_root, concurrency=None, resume=None, seed=None, dry_run=False, profile=False):
+    """执行一个任务规格：发现输入 → 分配prompt → 派发调用 → 记录清单"""
+    run = spec["run"]
+    resume = run["resume"] if resume is None else resume
+    rng = random.Random(seed)
+    if dry_run:
+        return estimate_task(spec, source, output_root, concurrency, resume, rng)
+    if not profile:
+        return execute_task(spec, source, output_root, concurrency, resume, rng)
+    profiler = Profiler(output_root)
+    profiler.start()
+    try:
+        return execute_task(spec, source, output_root, concurrency, resume, rng, profiler)
+    finally:
+        profiler.stop()
+
+
+def execute_task(spec, source, output_root, concurrency, resume, rng, profiler=None):
+    error = check_source(spec, source)
+    if error:
+        print(error)
+        return None
+    os.makedirs(output_root, exist_ok=True)
+    configure_logging(run_log_path(spec, output_root), spec["logging"])
+    manifest = Manifest(output_root)
+
+    start = time.time()
+    counter = {"inputs": 0}
+    total_inputs = 0
+    if spec["fanout"]["target_count"] is not None:
+        # 事先均衡分配目标数量需要输入总数：只计数，不保存路径
+        total_inputs = count_inputs(spec, source)
+    planner = build_planner(spec, total_inputs)
+    factory = JobFactory(spec, output_root, rng, planner)
+    print(f"任务 {spec['name']}：开始流式处理...")
+    frame_cache = build_frame_cache(spec)
+    items = counted(iter_inputs(spec, source, output_root, frame_cache), counter)
+    controllers = get_controllers([spec] + factory.steps, concurrency)
+    jobs = stream_jobs(factory, items, controllers[endpoint_key(spec)])
+    verifier = build_verifier(spec, output_root)
+    broker = build_broker(spec)
+    exporter = build_exporter(spec, output_root)
+    store = build_result_store(spec)
+    metadata = build_metadata_index(spec, output_root, factory.space)
+    effects = build_effect_engine(spec, output_root, (exporter, metadata))
+    recorder = build_recorder(spec, output_root)
+    ledger = build_ledger(spec, output_root)
+    replay = build_replay(spec)
+    if profiler:
+        profiler.stage("dispatch")
+    try:
+        stats = dispatch(spec, jobs, manifest, controllers, resume, f"{spec['name']} 处理进度",
+                         factory, planner, verifier, broker, exporter, store, effects, metadata, recorder, ledger)
+    finally:
+        # 派发异常时同样释放线程池、退出共享调度、写完打包与索引，并等日志队列写完
+        close_sinks(verifier, broker, effects, exporter, metadata, ledger, recorder, replay)
+        flush_logs()
+    if counter["inputs"] == 0:
+        print("错误：未找到任何可处理的输入")
+        return None
+
+    decoded = None
+    if spec["decode"]["enabled"]:
+        if profiler:
+            profiler.stage("decode")
+        decoded = decode_outputs(spec, output_root, manifest)
+
+    print("\n" + "=" * 50)
+    print(f"任务 {spec['name']} 处理完成！")
+    print(f"总输入：{counter['inputs']} 个")
+    print(f"成功：{stats['ok']}，失败：{stats['failed']}，校验不合格：{stats['invalid']}，跳过（已完成）：{stats['skipped']}")
+    for (url, api_name), controller in controllers.items():
+        print(controller.summary() if len(controllers) == 1 else f"{url} {api_name}：{controller.summary()}")
+    for line in transport_summaries():
+        print(line)
+    for sink in (broker, effects, exporter, metadata, frame_cache, ledger):
+        if sink:
+            print(sink.summary())
+    if recorder:
+        print(recorder.summary())
+    if replay:
+        print(replay.summary())
+    if store:
+        print(store.summary())
+    if planner:
+        print(planner.summary())
+    record_history(manifest.path, start, history_path(spec))
+    if decoded is not None:
+        print(f"解码视频：{decoded} 个，帧存储：{os.path.abspath(os.path.join(output_root, spec['decode']['dir']))}")
+    print(f"耗时：{time.time() - start:.1f} 秒")
+    print(f"输出目录：{os.path.abspath(output_root)}")
+    print("=" * 50)
+    return stats
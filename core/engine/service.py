@@ -0,0 +1,215 @@
+"""常驻服务：通过本地 HTTP / Unix socket 接收增强任务，复用已建立的接口连接与缓存（并发控制器每个任务各用一套）"""
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote, urlparse
+
+from .logs import LOG_NAME, configure_logging, log
+from .manifest import Manifest
+from .runner import run_task
+from .spec import DEFAULTS, TASKS_DIR, load_spec
+
+# 保留的已结束任务记录数
+MAX_FINISHED = 1000
+
+
+class Service:
+    """
+    任务登记与执行：提交的任务进入线程池排队，最多 max_runs 个同时执行
+    每个任务即一次 run_task，参数与命令行一致（task/source/output + 覆盖项）
+    不接受录制/回放：回放会替换本进程所有任务的接口客户端，录制的在途数与耗时也会混入同时执行的其他任务
+    """
+
+    def __init__(self, max_runs=1):
+        self.pool = ThreadPoolExecutor(max_workers=max_runs, thread_name_prefix="run")
+        self.runs = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def submit(self, request):
+        """登记并排队一个任务，返回任务记录；参数错误时抛出 ValueError"""
+        for field in ("task", "source", "output"):
+            if not request.get(field):
+                raise ValueError(f"缺少参数 {field}")
+        spec = load_spec(request["task"], request.get("overrides"))
+        if spec["replay"]["trace"] or spec["record"]["enabled"]:
+            raise ValueError("常驻服务不支持录制/回放，请用命令行 --record / --replay 单独运行")
+        run = {
+            "id": str(next(self.ids)),
+            "task": spec["name"],
+            "source": request["source"],
+            "output": os.path.abspath(request["output"]),
+            "status": "queued",
+            "submitted": time.time(),
+            "started": None,
+            "finished": None,
+            "stats": None,
+            "error": None,
+        }
+        with self.lock:
+            self.runs[run["id"]] = run
+            self.prune()
+        options = {key: request.get(key) for key in ("concurrency", "resume", "seed")}
+        self.pool.submit(self.execute, run, spec, options)
+        return dict(run)
+
+    def execute(self, run, spec, options):
+        run["status"] = "running"
+        run["started"] = time.time()
+        try:
+            stats = run_task(spec, run["source"], run["output"], **options)
+            run["stats"] = stats
+            run["status"] = "done" if stats is not None else "failed"
+            if stats is None:
+                run["error"] = "没有可处理的输入或输入源无效"
+        except Exception as e:
+            log.exception(f"任务 {run['id']} 执行异常：{str(e)}", extra={"fields": {"event": "run_failed", "task": run["task"]}})
+            run["status"] = "failed"
+            run["error"] = str(e)
+        run["finished"] = time.time()
+
+    def prune(self):
+        finished = [r for r in self.runs.values() if r["finished"]]
+        for run in sorted(finished, key=lambda r: r["finished"])[:max(0, len(finished) - MAX_FINISHED)]:
+            del self.runs[run["id"]]
+
+    def get(self, run_id):
+        with self.lock:
+            run = self.runs.get(run_id)
+            return dict(run) if run else None
+
+    def list(self):
+        with self.lock:
+            return [dict(run) for run in self.runs.values()]
+
+    def results(self, run_id):
+        """任务输出目录中已成功的结果（相对输出目录的路径）"""
+        run = self.get(run_id)
+        if run is None:
+            return None
+        return sorted(key for key in Manifest(run["output"]).done
+                      if os.path.exists(os.path.join(run["output"], key)))
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def list_task_names():
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(TASKS_DIR)
+                  if f.endswith((".toml", ".yaml", ".yml")))
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    POST /jobs                    提交任务：{"task", "source", "output", "overrides", "concurrency", "resume", "seed"}
+    GET  /jobs                    全部任务状态
+    GET  /jobs/<id>               单个任务状态与统计
+    GET  /jobs/<id>/results       已生成的结果列表
+    GET  /jobs/<id>/results/<key> 下载单个结果文件
+    GET  /tasks                   内置任务规格
+    """
+    service = None
+
+    def address_string(self):
+        # Unix socket 连接没有客户端地址
+        return self.client_address[0] if self.client_address else "unix"
+
+    def send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_file(self, path):
+        size = os.path.getsize(path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            self.send_json(404, {"error": "未知的路径"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            self.send_json(202, self.service.submit(request))
+        except (ValueError, json.JSONDecodeError) as e:
+            self.send_json(400, {"error": str(e)})
+
+    def do_GET(self):
+        parts = [unquote(p) for p in urlparse(self.path).path.strip("/").split("/", 3) if p]
+        if parts == ["tasks"]:
+            self.send_json(200, list_task_names())
+        elif parts == ["jobs"]:
+            self.send_json(200, self.service.list())
+        elif len(parts) == 2 and parts[0] == "jobs":
+            run = self.service.get(parts[1])
+            self.send_json(200 if run else 404, run or {"error": "任务不存在"})
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "results":
+            results = self.service.results(parts[1])
+            self.send_json(200 if results is not None else 404,
+                           results if results is not None else {"error": "任务不存在"})
+        elif len(parts) == 4 and parts[0] == "jobs" and parts[2] == "results":
+            run = self.service.get(parts[1])
+            if run is None:
+                self.send_json(404, {"error": "任务不存在"})
+                return
+            path = os.path.realpath(os.path.join(run["output"], parts[3]))
+            if not path.startswith(os.path.realpath(run["output"]) + os.sep) or not os.path.isfile(path):
+                self.send_json(404, {"error": "结果不存在"})
+                return
+            self.send_file(path)
+        else:
+            self.send_json(404, {"error": "未知的路径"})
+
+
+class UnixHTTPServer(ThreadingMixIn, HTTPServer):
+    address_family = socket.AF_UNIX
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)  # 上次退出时遗留的 socket 文件
+        self.socket.bind(self.server_address)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def serve(host="127.0.0.1", port=8765, socket_path=None, max_runs=1):
+    """启动常驻服务（阻塞直到 Ctrl+C）"""
+    # 常驻服务的全部任务写入同一个日志文件（记录中含 task 字段）
+    configure_logging(os.path.join(DEFAULTS["logging"]["dir"], LOG_NAME), DEFAULTS["logging"])
+    service = Service(max_runs)
+    handler = type("ServiceHandler", (Handler,), {"service": service})
+    if socket_path:
+        server = UnixHTTPServer(socket_path, handler)
+        address = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        address = f"http://{host}:{port}"
+    print(f"数据增强服务已启动：{address}（同时执行 {max_runs} 个任务）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n服务停止")
+    finally:
+        server.server_close()
+        service.close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
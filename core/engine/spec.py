@@ -0,0 +1,267 @@
+"""任务规格加载：用 TOML/YAML 描述一个增强场景（输入、属性轴、prompt模板、接口、调用参数、命名、扇出）"""
+import copy
+import os
+import tomllib
+
+from .frames import valid_position
+
+# 内置任务规格目录（core/tasks）
+TASKS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tasks")
+SPEC_EXTENSIONS = (".toml", ".yaml", ".yml")
+
+INPUT_KINDS = ("images", "videos", "frame_pairs")
+SIZE_MODES = ("original", "uniform", "bucket")
+
+# 所有规格共享的缺省值，规格文件只需写与缺省不同的部分
+DEFAULTS = {
+    "name": None,
+    "description": "",
+    "endpoint": {
+        "url": None,
+        "api_name": None,
+        "timeout": None,      # 秒，None表示使用gradio_client默认值
+        "result": 0,          # 结果文件在返回值中的位置：元组下标或字典键（如 "video"）
+        "setup": [],          # 建立连接后执行一次的初始化调用（如加载LoRA）
+    },
+    "inputs": {
+        "kind": "images",
+        "extensions": [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"],
+        "name_keywords": [],  # 目录输入时按文件名关键词过滤（任一命中即保留）
+        "frames": ["first"],  # videos：需要提取的帧（first/last/帧序号/时间点如 "2.5s"）
+        "frame_dir": "original_{frame}_frames",
+        "size_mismatch": "warn",   # 多帧尺寸不一致时：warn（仅提示）或 skip（跳过该视频）
+        "chain_frames": False,     # True：同一prompt下后一帧仅在前一帧成功后生成
+        "first_dir": "augmented_first_frames",  # frame_pairs：增强首帧目录（相对输入源，可为绝对路径）
+        "last_dir": "augmented_last_frames",    # frame_pairs：增强尾帧目录
+        "pair_pattern": r"^(.+)_(first|last)_frame_aug_prompt(\d+)\.(.+)$",
+    },
+    "frame_store": {
+        "codec": "png",       # 抽取帧的保存格式：png（快速无损）、bmp（不压缩）、jpg（高质量有损）
+        "png_compression": 1,
+        "jpeg_quality": 98,
+        "workers": 2,         # 编码写盘线程数
+    },
+    "frame_cache": {
+        "enabled": True,      # 各抽帧任务共享：按视频内容哈希+帧位置缓存，同一帧只解码一次
+        "dir": None,          # None 表示 ~/.cache/data_augment/frames
+        "max_gb": 20,         # 超过后按最近使用时间淘汰
+    },
+    "prompts": {
+        "list": None,         # 固定prompt列表（与 template+axes 二选一）
+        "template": None,
+        "axes": {},           # 属性轴，按书写顺序做笛卡尔积
+        "constants": {},      # 模板中的固定片段
+        "count": None,        # 全局抽样数量（所有输入共用同一批prompt，保证首尾帧配对）
+        "id_offset": 0,
+    },
+    "fanout": {
+        "per_input": None,    # 每个输入生成的变体数，None表示使用全部已选prompt
+        "replace": False,     # True：每个变体独立随机抽取属性（允许重复组合）
+        "target_count": None, # 全局目标生成数量（事先均衡分配，失败自动补发，达到即停止派发）
+        "quotas": {},         # 属性配额，如 {gender = {"男性" = 2500, "女性" = 0.5}}，小数为占目标比例
+        "max_retries": 2,     # 同一输入连续失败后补发的次数，超过则把名额转给其他输入
+    },
+    "size": {
+        "mode": "uniform",    # original：沿用输入尺寸；uniform：统一尺寸；bucket：按输入宽高比选分辨率桶
+        "width": 1280,
+        "height": 720,
+        "buckets": [[1920, 1080], [1280, 720], [1080, 1920], [720, 1280], [1024, 1024], [832, 480], [480, 832]],
+    },
+    "preprocess": {
+        "enabled": True,      # 超出目标分辨率的图片上传前在本地缩小并重编码，减少上传量和服务端缩放开销；无需缩放的原样上传
+        "format": "jpg",      # 缩小后的编码格式
+        "quality": 95,
+        "dir": ".preprocessed",
+        "group_window": 64,   # 在此窗口内按分辨率分组派发，0表示不分组
+    },
+    "mask": {
+        "enabled": False,     # 局部重绘/扩图：为每个任务生成掩码（$mask 为掩码文件，$mask_editor 为 ImageEditor 输入）
+        "boxes": [],          # 矩形 [x0, y0, x1, y1]，不大于1的坐标按图像宽高比例
+        "polygons": [],       # 多边形 [[x, y], ...]
+        "templates": {},      # 按文件名关键词（如摄像头编号）复用的掩码：图片路径（相对规格文件）或 {boxes, polygons}
+        "feather": 0,         # 边缘羽化（高斯模糊sigma，像素）
+        "invert": False,      # True：重绘掩码以外的区域
+        "dir": ".masks",      # 相对输出根目录，按内容哈希命名
+    },
+    "call": {
+        "seed": 0,            # 固定整数，或 "random"（随机）/ "stable"（按输出路径确定，可命中结果库）配合 seed_range
+        "seed_range": [0, 10000],
+        "params": {},         # 透传给 client.predict 的参数，"$xxx" 为按任务替换的占位符
+    },
+    "output": {
+        "dir": "",            # 输出根目录下的子目录模板
+        "name": "{stem}_prompt{prompt_id}{ext}",
+        "ext": None,          # None表示沿用输入扩展名
+    },
+    "transport": {
+        "enabled": True,      # 上传/下载经按服务端复用的长连接池，即将派发的任务提前上传；False 时由 gradio_client 逐次上传
+        "connections": 8,     # 每台服务端的长连接数上限
+        "upload_workers": 4,  # 上传线程数
+        "lookahead": 4,       # 提前上传的待派发任务数，0表示不提前
+        "upload_ttl": 1800,   # 已上传文件在该秒数内直接引用服务端路径（服务端会定期清理上传目录）
+    },
+    "accounting": {
+        "enabled": True,      # 运行结束时写出服务端耗时报告（按场景/接口/分辨率/步数/帧数分组）
+        "dir": "reports",     # 相对输出根目录
+        "gpu_slots": 1,       # 每台服务端同时推理的请求数，按此分摊排队中的调用耗时
+    },
+    "record": {
+        "enabled": False,     # 录制每次接口调用的参数、耗时与结果文件，供离线回放
+        "dir": "traces",      # 相对输出根目录，每次运行一个子目录
+    },
+    "replay": {
+        "trace": None,        # 录制目录；指定后不连接服务端，按 trace 回放调用耗时与结果
+        "capacity": 1,        # 模拟的服务端 GPU 槽位数（gradio 默认每个接口同时只处理一个请求）
+        "speed": 1.0,         # 回放加速倍数
+    },
+    "concurrency": {
+        "mode": "adaptive",   # adaptive：按延迟/错误率自动调整在途请求数；fixed：固定为 run.concurrency
+        "min": 1,
+        "max": 16,
+        "increase": 1.0,      # 每轮（约“上限”个请求）增加的并发数
+        "decrease": 0.5,      # 出错或延迟超过基线×latency_slack 时的乘性下调系数
+        "latency_slack": 1.5,
+    },
+    "broker": {
+        "enabled": False,     # 多个任务共用同一服务端时，经本地共享队列按优先级/权重公平分配调用槽位
+        "dir": None,          # 状态文件目录，None表示系统临时目录下的 data_augment_broker
+        "capacity": 4,        # 每台服务端（host:port）同时进行的调用总数
+        "priority": 0,        # 越大越优先，紧急的小任务可设为更高优先级
+        "weight": 1.0,        # 同一优先级内按权重分配服务端时间
+        "rate": None,         # 本任务的调用速率上限（次/秒，令牌桶），None表示不限
+        "burst": 1,
+    },
+    "verify": {
+        "enabled": True,      # 保存后在独立线程池中校验结果，不合格的移入 .rejected 并自动重新生成
+        "workers": 2,
+        "max_attempts": 2,    # 同一任务最多生成的次数（含首次），校验不合格时换种子重新生成
+        "min_bytes": 1024,
+        "size_tolerance": 16, # 分辨率允许的像素偏差（服务端按8/16对齐）
+        "frame_tolerance": 0.1,
+        "sample_frames": 3,   # 视频抽样解码的帧数
+        "blank_std": 2.0,     # 灰度标准差低于该值视为空白帧
+    },
+    "export": {
+        "enabled": False,     # 结果边生成边打包为 tar 分片（WebDataset 格式：<key>.jpg/.mp4 + <key>.json）
+        "dir": "shards",      # 相对输出根目录
+        "prefix": "shard",
+        "max_bytes": 1073741824,  # 单个分片大小上限（1GB）
+        "max_count": 10000,   # 单个分片样本数上限
+    },
+    "decode": {
+        "enabled": False,     # 生成结束后把视频结果多进程解码为内存映射的帧数组（训练/质检直接随机读帧）
+        "dir": "frames",      # 相对输出根目录
+        "workers": 4,
+        "stride": 1,          # 每隔 stride 帧取一帧
+        "width": None,        # 帧尺寸，None表示取 size.width/size.height
+        "height": None,
+        "chunk_frames": 512,  # 单个 .npy 分块的帧数上限（同一视频不跨分块）
+    },
+    "effects": {
+        "enabled": False,     # 生成结果（图片/视频）在本地批量施加监控画面特效，每个结果派生多个变体（写入 dir）
+        "drop_axes": ["light", "effect"],  # 启用时从prompt属性轴中去掉，改由本地特效产生
+        "neutral": {},        # 去掉的轴在模板中的替代文本，未指定时取该轴第一个取值
+        "pipeline": ["brightness", "backlight", "color_cast", "blur", "noise", "lowres", "framerate"],  # framerate 仅对视频
+        "probability": 0.5,   # 每种特效在一个变体中出现的概率
+        "variants": 4,        # 每个结果派生的变体数
+        "batch_size": 8,      # 同尺寸结果凑批处理的张数
+        "video_chunk": 16,    # 视频每次解码并处理的帧数（全部变体共用这一次解码）
+        "workers": 2,         # 变体编码写盘线程数
+        "jpeg_quality": 90,
+        "dir": "effects",     # 相对输出根目录，保持结果的相对路径
+    },
+    "metadata": {
+        "enabled": True,      # 每个成功结果的属性取值下标与生成参数写入列式索引（MetadataTable 查询）
+        "dir": "metadata",    # 相对输出根目录
+        "flush_rows": 256,    # 缓冲行数，达到即追加写盘
+    },
+    "result_store": {
+        "enabled": False,     # 调用前按输入内容+全部参数查找已生成的结果，命中则硬链接到输出目录，不调用接口
+                              # 只对可复现的调用生效：randomize_seed 为真（服务端随机种子）时不查找，可改用 call.seed = "stable"
+        "dir": None,          # 结果库目录（所有任务、输出目录共用），None表示 ~/.cache/data_augment/results
+    },
+    "logging": {
+        "dir": "logs",        # 相对输出根目录，逐任务事件写入 run.jsonl
+        "max_bytes": 52428800,  # 单个日志文件50MB后轮转
+        "backups": 5,
+        "console_level": "WARNING",
+        "console_limit": 5,   # 同类消息每分钟最多在控制台输出的条数
+    },
+    "followup": None,         # 链式修正：每个结果生成后立即再做一步（表）或多步（表数组）编辑，同一接口时直接引用服务端结果
+    "run": {
+        "concurrency": 1,     # 初始并发数（fixed 模式下为固定并发数）
+        "resume": True,
+        "history": None,      # 耗时/存储历史文件（--dry-run 估算用），None表示 ~/.cache/data_augment/history.jsonl
+    },
+}
+
+
+def resolve_spec_path(name_or_path):
+    """解析任务规格路径：支持直接路径或 core/tasks 下的任务名"""
+    if os.path.isfile(name_or_path):
+        return name_or_path
+    for ext in ("",) + SPEC_EXTENSIONS:
+        candidate = os.path.join(TASKS_DIR, name_or_path + ext)
+        if os.path.isfile(candidate):
+            return candidate
+    raise ValueError(f"错误：找不到任务规格 {name_or_path}")
+
+
+def read_spec_file(path):
+    """读取TOML或YAML格式的规格文件"""
+    if path.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise RuntimeError("读取YAML任务规格需要安装 PyYAML（pip install pyyaml）")
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def deep_merge(base, override):
+    """递归合并字典，override中的值覆盖base（列表整体替换）"""
+    merged = copy.deepcopy(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def validate_spec(spec):
+    """检查规格的必填项和取值范围"""
+    name = spec.get("name") or "<未命名>"
+    if not spec["endpoint"]["url"] or not spec["endpoint"]["api_name"]:
+        raise ValueError(f"任务 {name}：endpoint.url 和 endpoint.api_name 为必填项")
+    if spec["inputs"]["kind"] not in INPUT_KINDS:
+        raise ValueError(f"任务 {name}：inputs.kind 必须是 {INPUT_KINDS} 之一")
+    if spec["inputs"]["kind"] == "videos" and not all(valid_position(p) for p in spec["inputs"]["frames"]):
+        raise ValueError(f"任务 {name}：inputs.frames 的每一项须为 first、last、帧序号或时间点（如 \"2.5s\"）")
+    if spec["size"]["mode"] not in SIZE_MODES:
+        raise ValueError(f"任务 {name}：size.mode 必须是 {SIZE_MODES} 之一")
+    prompts = spec["prompts"]
+    if not prompts["list"] and not (prompts["template"] and prompts["axes"]):
+        raise ValueError(f"任务 {name}：prompts 需提供 list，或 template + axes")
+    if spec["call"]["seed"] not in ("random", "stable") and not isinstance(spec["call"]["seed"], int):
+        raise ValueError(f"任务 {name}：call.seed 必须是整数、\"random\" 或 \"stable\"")
+    if spec["broker"]["enabled"] and (spec["broker"]["capacity"] < 1 or spec["broker"]["weight"] <= 0):
+        raise ValueError(f"任务 {name}：broker.capacity 至少为1，broker.weight 必须大于0")
+    followup = spec["followup"]
+    steps = followup if isinstance(followup, list) else [followup] if followup else []
+    if any(not isinstance(step, dict) or not step.get("prompt") for step in steps):
+        raise ValueError(f"任务 {name}：followup 的每一步都需提供 prompt")
+    return spec
+
+
+def load_spec(name_or_path, overrides=None):
+    """加载任务规格并合并缺省值与命令行覆盖项"""
+    path = resolve_spec_path(name_or_path)
+    spec = deep_merge(DEFAULTS, read_spec_file(path))
+    spec = deep_merge(spec, overrides)
+    if not spec["name"]:
+        spec["name"] = os.path.splitext(os.path.basename(path))[0]
+    spec["path"] = os.path.abspath(path)
+    return validate_spec(spec)
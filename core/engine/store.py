@@ -0,0 +1,110 @@
+"""全局结果库：按输入文件内容与全部生成参数寻址，不同场景、不同输出目录的相同调用直接硬链接已有结果"""
+import functools
+import hashlib
+import json
+import os
+import threading
+
+from .client import FILE_FIELDS
+from .fsutil import materialize
+
+STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "data_augment", "results")
+
+
+@functools.lru_cache(maxsize=65536)
+def _file_digest(path, mtime, file_size):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """文件内容哈希（按路径+修改时间缓存，同一输入的多个变体只读一次）"""
+    stat = os.stat(path)
+    return _file_digest(path, stat.st_mtime_ns, stat.st_size)
+
+
+def describe(value, job):
+    """参数的可哈希描述：占位符替换为任务字段，上传文件替换为内容哈希"""
+    if not isinstance(value, str) or not value.startswith("$"):
+        return value
+    field = value[1:]
+    if field == "none":
+        return None
+    if field in FILE_FIELDS:
+        path = job.get(field)
+        return {"sha256": file_digest(path)} if path else None
+    if field == "mask_editor":
+        return {"image": file_digest(job["image"]), "mask": file_digest(job["mask"])}
+    return job.get(field)
+
+
+def result_key(spec, job):
+    endpoint = spec["endpoint"]
+    payload = {
+        "endpoint": job["endpoint"],
+        "result": endpoint["result"],
+        "setup": endpoint["setup"],
+        "params": {name: describe(value, job) for name, value in spec["call"]["params"].items()},
+    }
+    text = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultStore:
+    """
+    调用前按 (接口, 初始化调用, 全部参数, 上传文件内容) 查找已有结果，命中则不调用接口
+    只缓存确定性的调用：种子为负数或 randomize_seed 为真（服务端随机）时不查找也不入库
+    校验不合格的结果会从库中移除，避免被其他任务复用
+    """
+
+    def __init__(self, config):
+        self.dir = config["dir"] or STORE_DIR
+        self.hits = 0
+        self.stored = 0
+        self.lock = threading.Lock()
+
+    def path_for(self, spec, job):
+        seed = job["seed"]
+        if isinstance(seed, int) and seed < 0:
+            return None
+        if describe(spec["call"]["params"].get("randomize_seed"), job):
+            return None  # 服务端忽略传入的种子，结果不可复现
+        key = result_key(spec, job)
+        ext = os.path.splitext(job["output"])[1].lower()
+        return os.path.join(self.dir, key[:2], key + ext)
+
+    def fetch(self, spec, job):
+        """命中则把结果放到输出路径并返回True"""
+        path = job["store_path"] = self.path_for(spec, job)
+        if not path or not os.path.exists(path):
+            return False
+        materialize(path, job["output"])
+        with self.lock:
+            self.hits += 1
+        return True
+
+    def put(self, job):
+        """新生成的结果入库"""
+        path = job.get("store_path")
+        if not path or os.path.exists(path) or not os.path.exists(job["output"]):
+            return
+        materialize(job["output"], path)
+        with self.lock:
+            self.stored += 1
+
+    def evict(self, job):
+        path = job.get("store_path")
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    def summary(self):
+        return f"结果库 {self.dir}：命中 {self.hits} 次（未调用接口），新入库 {self.stored} 个"
+
+
+def build_result_store(spec):
+    if not spec["result_store"]["enabled"]:
+        return None
+    return ResultStore(spec["result_store"])
@@ -0,0 +1,69 @@
+"""流式管道工具：有界队列预取，发现/抽帧与派发并行且内存恒定"""
+import queue
+import threading
+from collections import OrderedDict
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(iterable, maxsize):
+    """在后台线程中迭代 iterable，最多缓冲 maxsize 项；上游异常在消费端重新抛出"""
+    buffer = queue.Queue(maxsize=max(1, maxsize))
+    stop = threading.Event()
+
+    def put(item):
+        # 消费端提前退出时不再阻塞在满队列上
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+
+    worker = threading.Thread(target=produce, name="prefetch", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def group_by_size(jobs, window):
+    """在有界窗口内按生成分辨率分组输出，让同一服务端连续处理相同尺寸的请求"""
+    if window <= 0:
+        yield from jobs
+        return
+    groups = OrderedDict()
+    buffered = 0
+    for job in jobs:
+        groups.setdefault((job["width"], job["height"]), []).append(job)
+        buffered += 1
+        if buffered >= window:
+            # 先输出最大的分组，其余留在窗口内等待同尺寸任务
+            size = max(groups, key=lambda k: len(groups[k]))
+            batch = groups.pop(size)
+            buffered -= len(batch)
+            yield from batch
+    for batch in groups.values():
+        yield from batch
@@ -0,0 +1,147 @@
+"""传输层：按服务端复用 keep-alive 长连接，预先上传即将派发任务的文件，统计上传/下载吞吐"""
+import glob
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+# 已上传文件的服务端路径最多记录的条数
+MAX_UPLOADS = 4096
+# 下载中的临时文件：与结果同目录（改名即完成，只写一次），固定后缀，重跑同一结果时直接覆盖
+PART_SUFFIX = ".part"
+# 超过该时间未再写入的临时文件视为中断遗留（多进程共用输出目录时不误删其他进程正在写的文件）
+STALE_PART_SECONDS = 600
+
+_SWEPT = set()
+_SWEPT_LOCK = threading.Lock()
+
+
+def prepare_dir(dst_path):
+    """创建结果所在目录；本进程首次写入该目录时清理中断遗留的临时文件"""
+    out_dir = os.path.dirname(dst_path) or "."
+    os.makedirs(out_dir, exist_ok=True)
+    with _SWEPT_LOCK:
+        if out_dir in _SWEPT:
+            return
+        _SWEPT.add(out_dir)
+    deadline = time.time() - STALE_PART_SECONDS
+    for path in glob.glob(os.path.join(glob.escape(out_dir), "*" + PART_SUFFIX)):
+        try:
+            if os.path.getmtime(path) < deadline:
+                os.remove(path)
+        except OSError:
+            pass  # 已被其他进程改名或清理
+
+
+def stream_download(http, url, dst_path):
+    """流式下载到目标路径：边下边写同目录的临时文件，完成后改名，失败时删除临时文件；返回字节数"""
+    prepare_dir(dst_path)
+    tmp_path = dst_path + PART_SUFFIX
+    size = 0
+    try:
+        with http.stream("GET", url) as response:
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_bytes(1 << 20):
+                    f.write(chunk)
+                    size += len(chunk)
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return size
+
+
+class Transport:
+    """
+    一个服务端一个 Transport：
+    - 上传与下载共用一个 httpx 连接池（长连接），不再每个文件新建连接
+    - 上传在独立线程池中进行：派发循环把即将派发的任务文件提前交给上传线程，与在途任务的下载并行
+    - 同一文件（路径+修改时间+大小）在 upload_ttl 秒内只上传一次，同一输入的多个变体直接引用服务端路径
+    上传结果以不带 meta 的文件描述传给 gradio_client，它不会再次上传，由服务端按路径读取
+    """
+
+    def __init__(self, config, client_factory):
+        self.config = config
+        self.client_factory = client_factory
+        self.http = None
+        self.uploads = OrderedDict()    # 文件标识 → (开始时间, Future[服务端文件描述])
+        self.pool = ThreadPoolExecutor(max_workers=config["upload_workers"], thread_name_prefix="upload")
+        self.lock = threading.Lock()
+        self.stats = {"up_files": 0, "up_bytes": 0, "up_seconds": 0.0, "reused": 0,
+                      "down_files": 0, "down_bytes": 0, "down_seconds": 0.0}
+
+    def session(self, client):
+        """连接池：沿用 gradio_client 的请求头、cookie、证书校验与超时设置"""
+        with self.lock:
+            if self.http is None:
+                connections = self.config["connections"]
+                self.http = httpx.Client(
+                    headers=client.headers, cookies=client.cookies, verify=client.ssl_verify, follow_redirects=True,
+                    limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+                    **client.httpx_kwargs)
+            return self.http
+
+    def _upload(self, path, size):
+        client = self.client_factory()
+        start = time.time()
+        with open(path, "rb") as f:
+            response = self.session(client).post(client.upload_url, files=[("files", (os.path.basename(path), f))])
+        response.raise_for_status()
+        server_path = response.json()[0]
+        with self.lock:
+            self.stats["up_files"] += 1
+            self.stats["up_bytes"] += size
+            self.stats["up_seconds"] += time.time() - start
+        return {"path": server_path, "orig_name": os.path.basename(path)}
+
+    def submit(self, path):
+        """开始（或复用）一个文件的上传，返回 Future"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        now = time.time()
+        with self.lock:
+            entry = self.uploads.get(key)
+            if entry and now - entry[0] < self.config["upload_ttl"] and not (entry[1].done() and entry[1].exception()):
+                self.uploads.move_to_end(key)
+                self.stats["reused"] += 1
+                return entry[1]
+            future = self.pool.submit(self._upload, path, stat.st_size)
+            self.uploads[key] = (now, future)
+            if len(self.uploads) > MAX_UPLOADS:
+                self.uploads.popitem(last=False)
+        return future
+
+    def file_ref(self, path):
+        """上传文件（已预先上传则直接取结果），返回服务端文件描述"""
+        return self.submit(path).result()
+
+    def prefetch(self, paths):
+        for path in paths:
+            if isinstance(path, str) and os.path.exists(path):
+                self.submit(path)
+
+    def download(self, client, url, dst_path):
+        """经连接池流式下载到目标路径，返回字节数"""
+        start = time.time()
+        size = stream_download(self.session(client), url, dst_path)
+        with self.lock:
+            self.stats["down_files"] += 1
+            self.stats["down_bytes"] += size
+            self.stats["down_seconds"] += time.time() - start
+        return size
+
+    def summary(self, url):
+        stats = self.stats
+
+        def rate(size, seconds):
+            return f"{size / seconds / 1048576:.1f}MB/s" if seconds else "-"
+
+        return (f"传输 {url}：上传 {stats['up_files']} 个文件 {stats['up_bytes'] / 1048576:.1f}MB"
+                f"（单连接 {rate(stats['up_bytes'], stats['up_seconds'])}，复用已上传 {stats['reused']} 次），"
+                f"下载 {stats['down_files']} 个 {stats['down_bytes'] / 1048576:.1f}MB"
+                f"（单连接 {rate(stats['down_bytes'], stats['down_seconds'])}），"
+                f"长连接上限 {self.config['connections']}")
@@ -0,0 +1,155 @@
+"""结果校验：容器/文件头检查、分辨率与帧数检查、空白帧检测，在独立线程池中执行"""
+import os
+import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from PIL import Image, ImageStat
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v")
+# 被拒绝的结果移动到输出根目录下的隐藏目录，便于排查且不会被当作输入
+REJECTED_DIR = ".rejected"
+
+
+def check_mp4_boxes(path):
+    """只读各顶层box的头部：检查 ftyp/moov/mdat 是否齐全、最后一个box是否被截断"""
+    file_size = os.path.getsize(path)
+    found = set()
+    offset = 0
+    with open(path, "rb") as f:
+        while offset < file_size:
+            f.seek(offset)
+            header = f.read(8)
+            if len(header) < 8:
+                return f"容器截断：偏移 {offset} 处box头不完整"
+            size, box_type = struct.unpack(">I4s", header)
+            if size == 1:
+                large = f.read(8)
+                if len(large) < 8:
+                    return f"容器截断：偏移 {offset} 处64位box头不完整"
+                size = struct.unpack(">Q", large)[0]
+            elif size == 0:
+                size = file_size - offset  # 延伸到文件末尾
+            if size < 8 or offset + size > file_size:
+                return f"容器截断：box {box_type!r} 声明 {size} 字节，超出文件末尾"
+            found.add(box_type)
+            offset += size
+    missing = {b"ftyp", b"moov", b"mdat"} - found
+    if missing:
+        return f"容器不完整：缺少 {sorted(m.decode() for m in missing)}"
+    return None
+
+
+def is_blank(gray_image, threshold):
+    """灰度图标准差低于阈值视为空白（纯黑/纯色）"""
+    return ImageStat.Stat(gray_image).stddev[0] < threshold
+
+
+def size_mismatch(actual, expected, tolerance):
+    """分辨率允许服务端按8/16像素对齐产生的偏差"""
+    if not expected or not all(expected):
+        return False
+    return any(abs(a - e) > tolerance for a, e in zip(actual, expected))
+
+
+def verify_image(path, expected_size, config):
+    with Image.open(path) as img:
+        actual = img.size
+        if size_mismatch(actual, expected_size, config["size_tolerance"]):
+            return f"分辨率不符：{actual[0]}x{actual[1]}，期望 {expected_size[0]}x{expected_size[1]}"
+        # JPEG可直接以1/8尺寸解码，只为检测空白画面
+        img.draft("L", (max(1, actual[0] // 8), max(1, actual[1] // 8)))
+        thumb = img.convert("L")
+        thumb.thumbnail((128, 128))
+        if is_blank(thumb, config["blank_std"]):
+            return "画面空白（纯色/全黑）"
+    return None
+
+
+def verify_video(path, expected_size, expected_frames, config):
+    if path.lower().endswith(VIDEO_EXTENSIONS):
+        error = check_mp4_boxes(path)
+        if error:
+            return error
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return "无法解码视频"
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        actual = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        if size_mismatch(actual, expected_size, config["size_tolerance"]):
+            return f"分辨率不符：{actual[0]}x{actual[1]}，期望 {expected_size[0]}x{expected_size[1]}"
+        if frame_count <= 0:
+            return "视频无帧"
+        if expected_frames and frame_count < expected_frames * (1 - config["frame_tolerance"]):
+            return f"帧数不足：{frame_count}，期望 {expected_frames}"
+
+        # 均匀抽取若干帧解码，全部空白视为黑屏视频
+        samples = max(1, config["sample_frames"])
+        positions = sorted({int(frame_count * (i + 0.5) / samples) for i in range(samples)})
+        blank = 0
+        for position in positions:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+            ret, frame = cap.read()
+            if not ret:
+                return f"第 {position} 帧解码失败"
+            gray = cv2.cvtColor(cv2.resize(frame, (128, 72)), cv2.COLOR_BGR2GRAY)
+            if is_blank(Image.fromarray(gray), config["blank_std"]):
+                blank += 1
+        if blank == len(positions):
+            return "抽样帧全部空白（黑屏）"
+    finally:
+        cap.release()
+    return None
+
+
+def verify_output(job, config, expected_frames=None):
+    """校验单个结果文件，返回问题描述（通过返回None）"""
+    path = job["output"]
+    try:
+        if not os.path.exists(path):
+            return "结果文件不存在"
+        if os.path.getsize(path) < config["min_bytes"]:
+            return f"结果文件过小：{os.path.getsize(path)} 字节"
+        expected_size = (job["width"], job["height"])
+        if path.lower().endswith((".mp4", ".avi", ".mov", ".mkv", ".webm")):
+            return verify_video(path, expected_size, expected_frames, config)
+        return verify_image(path, expected_size, config)
+    except Exception as e:
+        return f"校验异常：{str(e)}"
+
+
+def reject_output(job, output_root):
+    """把未通过校验的结果移出数据集目录"""
+    if not os.path.exists(job["output"]):
+        return
+    dst_path = os.path.join(output_root, REJECTED_DIR, job["key"])
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    shutil.move(job["output"], dst_path)
+
+
+class Verifier:
+    """独立的校验线程池，不占用接口调用的并发名额"""
+
+    def __init__(self, spec, output_root):
+        self.config = spec["verify"]
+        self.output_root = output_root
+        frame_num = spec["call"]["params"].get("frame_num")
+        self.expected_frames = frame_num if isinstance(frame_num, int) else None
+        self.pool = ThreadPoolExecutor(max_workers=self.config["workers"], thread_name_prefix="verify")
+
+    def submit(self, job):
+        return self.pool.submit(verify_output, job, self.config, self.expected_frames)
+
+    def reject(self, job):
+        reject_output(job, self.output_root)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def build_verifier(spec, output_root):
+    if not spec["verify"]["enabled"]:
+        return None
+    return Verifier(spec, output_root)
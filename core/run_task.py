@@ -0,0 +1,38 @@
+import argparse
+import os
+
+from engine import load_spec, run_task, TASKS_DIR
+from engine.cli import add_common_args, spec_overrides, run_options
+
+
+def list_tasks():
+    """列出内置任务规格"""
+    names = sorted(os.path.splitext(f)[0] for f in os.listdir(TASKS_DIR)
+                   if f.endswith((".toml", ".yaml", ".yml")))
+    for name in names:
+        spec = load_spec(name)
+        print(f"{name:<28}{spec['description']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按任务规格执行数据增强（新场景只需新增 core/tasks 下的规格文件）')
+    parser.add_argument('task', nargs='?', help='任务规格（core/tasks 下的任务名或规格文件路径）')
+    parser.add_argument('source', nargs='?', help='输入源（图片/视频路径或目录；frame_pairs 任务为增强帧根目录）')
+    parser.add_argument('output', nargs='?', help='输出根目录')
+    parser.add_argument('--list', action='store_true', help='列出内置任务规格')
+    add_common_args(parser)
+
+    args = parser.parse_args()
+
+    if args.list:
+        list_tasks()
+        return
+    if not args.task or not args.source or not args.output:
+        parser.error('需要指定 task、source 和 output')
+
+    spec = load_spec(args.task, spec_overrides(args))
+    run_task(spec, args.source, args.output, **run_options(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import argparse
+
+from engine.service import serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description='常驻数据增强服务：通过本地 HTTP 或 Unix socket 提交任务，复用接口连接与缓存')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认仅本机）')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--socket', default=None, help='改为监听 Unix socket 文件（指定后忽略 --host/--port）')
+    parser.add_argument('--max-runs', type=int, default=1, help='同时执行的任务数，其余排队')
+
+    args = parser.parse_args()
+    serve(args.host, args.port, args.socket, args.max_runs)
+
+
+if __name__ == "__main__":
+    main()
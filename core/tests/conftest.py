@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 测试直接导入 core 下的 engine 包（与各入口脚本一致）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
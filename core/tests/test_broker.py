@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+
+from engine import broker
+from engine.broker import Broker
+
+CONFIG = {"dir": None, "capacity": 1, "priority": 0, "weight": 1.0, "rate": None, "burst": 1}
+
+
+def test_unchanged_state_not_rewritten(tmp_path, monkeypatch):
+    """等待槽位的轮询不改状态时不重写状态文件"""
+    b = Broker(dict(CONFIG, dir=str(tmp_path)), {"url": "http://127.0.0.1:7860/"}, "t")
+    writes = []
+    replace = os.replace
+    monkeypatch.setattr(broker.os, "replace", lambda src, dst: writes.append(dst) or replace(src, dst))
+    b.acquire()
+    assert len(writes) == 1
+    for _ in range(3):
+        with b.state() as state:
+            b.register(state["runs"])
+    assert len(writes) == 1
+    b.release(0.5)
+    assert len(writes) == 2
+
+
+def test_weighted_fair_order(tmp_path, monkeypatch):
+    """
+    同一优先级按权重分配槽位：权重 3 的任务获得的槽位约为权重 1 的三倍
+    每个任务两个调用线程，始终有调用在等待（空闲后重新等待的任务会追平虚拟时间）
+    """
+    monkeypatch.setattr(broker, "POLL_INTERVAL", 0.002)
+    endpoint = {"url": "http://127.0.0.1:7861/"}
+    runs = {name: Broker(dict(CONFIG, dir=str(tmp_path), weight=weight), endpoint, name)
+            for name, weight in (("light", 1.0), ("heavy", 3.0))}
+    order = []
+
+    def work(name):
+        while len(order) < 60:
+            runs[name].acquire()
+            order.append(name)
+            time.sleep(0.002)
+            runs[name].release(1.0)  # 固定的服务时间，虚拟时间只由权重决定
+
+    threads = [threading.Thread(target=work, args=(name,)) for name in runs for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counts = {name: order[10:60].count(name) for name in runs}
+    assert 2 * counts["light"] <= counts["heavy"] <= 5 * counts["light"]
+
+
+def test_priority_before_vtime(tmp_path):
+    """高优先级有等待时先于虚拟时间更小的低优先级任务"""
+    endpoint = {"url": "http://127.0.0.1:7862/"}
+    low = Broker(dict(CONFIG, dir=str(tmp_path)), endpoint, "low")
+    high = Broker(dict(CONFIG, dir=str(tmp_path), priority=1), endpoint, "high")
+    runs = {}
+    for b, vtime in ((low, 0.0), (high, 100.0)):
+        b.register(runs).update(vtime=vtime, waiting=1)
+    assert high.eligible(runs) and not low.eligible(runs)
+    runs[high.run_id]["waiting"] = 0
+    assert low.eligible(runs)
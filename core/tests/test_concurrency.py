@@ -0,0 +1,73 @@
+import random
+import threading
+import time
+
+from PIL import Image
+
+from engine import load_spec, runner
+from engine.concurrency import AIMDController, endpoint_key, get_controllers
+from engine.inputs import image_items
+from engine.manifest import Manifest
+
+
+def test_aimd_decrease_once_per_window():
+    """出错时乘性下调，同一批在途请求的后续错误不重复下调；延迟超过基线×slack 同样下调"""
+    controller = AIMDController(initial=8, max_limit=16, decrease=0.5, latency_slack=1.5)
+    controller.observe(1.0, False)
+    assert controller.limit() == 4
+    controller.observe(1.0, False)
+    assert controller.limit() == 4
+    for _ in range(4):
+        controller.observe(1.0, True)
+    assert controller.limit() == 4
+    controller.observe(5.0, True)
+    assert controller.limit() == 2
+    assert controller.decreases == 2
+
+
+def test_each_run_gets_own_controllers():
+    """同一进程中的两次运行各用一套控制器，按各自的 --concurrency 开始"""
+    spec = load_spec("weld_protect", {"endpoint": {"url": "http://initial.test/"}})
+    first, second = get_controllers([spec], 2), get_controllers([spec], 6)
+    key = endpoint_key(spec)
+    assert first[key] is not second[key]
+    first[key].observe(1.0, False)
+    assert first[key].limit() == 1 and second[key].limit() == 6
+
+
+def test_followup_endpoint_has_own_controller(tmp_path, monkeypatch):
+    """修正步骤调用其他接口时，延迟与在途数计入该接口自己的控制器"""
+    source = tmp_path / "imgs"
+    source.mkdir()
+    for i in range(3):
+        Image.new("RGB", (64, 48)).save(source / f"监控{i}.jpg")
+    spec = load_spec("weld_protect", {"prompts": {"count": 2}, "endpoint": {"url": "http://main.test/"},
+                                      "followup": {"endpoint": {"url": "http://fix.test/"}},
+                                      "transport": {"enabled": False}, "verify": {"enabled": False}})
+    output_root = str(tmp_path / "out")
+    factory = runner.JobFactory(spec, output_root, random.Random(0))
+    controllers = get_controllers([spec] + factory.steps, 2)
+    assert len(controllers) == 2
+
+    inflight = {key: 0 for key in controllers}
+    peak = dict(inflight)
+    lock = threading.Lock()
+
+    def execute(job_spec, job, broker, store):
+        key = endpoint_key(job.get("spec", job_spec))
+        with lock:
+            inflight[key] += 1
+            peak[key] = max(peak[key], inflight[key])
+        time.sleep(0.01)
+        with lock:
+            inflight[key] -= 1
+        return True, 0.01, None
+
+    monkeypatch.setattr(runner, "execute", execute)
+    limits = {key: controller.limit() for key, controller in controllers.items()}
+    jobs = factory.iter_jobs(image_items(spec, str(source)))
+    stats = runner.dispatch(spec, jobs, Manifest(output_root), controllers, False, "test", factory)
+    assert stats["ok"] == 12
+    main, fix = endpoint_key(spec), endpoint_key(factory.steps[0])
+    assert controllers[main].completed == 6 and controllers[fix].completed == 6
+    assert all(peak[key] <= max(limits[key], controllers[key].limit()) for key in controllers)
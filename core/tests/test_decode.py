@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from engine import FrameStore, load_spec
+from engine.decode import decode_outputs
+
+
+def write_video(path, values, size=(32, 24)):
+    """每帧为单一灰度值的视频，解码后可按像素均值对照"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 10, size)
+    for value in values:
+        writer.write(np.full((size[1], size[0], 3), value, dtype=np.uint8))
+    writer.release()
+
+
+def test_decode_round_trip(tmp_path):
+    """解码后按视频键读回每一帧；放不下的视频整体移到新分块，超过分块容量的视频扩容后仍连续存放"""
+    lengths = {"a.mp4": 5, "b.mp4": 5, "c.mp4": 12}
+    for number, (key, count) in enumerate(lengths.items()):
+        write_video(tmp_path / key, [20 * number + 10 * i % 200 for i in range(count)])
+    spec = load_spec("video_generate", {"decode": {"enabled": True, "workers": 1, "chunk_frames": 8,
+                                                   "width": 16, "height": 12}})
+    manifest = SimpleNamespace(done=set(lengths))
+    assert decode_outputs(spec, str(tmp_path), manifest) == 3
+
+    store = FrameStore(str(tmp_path / "frames"))
+    assert sorted(store.keys()) == sorted(lengths)
+    for number, (key, count) in enumerate(lengths.items()):
+        frames = store.frames(key)
+        assert isinstance(frames, np.memmap) and frames.shape == (count, 12, 16, 3)
+        means = frames.reshape(count, -1).mean(axis=1)
+        assert np.allclose(means, [20 * number + 10 * i % 200 for i in range(count)], atol=4)
+    assert store.index["a.mp4"]["chunk"] != store.index["b.mp4"]["chunk"]
+    assert not list((tmp_path / "frames").glob("*.part*"))
+
+    assert decode_outputs(spec, str(tmp_path), manifest) == 0  # 已解码的视频跳过
@@ -0,0 +1,75 @@
+import json
+import tarfile
+import threading
+
+from engine.export import ShardExporter
+
+CONFIG = {"dir": "export", "prefix": "shard", "max_bytes": 1 << 30, "max_count": 1000}
+
+
+def test_concurrent_add_exports_once(tmp_path):
+    """多个线程同时登记同一批结果，每个样本只导出一次"""
+    outputs = []
+    for i in range(50):
+        path = tmp_path / f"{i}.jpg"
+        path.write_bytes(b"x" * 10)
+        outputs.append({"key": f"{i}.jpg", "output": str(path), "task": "t", "source": "s", "frame": None,
+                        "prompt": "p", "prompt_id": 0, "attrs": {}, "seed": 1, "width": 8, "height": 8})
+    exporter = ShardExporter(CONFIG, str(tmp_path))
+    threads = [threading.Thread(target=lambda: [exporter.add(job) for job in outputs]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    exporter.close()
+    with open(tmp_path / "export" / "index.jsonl", encoding="utf-8") as f:
+        keys = [json.loads(line)["key"] for line in f]
+    assert sorted(keys) == sorted(str(i) for i in range(50))
+
+
+def sample_job(tmp_path, key, data):
+    path = tmp_path / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return {"key": key, "output": str(path), "task": "t", "source": "s", "frame": None, "prompt": "p",
+            "prompt_id": 0, "attrs": {"light": "逆光"}, "seed": 1, "width": 8, "height": 8}
+
+
+def test_dotted_keys_do_not_collide(tmp_path):
+    """a.b_var0 与 a_b_var0 是不同的样本键，两个样本都导出"""
+    exporter = ShardExporter(CONFIG, str(tmp_path))
+    exporter.add(sample_job(tmp_path, "a.b_var0.jpg", b"dot"))
+    exporter.add(sample_job(tmp_path, "a_b_var0.jpg", b"underscore"))
+    exporter.close()
+    with open(tmp_path / "export" / "index.jsonl", encoding="utf-8") as f:
+        keys = [json.loads(line)["key"] for line in f]
+    assert len(set(keys)) == 2 and "a_b_var0" in keys
+    assert all("." not in key for key in keys)
+
+
+def test_shard_index_round_trip(tmp_path):
+    """按索引中的偏移直接读回样本与元数据；分片写满即换新分片，重新运行时已导出的样本跳过"""
+    jobs = [sample_job(tmp_path, f"out/{i}.jpg", bytes([i]) * (100 + i)) for i in range(5)]
+    exporter = ShardExporter(dict(CONFIG, max_count=2), str(tmp_path))
+    for job in jobs:
+        exporter.add(job)
+    exporter.close()
+    assert exporter.shards == 3 and exporter.samples == 5
+
+    with open(tmp_path / "export" / "index.jsonl", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    for entry, job in zip(entries, jobs):
+        with open(tmp_path / "export" / entry["shard"], "rb") as f:
+            f.seek(entry["offset"])
+            assert f.read(entry["size"]) == open(job["output"], "rb").read()
+            f.seek(entry["meta_offset"])
+            meta = json.loads(f.read(entry["meta_size"]))
+        assert meta["key"] == job["key"] and meta["attrs"] == {"light": "逆光"}
+    with tarfile.open(tmp_path / "export" / entries[0]["shard"]) as tar:
+        assert tar.getnames() == ["out/0.jpg", "out/0.json", "out/1.jpg", "out/1.json"]
+
+    again = ShardExporter(dict(CONFIG, max_count=2), str(tmp_path))
+    for job in jobs:
+        again.add(job)
+    again.close()
+    assert again.samples == 0
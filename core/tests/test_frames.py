@@ -0,0 +1,20 @@
+import cv2
+import numpy as np
+
+from engine import load_spec
+from engine.frames import build_frame_cache
+
+
+def frame_cache(tmp_path, codec, **settings):
+    spec = load_spec("standhigh_photo", {"frame_cache": {"dir": str(tmp_path / "cache")},
+                                         "frame_store": dict(settings, codec=codec)})
+    return build_frame_cache(spec)
+
+
+def test_cache_keyed_by_encode_settings(tmp_path):
+    """抽帧缓存按编码参数区分：改了 JPEG 质量后不会取到按旧质量编码的帧"""
+    ok, data = cv2.imencode(".jpg", np.zeros((8, 8, 3), dtype=np.uint8))
+    cache = frame_cache(tmp_path, "jpg", jpeg_quality=95)
+    cache.put("ab" * 16, "first", data.tobytes())
+    assert cache.fetch("ab" * 16, "first", str(tmp_path / "a")) is not None
+    assert frame_cache(tmp_path, "jpg", jpeg_quality=80).fetch("ab" * 16, "first", str(tmp_path / "b")) is None
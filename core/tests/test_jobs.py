@@ -0,0 +1,41 @@
+import random
+
+from PIL import Image
+
+from engine import load_spec
+from engine.inputs import image_items
+from engine.jobs import JobFactory
+
+
+def test_steps_from_num_inference_steps(tmp_path):
+    """图像接口以 num_inference_steps 给出步数，任务与修正步骤都应记录下来"""
+    source = tmp_path / "imgs"
+    source.mkdir()
+    Image.new("RGB", (64, 48)).save(source / "监控0.jpg")
+    spec = load_spec("weld_protect", {"prompts": {"count": 1}, "preprocess": {"enabled": False}})
+    assert spec["call"]["params"]["num_inference_steps"] == 4
+
+    factory = JobFactory(spec, str(tmp_path / "out"), random.Random(0))
+    jobs = list(factory.iter_jobs(image_items(spec, str(source))))
+    assert jobs
+    for job in jobs:
+        assert job["steps"] == 4
+        assert job["then"] and all(nxt["steps"] == 4 for nxt in job["then"])
+
+
+def test_preprocess_runs_without_factory_lock(tmp_path):
+    """预处理不持有任务工厂的锁，派发线程的补发与换种子不必等待生产线程"""
+    source = tmp_path / "imgs"
+    source.mkdir()
+    Image.new("RGB", (64, 48)).save(source / "监控0.jpg")
+    spec = load_spec("weld_protect", {"prompts": {"count": 2}})
+    factory = JobFactory(spec, str(tmp_path / "out"), random.Random(0))
+    held = []
+    apply = factory.preprocessor.apply
+    factory.preprocessor.apply = lambda job: held.append(factory.lock.locked()) or apply(job)
+
+    item = next(image_items(spec, str(source)))
+    jobs = list(factory.iter_jobs([item]))
+    jobs += factory.replacement(item)
+    assert held and not any(held)
+    assert sorted(job["index"] for job in jobs) == list(range(len(jobs)))
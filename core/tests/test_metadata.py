@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from engine.effects import effect_record
+from engine.metadata import MetadataIndex, MetadataTable
+
+PARAMS = {
+    "gamma": np.array([1.0, 0.8]), "gain": np.array([1.0, 1.2]), "backlight": np.zeros(2), "cast": np.ones((2, 3)),
+    "blur": np.array([0.0, 3.0]), "noise": np.array([0.0, 8.0]), "scale": np.array([1.0, 0.5]),
+    "quality": np.array([90, 40]), "drop": 1,
+}
+
+
+def test_effects_and_frame_positions(tmp_path):
+    """特效变体记录实际施加的特效与参数，帧序号与时间点各自编码并记下位置"""
+    space = SimpleNamespace(axis_names=["light"], axis_values=[["正常", "逆光"]])
+    index = MetadataIndex({"dir": "metadata", "flush_rows": 100}, str(tmp_path), "t", space)
+    base = {"task": "t", "source": "a.mp4", "prompt_id": 0, "index": 0, "seed": 1, "width": 64, "height": 48,
+            "output": str(tmp_path / "missing.jpg"), "attrs": {"light": "正常"}}
+    index.add(dict(base, key="first", frame="first"))
+    index.add(dict(base, key="frame12", frame=12, effects=effect_record(PARAMS, 1),
+                   attrs={"light": "逆光", "effects_variant": 1}))
+    index.add(dict(base, key="time2.5", frame="2.5s", effects=effect_record(PARAMS, 0)))
+    with index.lock:
+        index.flush()
+
+    table = MetadataTable(index.dir)
+    assert table.keys_where(effects=["blur", "noise", "lowres"], fx_noise=slice(6, None)) == ["frame12"]
+    assert table.keys_where(effects="color_cast") == []
+    assert table.keys_where(frame="index", frame_pos=12) == ["frame12"]
+    assert table.keys_where(frame="time", frame_pos=slice(2, 3)) == ["time2.5"]
+    assert table.keys_where(frame="first") == ["first"]
+    assert table.column("fx_quality").tolist() == [0, 40, 0]
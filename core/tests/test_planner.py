@@ -0,0 +1,45 @@
+from engine.planner import BudgetPlanner
+
+
+def unit(source, gender="男性"):
+    return {"item": {"source": source}, "attrs": {"gender": gender}}
+
+
+def test_failed_input_carries_quota_to_later_inputs():
+    """同一输入连续失败超过重试次数后，名额转给后面的输入"""
+    planner = BudgetPlanner(target=6, total_inputs=3, max_retries=1)
+    assert planner.allocation(0) == 2
+    a = unit("a.jpg")
+    assert planner.admit(a)
+    assert planner.fail(a) is a["item"]   # 第一次失败：同一输入重试
+    assert planner.admit(a)
+    assert planner.fail(a) is None        # 超过重试次数：名额转移
+    assert planner.allocation(1) == 3
+    assert planner.allocation(2) == 2
+
+
+def test_makeup_after_inputs_exhausted():
+    """输入耗尽时转移来的名额由最近成功的输入补足，达到目标后不再派发"""
+    planner = BudgetPlanner(target=2, total_inputs=1, max_retries=0)
+    ok, bad = unit("ok.jpg"), unit("bad.jpg")
+    assert planner.admit(ok) and planner.admit(bad)
+    planner.succeed(ok)
+    assert planner.fail(bad) is None
+    assert planner.take_makeup() is ok["item"]
+    assert planner.take_makeup() is None   # 转移的名额只补一次
+    assert planner.admit(ok)
+    planner.succeed(ok)
+    assert planner.satisfied()
+    assert not planner.admit(unit("late.jpg"))
+    assert planner.dropped == 1
+
+
+def test_quota_released_on_failure():
+    """属性配额按已展开数占用，失败后释放给其他变体"""
+    planner = BudgetPlanner(target=4, total_inputs=1, quotas={"gender": {"女性": 0.5}})
+    assert planner.reserve({"gender": "女性"}) and planner.reserve({"gender": "女性"})
+    assert not planner.reserve({"gender": "女性"})
+    female = unit("a.jpg", "女性")
+    assert planner.admit(female)
+    planner.fail(female)
+    assert planner.reserve({"gender": "女性"})
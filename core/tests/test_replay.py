@@ -0,0 +1,54 @@
+import glob
+import os
+
+import numpy as np
+from PIL import Image
+
+from engine import client, load_spec, run_task
+from engine.replay import read_trace
+
+OVERRIDES = {"prompts": {"count": 1}, "followup": None, "verify": {"enabled": False},
+             "store": {"enabled": False}, "concurrency": {"mode": "fixed"}}
+
+
+class FakeClient:
+    """按请求的尺寸返回一张随机图片，不连接服务端"""
+    tmp_dir = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def predict(self, *args, api_name=None, **kwargs):
+        path = os.path.join(FakeClient.tmp_dir, f"{len(os.listdir(FakeClient.tmp_dir))}.png")
+        pixels = np.random.randint(0, 255, (kwargs["height"], kwargs["width"], 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(path)
+        return path, 1
+
+
+def test_record_then_replay(tmp_path, monkeypatch):
+    """录制的调用回放时不连接服务端，结果与录制时逐字节相同"""
+    source = tmp_path / "imgs"
+    source.mkdir()
+    for i in range(2):
+        Image.new("RGB", (64, 48)).save(source / f"监控{i}.jpg")
+    FakeClient.tmp_dir = str(tmp_path / "server")
+    os.makedirs(FakeClient.tmp_dir)
+    monkeypatch.setattr(client, "Client", FakeClient)
+    monkeypatch.setattr(client, "_CLIENTS", {})
+
+    recorded = str(tmp_path / "rec")
+    spec = load_spec("weld_protect", dict(OVERRIDES, record={"enabled": True}, transport={"enabled": False}))
+    assert run_task(spec, str(source), recorded, seed=1)["ok"] == 2
+    trace = glob.glob(os.path.join(recorded, "traces", "*"))[0]
+    entries = read_trace(trace)
+    assert len(entries) == 2 and all(entry["status"] == "ok" for entry in entries)
+
+    monkeypatch.setattr(client, "Client", None)  # 回放时不应再创建真实客户端
+    replayed = str(tmp_path / "rep")
+    spec = load_spec("weld_protect", dict(OVERRIDES, replay={"trace": trace, "speed": 100}))
+    assert run_task(spec, str(source), replayed, seed=1)["ok"] == 2
+    for entry in entries:
+        with open(os.path.join(trace, entry["result"]), "rb") as f:
+            expected = f.read()
+        with open(os.path.join(replayed, entry["key"]), "rb") as f:
+            assert f.read() == expected
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+from PIL import Image
+
+from engine import load_spec, runner
+
+
+class Sink:
+    def __init__(self, closed):
+        self.closed = closed
+
+    def close(self):
+        self.closed.append(type(self).__name__)
+
+
+class Verifier(Sink):
+    pass
+
+
+class Effects(Sink):
+    pass
+
+
+def test_dispatch_error_closes_sinks(tmp_path, monkeypatch):
+    """派发异常时仍关闭校验线程池与特效引擎，异常照常抛出"""
+    source = tmp_path / "imgs"
+    source.mkdir()
+    Image.new("RGB", (64, 48)).save(source / "监控0.jpg")
+    closed = []
+    monkeypatch.setattr(runner, "build_verifier", lambda spec, output_root: Verifier(closed))
+    monkeypatch.setattr(runner, "build_effect_engine", lambda spec, output_root, sinks: Effects(closed))
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("dispatch failed")
+
+    monkeypatch.setattr(runner, "dispatch", fail)
+    spec = load_spec("weld_protect", {"prompts": {"count": 1}})
+    with pytest.raises(RuntimeError):
+        runner.execute_task(spec, str(source), str(tmp_path / "out"), None, False, random.Random(0))
+    assert closed == ["Verifier", "Effects"]
@@ -0,0 +1,16 @@
+import pytest
+
+from engine.service import Service
+
+
+@pytest.mark.parametrize("overrides", [{"replay": {"trace": "traces/x"}}, {"record": {"enabled": True}}])
+def test_service_rejects_record_and_replay(tmp_path, overrides):
+    """录制/回放会影响同一进程中同时执行的其他任务，常驻服务拒绝这类提交"""
+    service = Service()
+    try:
+        with pytest.raises(ValueError):
+            service.submit({"task": "weld_protect", "source": str(tmp_path), "output": str(tmp_path / "out"),
+                            "overrides": overrides})
+        assert service.list() == []
+    finally:
+        service.close()
@@ -0,0 +1,60 @@
+import random
+
+from PIL import Image
+
+from engine import load_spec, runner
+from engine.inputs import image_items
+from engine.jobs import JobFactory
+from engine.prompts import stable_hash
+from engine.store import ResultStore
+
+
+def make_job(tmp_path, overrides):
+    source = tmp_path / "imgs"
+    source.mkdir(exist_ok=True)
+    Image.new("RGB", (64, 48)).save(source / "监控0.jpg")
+    spec = load_spec("weld_protect", overrides)
+    factory = JobFactory(spec, str(tmp_path / "out"), random.Random(0))
+    return spec, next(factory.iter_jobs(image_items(spec, str(source))))
+
+
+def test_randomize_seed_not_cached(tmp_path):
+    """randomize_seed 为真时服务端结果不可复现，不查找也不入库"""
+    spec, job = make_job(tmp_path, {"prompts": {"count": 1}, "call": {"params": {"randomize_seed": True}}})
+    store = ResultStore({"dir": str(tmp_path / "store")})
+    assert store.path_for(spec, job) is None
+    assert not store.fetch(spec, job)
+
+
+def test_fixed_seed_cached(tmp_path):
+    """内置的 weld_protect 使用 stable 种子：同一输出重新运行时种子不变，重新生成时换种子"""
+    spec, job = make_job(tmp_path, {"prompts": {"count": 1}})
+    assert spec["call"]["params"]["randomize_seed"] is False
+    low, high = spec["call"]["seed_range"]
+    assert job["seed"] == low + stable_hash(f"{job['key']}#1", high - low + 1)
+    store = ResultStore({"dir": str(tmp_path / "store")})
+    assert store.path_for(spec, job) is not None
+
+
+def test_store_hit_skips_run_job(tmp_path, monkeypatch):
+    """第二次相同的调用直接取结果库中的结果，不调用接口"""
+    spec, job = make_job(tmp_path, {"prompts": {"count": 1}})
+    store = ResultStore({"dir": str(tmp_path / "store")})
+    calls = []
+
+    def run_job(job_spec, job):
+        calls.append(job["key"])
+        Image.new("RGB", (8, 8), "red").save(job["output"])
+
+    monkeypatch.setattr(runner, "run_job", run_job)
+    job["output"] = str(tmp_path / "first.png")
+    job["dispatched"] = 0
+    assert runner.execute(spec, job, store=store)[0]
+    assert len(calls) == 1 and not job.get("cached")
+
+    again = make_job(tmp_path, {"prompts": {"count": 1}})[1]
+    again["output"] = str(tmp_path / "second.png")
+    again["dispatched"] = 0
+    assert runner.execute(spec, again, store=store)[0]
+    assert len(calls) == 1 and again["cached"]
+    assert open(again["output"], "rb").read() == open(job["output"], "rb").read()